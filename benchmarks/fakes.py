@@ -0,0 +1,186 @@
+"""
+Deterministyczne lokalne zamienniki usług zewnętrznych dla benchmarków:
+model czatu z konfigurowalnym opóźnieniem, indeks produktów w pamięci
+(data/products.json), tabela stock w SQLite i zaślepka DuckDuckGoSearchRun.
+Kod pipeline'u (ask_rag, calc_materials) działa bez zmian.
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag, calc_materials, stock
+from src.clients import PRODUCTS_INDEX
+from src.local_search import LocalProductIndex, LocalProductRetriever, get_local_index
+from src.products import PRODUCTS_PATH
+
+# materiały zwracane przez "ekstrakcję" - nazwy zbliżone do produktów z katalogu
+EXTRACTED_MATERIALS = {
+    "basic_materials": [
+        {"name": "Farba akrylowa biała", "quantity": "10", "unit": "l"},
+        {"name": "Grunt głęboko penetrujący", "quantity": "5", "unit": "l"},
+        {"name": "Gips szpachlowy", "quantity": "20", "unit": "kg"},
+    ],
+    "additional_materials": [
+        {"name": "Taśma malarska", "quantity": "2", "unit": "szt"},
+        {"name": "Silikon sanitarny", "quantity": "1", "unit": "szt"},
+    ],
+}
+
+GENERATED_ANSWER = (
+    "Tak, posiadamy w ofercie Farba akrylowa biała matowa 10L w cenie 207 PLN netto "
+    "oraz Farba akrylowa biała półmat 10L w cenie 263 PLN netto. Oba produkty są "
+    "dostępne od ręki, a zamówienia powyżej 1000 PLN netto dostarczamy bezpłatnie."
+)
+
+WEB_RESULTS = (
+    "Do malowania pokoju potrzebujesz farby (ok. 1 l na 10 m² przy dwóch warstwach), "
+    "gruntu, gipsu szpachlowego do uzupełnienia ubytków, taśmy malarskiej i folii "
+    "ochronnej. " * 5
+)
+
+REGULATION_DOCS = [
+    {"id": "REG_1", "content": "Zwrot towaru jest możliwy w ciągu 14 dni od dostawy."},
+    {"id": "REG_2", "content": "Dostawa trwa 2-3 dni robocze, powyżej 1000 PLN gratis."},
+    {"id": "REG_3", "content": "Reklamacje rozpatrywane są w ciągu 14 dni roboczych."},
+    {"id": "REG_4", "content": "Faktura VAT wystawiana jest automatycznie po zamówieniu."},
+]
+
+
+@dataclass(frozen=True)
+class FakeLatency:
+    """opóźnienia usług w sekundach"""
+
+    llm: float = 0.005
+    web_search: float = 0.005
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Odpowiedź wybierana po treści promptu: klasyfikacja, ekstrakcja materiałów
+    (JSON) albo odpowiedź ogólna. Każde wywołanie czeka `latency` sekund.
+    """
+
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages: list[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        prompt = "".join(str(m.content) for m in messages)
+        if "TYLKO jedno słowo" in prompt:
+            text = calc_materials.GENERAL
+        elif "wyodrębnij materiały" in prompt:
+            text = json.dumps(EXTRACTED_MATERIALS, ensure_ascii=False)
+        else:
+            text = GENERATED_ANSWER
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self, messages: list[BaseMessage], *args: Any, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+class FakeWebSearch:
+    """zamiennik DuckDuckGoSearchRun - stały wynik po stałym opóźnieniu"""
+
+    latency = 0.0
+
+    def invoke(self, query: str) -> str:
+        time.sleep(self.latency)
+        return WEB_RESULTS
+
+    async def ainvoke(self, query: str) -> str:
+        await asyncio.sleep(self.latency)
+        return WEB_RESULTS
+
+
+def create_stock_db(path: Path, products_path: Path = PRODUCTS_PATH) -> Path:
+    """
+    tabela stock w SQLite z ilością i ceną dla każdego produktu z katalogu
+    """
+    products = json.loads(products_path.read_text("utf-8"))
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS stock (product_id TEXT PRIMARY KEY, quantity INT, "
+        "price REAL, updated_at INT DEFAULT 0)"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO stock (product_id, quantity, price) VALUES (?, ?, ?)",
+        [(p["id"], (i * 7) % 23, 10.0 + (i * 13) % 250) for i, p in enumerate(products)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@contextmanager
+def fake_services(
+    workdir: Path, latency: FakeLatency | None = None
+) -> Iterator[FakeChatModel]:
+    """
+    Podmienia LLM, wyszukiwarki, bazę stanów i wyszukiwanie w internecie na
+    lokalne zamienniki. Cache semantyczny i cache ekstrakcji są wyłączone,
+    żeby każdy przebieg wykonywał całą pracę.
+    """
+    latency = latency or FakeLatency()
+    llm = FakeChatModel(latency=latency.llm)
+    web_search = FakeWebSearch()
+    web_search.latency = latency.web_search
+
+    products_index = get_local_index()
+    regulation_index = LocalProductIndex(REGULATION_DOCS)
+
+    def get_retriever(index_name: str, top_k: int) -> LocalProductRetriever:
+        index = products_index if index_name == PRODUCTS_INDEX else regulation_index
+        return LocalProductRetriever(index=index, top_k=top_k)
+
+    db_path = create_stock_db(workdir / "stock.db")
+    connections: list[sqlite3.Connection] = []
+
+    def connect() -> sqlite3.Connection:
+        connections.append(sqlite3.connect(db_path, check_same_thread=False))
+        return connections[-1]
+
+    with ExitStack() as stack:
+        for module in (ask_rag, calc_materials):
+            stack.enter_context(mock.patch.object(module, "get_async_llm", lambda: llm))
+            stack.enter_context(mock.patch.object(module, "get_retriever", get_retriever))
+        stack.enter_context(
+            mock.patch.object(calc_materials, "web_search_tool", lambda: web_search)
+        )
+        stack.enter_context(
+            mock.patch.object(calc_materials, "get_extraction_cache", lambda: None)
+        )
+        stack.enter_context(mock.patch.object(ask_rag, "get_semantic_cache", lambda: None))
+        stock.configure(connect, max_size=2)
+        try:
+            yield llm
+        finally:
+            stock.configure(stock.connect_sql)
+            stock.purge()
+            for conn in connections:
+                conn.close()
@@ -0,0 +1,73 @@
+"""
+Czas zimnego startu: import modułów w świeżym procesie (tak jak przy starcie
+workera Azure Functions) oraz moduły, które importują się najdłużej
+(python -X importtime).
+
+python benchmarks/import_time.py [--runs 5] [--module function_app] [--top 15]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_MODULES = ["function_app", "src.ask_rag"]
+# wcięcie nazwy w -X importtime = głębokość w drzewie importów; 1-2 poziomy są czytelne
+MAX_INDENT = 3
+
+
+def import_seconds(module: str) -> float:
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[str, float]]:
+    """
+    (moduł, łączny czas importu w ms) - tylko importy najwyższego poziomu
+    w drzewie danego modułu, posortowane malejąco
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if len(name) - len(name.lstrip()) <= MAX_INDENT:
+            totals.append((name.strip(), int(cumulative) / 1000))
+    return sorted(totals, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Czas importu przy zimnym starcie")
+    parser.add_argument("--module", action="append", help="moduł do zmierzenia")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for module in args.module or DEFAULT_MODULES:
+        runs = [import_seconds(module) for _ in range(args.runs)]
+        print(
+            f"{module}: mediana {statistics.median(runs) * 1000:.0f} ms "
+            f"(min {min(runs) * 1000:.0f}, max {max(runs) * 1000:.0f}, {args.runs} przebiegów)"
+        )
+        for name, ms in slowest_imports(module, args.top):
+            print(f"  {name:<50}{ms:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Mikrobenchmarki etapów ask_rag na lokalnych zamiennikach usług (benchmarks/fakes.py).
+
+Każdy etap jest mierzony osobno: czasy (p50/p95/p99) w przebiegu bez
+tracemalloc, potem szczyt alokacji na wywołanie w krótszym przebiegu z
+tracemalloc. Wynik można zapisać jako baseline i porównywać z nim kolejne
+przebiegi - regresja kończy program kodem 1.
+
+python benchmarks/run_benchmarks.py [--iterations 200] [--save-baseline] [--compare]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fakes import EXTRACTED_MATERIALS, FakeLatency, fake_services
+from src import ask_rag, calc_materials, context_assembler, stock
+from src.clients import PRODUCTS_INDEX
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+GENERAL_QUERY = "Czy macie farby akrylowe białe 10L?"
+# spoza katalogu materiałów - pełna ścieżka: wyszukiwanie w internecie i ekstrakcja
+MATERIALS_QUERY = "Potrzebuję materiałów do budowy altany ogrodowej"
+CLASSIFICATION_QUERIES = [
+    GENERAL_QUERY,
+    MATERIALS_QUERY,
+    "Jaki jest regulamin zwrotów?",
+    "Chcę wyremontować łazienkę 10m²",
+    "Czy wystawiacie faktury na firmę?",
+]
+MATERIAL_NAMES = [
+    m["name"]
+    for m in EXTRACTED_MATERIALS["basic_materials"]
+    + EXTRACTED_MATERIALS["additional_materials"]
+]
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    # przygotowanie przed każdym wywołaniem, poza pomiarem
+    setup: Callable[[], None] | None = None
+
+
+def percentiles(durations_ms: list[float]) -> dict[str, float]:
+    values = np.asarray(durations_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)}
+
+
+async def measure(stage: Stage, iterations: int, alloc_iterations: int) -> dict[str, Any]:
+    durations = []
+    for _ in range(iterations):
+        if stage.setup is not None:
+            stage.setup()
+        start = time.perf_counter()
+        await stage.run()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            if stage.setup is not None:
+                stage.setup()
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await stage.run()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        **percentiles(durations),
+        "alloc_peak_kb": round(float(np.median(peaks)) / 1024, 1) if peaks else None,
+    }
+
+
+def build_stages() -> tuple[list[Stage], Callable[[], Awaitable[None]]]:
+    """
+    Etapy w kolejności pipeline'u i funkcja przygotowująca dane wejściowe
+    etapów późniejszych (jednym wywołaniem etapów wcześniejszych).
+    """
+    queries = itertools.cycle(CLASSIFICATION_QUERIES)
+    semaphore = asyncio.Semaphore(8)
+    retriever = calc_materials.get_retriever(PRODUCTS_INDEX, 5)
+    products: list[dict[str, Any]] = []
+    docs: list[Any] = []
+
+    async def retrieval() -> list[dict[str, Any]]:
+        results = await asyncio.gather(
+            *(
+                calc_materials.asearch_material_products(retriever, m, semaphore)
+                for m in MATERIAL_NAMES
+            )
+        )
+        return [p for found in results for p in found]
+
+    async def sql_enrichment() -> None:
+        await asyncio.to_thread(calc_materials.enrich_with_stock, [dict(p) for p in products])
+
+    async def formatting() -> str:
+        return calc_materials.format_material_section(
+            EXTRACTED_MATERIALS["basic_materials"], products, "MATERIAŁY PODSTAWOWE:"
+        )
+
+    async def context_assembly() -> list[Any]:
+        return context_assembler.assemble_context(GENERAL_QUERY, docs).docs
+
+    async def generation() -> str:
+        chain = ask_rag.general_answer_chain()
+        return await chain.ainvoke({"input": GENERAL_QUERY, "context": docs})
+
+    async def prepare() -> None:
+        products.extend(await retrieval())
+        calc_materials.enrich_with_stock(products)
+        docs.extend(await ask_rag.aretrieve_general_context(GENERAL_QUERY))
+
+    return [
+        Stage("classification", lambda: calc_materials.adetermine_query_type(next(queries))),
+        Stage("retrieval", retrieval),
+        # pusty cache stanów - każde wywołanie idzie do bazy
+        Stage("sql_enrichment", sql_enrichment, setup=stock.purge),
+        Stage("web_search", lambda: calc_materials.asearch_materials_info(MATERIALS_QUERY)),
+        Stage("extraction", lambda: calc_materials.aextract_materials(MATERIALS_QUERY)),
+        Stage("formatting", formatting),
+        Stage("context_assembly", context_assembly),
+        Stage("generation", generation),
+        Stage("end_to_end_general", lambda: ask_rag.aanswer_question(GENERAL_QUERY)),
+        Stage(
+            "end_to_end_materials",
+            lambda: calc_materials.acalculate_materials_cost(MATERIALS_QUERY),
+            setup=stock.purge,
+        ),
+    ], prepare
+
+
+async def run_suite(
+    iterations: int, alloc_iterations: int, only: list[str] | None = None
+) -> dict[str, dict[str, Any]]:
+    stages, prepare = build_stages()
+    await prepare()
+    results = {}
+    for stage in stages:
+        if only and stage.name not in only:
+            continue
+        # rozgrzewka: pierwsze wywołanie buduje indeksy i połączenia
+        await stage.run()
+        results[stage.name] = await measure(stage, iterations, alloc_iterations)
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    tolerance: float = 0.25,
+    min_delta_ms: float = 0.5,
+) -> list[str]:
+    """
+    Regresje względem baseline: p95 lub szczyt alokacji większy o więcej niż
+    tolerance (względnie) i min_delta_ms / 16 KB (bezwzględnie, szum pomiaru).
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance) + min_delta_ms:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        base_alloc, alloc = base.get("alloc_peak_kb"), result.get("alloc_peak_kb")
+        if (
+            base_alloc is not None
+            and alloc is not None
+            and alloc > base_alloc * (1 + tolerance) + 16
+        ):
+            regressions.append(f"{name}: alokacje {base_alloc} -> {alloc} KB")
+    return regressions
+
+
+def print_table(results: dict[str, dict[str, Any]]) -> None:
+    print(f"{'etap':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'alloc KB':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<22}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['alloc_peak_kb'] if r['alloc_peak_kb'] is not None else '-':>10}"
+        )
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Benchmark etapów ask_rag")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=5.0)
+    parser.add_argument("--web-latency-ms", type=float, default=5.0)
+    parser.add_argument("--stage", action="append", help="tylko wybrane etapy")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="porównaj z baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # logi pipeline'u przy setkach wywołań zaburzałyby pomiar
+    logging.getLogger("src").setLevel(logging.WARNING)
+    latency = FakeLatency(
+        llm=args.llm_latency_ms / 1000, web_search=args.web_latency_ms / 1000
+    )
+    with tempfile.TemporaryDirectory() as workdir, fake_services(Path(workdir), latency):
+        results = asyncio.run(run_suite(args.iterations, args.alloc_iterations, args.stage))
+    print_table(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), "utf-8")
+        print(f"Zapisano baseline: {args.baseline}")
+    if args.compare:
+        regressions = compare(
+            results, json.loads(args.baseline.read_text("utf-8")), args.tolerance
+        )
+        for regression in regressions:
+            print(f"REGRESJA {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
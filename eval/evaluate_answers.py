@@ -1,50 +1,49 @@
-import json
-from typing import Any
-
-import pandas as pd
-from prompttools.utils import semantic_similarity
-from tqdm import tqdm
-
-with open("eval/model_answers.json", encoding="utf-8") as f:
-    data: list[dict[str, Any]] = json.load(f)
-
-df: pd.DataFrame = pd.DataFrame(data)
+"""
+Podobieństwo semantyczne odpowiedzi pipeline'u do odpowiedzi wzorcowych
+(dawniej prompttools.utils.semantic_similarity wiersz po wierszu). Ocenę przez
+LLM robi eval/runner.py, ten skrypt liczy metrykę niezależną od modelu czatu.
 
+python eval/evaluate_answers.py [--answers eval/scored_answers.json] [--out eval/result.json]
+"""
 
-def eval_row(row: pd.Series) -> dict[str, float]:
-    semsim: float = semantic_similarity(
-        row, row["expected_answer"], response_column_name="model_answer"
-    )
-    return {"semantic_similarity": semsim}
-
-
-results: list[dict[str, float]] = [
-    eval_row(row) for _, row in tqdm(df.iterrows(), total=len(df))
-]
-
-results_df: pd.DataFrame = pd.DataFrame(results)
-df = pd.concat([df, results_df], axis=1)
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
 
-df.to_json("eval/result.json", orient="records", force_ascii=False, indent=2)
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-with open("eval/model_answers.json", encoding="utf-8") as f:
-    data: list[dict[str, Any]] = json.load(f)
+from eval.similarity import DEFAULT_MODEL, get_scorer
 
-df: pd.DataFrame = pd.DataFrame(data)
+EVAL_DIR = Path(__file__).resolve().parent
+# wynik eval/runner.py - odpowiedzi pipeline'u z bieżącego przebiegu
+ANSWERS_PATH = EVAL_DIR / "scored_answers.json"
 
 
-def eval_row(row: pd.Series) -> dict[str, float]:
-    semsim: float = semantic_similarity(
-        row, row["expected_answer"], response_column_name="model_answer"
-    )
-    return {"semantic_similarity": semsim}
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Podobieństwo semantyczne odpowiedzi")
+    parser.add_argument("--answers", type=Path, default=ANSWERS_PATH)
+    parser.add_argument("--out", type=Path, default=EVAL_DIR / "result.json")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model sentence-transformers")
+    args = parser.parse_args()
 
+    records = json.loads(args.answers.read_text("utf-8"))
+    # pytania, na które pipeline zwrócił błąd, nie mają odpowiedzi do porównania
+    failed = [r for r in records if r.get("status", "ok") != "ok"]
+    records = [r for r in records if r.get("status", "ok") == "ok"]
+    if failed:
+        print(f"Pominięto {len(failed)} odpowiedzi z błędem")
+    start = time.perf_counter()
+    scored = get_scorer(args.model).score_records(records)
+    elapsed = time.perf_counter() - start
 
-results: list[dict[str, float]] = [
-    eval_row(row) for _, row in tqdm(df.iterrows(), total=len(df))
-]
+    args.out.write_text(json.dumps(scored, ensure_ascii=False, indent=2), "utf-8")
+    mean = sum(r["semantic_similarity"] for r in scored) / (len(scored) or 1)
+    print(f"{len(scored)} odpowiedzi, średnie podobieństwo {mean:.3f}, czas {elapsed:.2f}s")
 
-results_df: pd.DataFrame = pd.DataFrame(results)
-df = pd.concat([df, results_df], axis=1)
 
-df.to_json("eval/result.json", orient="records", force_ascii=False, indent=2)
+if __name__ == "__main__":
+    main()
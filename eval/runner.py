@@ -0,0 +1,246 @@
+"""
+Ewaluacja RAG: generowanie odpowiedzi i ocena przez LLM równolegle, z limitem
+zapytań na sekundę. Każda oceniona pozycja jest od razu dopisywana do pliku
+checkpointu (JSONL), więc przerwany przebieg wznawia się od miejsca przerwania,
+a pytania zakończone błędem są przy wznowieniu oceniane ponownie.
+Przy każdej ocenie zapisywany jest czas odpowiedzi pipeline'u.
+
+python eval/runner.py [--concurrency 4] [--rate 2] [--restart]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import re
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.ask_rag import aanswer_question
+from src.clients import get_async_llm
+
+EVAL_DIR = Path(__file__).resolve().parent
+QA_PATH = EVAL_DIR.parent / "data" / "test_qa.json"
+CHECKPOINT_PATH = EVAL_DIR / "runner_checkpoint.jsonl"
+RESULTS_PATH = EVAL_DIR / "scored_answers.json"
+
+logger = logging.getLogger(__name__)
+
+JUDGE_PROMPT = """
+Oceń jakość odpowiedzi modelu w porównaniu do oczekiwanej odpowiedzi.
+
+### Oczekiwana odpowiedź:
+{expected}
+
+### Odpowiedź modelu:
+{model}
+
+### Zadanie:
+Oceń zgodność i trafność odpowiedzi modelu względem oczekiwanej
+odpowiedzi w skali od 0.0 do 1.0.
+Zwróć tylko liczbę zmiennoprzecinkową.
+
+Odpowiedź:
+"""
+
+SCORE_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class RateLimiter:
+    """
+    Co najwyżej `rate` rozpoczętych wywołań na sekundę (równe odstępy).
+    """
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._interval = 1 / rate if rate > 0 else 0.0
+        self._clock = clock
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self._interval:
+            return
+        async with self._lock:
+            now = self._clock()
+            wait = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def item_key(item: dict[str, Any]) -> str:
+    return str(item.get("id", item["question"]))
+
+
+def load_checkpoint(path: Path) -> dict[str, dict[str, Any]]:
+    """
+    Wyniki zapisane wcześniej; ucięta ostatnia linia (przerwany zapis) i wpisy
+    z błędem są pomijane - te pytania zostaną ocenione ponownie.
+    """
+    done: dict[str, dict[str, Any]] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "error":
+                continue
+            done[record["key"]] = record
+    return done
+
+
+def _end_with_newline(path: Path) -> None:
+    """
+    po przerwanym zapisie kolejny wpis musi zacząć się w nowej linii
+    """
+    if not path.exists() or not path.stat().st_size:
+        return
+    with path.open("rb+") as f:
+        f.seek(-1, 2)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def parse_score(text: str) -> float | None:
+    match = SCORE_PATTERN.search(text)
+    if not match:
+        return None
+    return max(0.0, min(1.0, float(match.group().replace(",", "."))))
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """
+    percentyl metodą najbliższej pozycji, q w [0, 100]
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(records: list[dict[str, Any]]) -> dict[str, Any]:
+    scores = [r["score"] for r in records if r.get("score") is not None]
+    latencies = [r["latency_ms"] for r in records if r.get("status") == "ok"]
+    return {
+        "items": len(records),
+        "errors": sum(r.get("status") != "ok" for r in records),
+        "mean_score": round(sum(scores) / len(scores), 3) if scores else None,
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p95_ms": percentile(latencies, 95),
+        "latency_max_ms": max(latencies, default=None),
+    }
+
+
+async def default_judge(prompt: str) -> str:
+    response = await get_async_llm().ainvoke(prompt)
+    return str(response.content)
+
+
+@dataclass
+class EvalRunner:
+    answer: Callable[[str], Awaitable[str]] = aanswer_question
+    judge: Callable[[str], Awaitable[str]] = default_judge
+    concurrency: int = 4
+    rate: float = 0.0
+    checkpoint: Path = CHECKPOINT_PATH
+
+    async def _evaluate(
+        self, item: dict[str, Any], limiter: RateLimiter, semaphore: asyncio.Semaphore
+    ) -> dict[str, Any]:
+        record = {
+            "key": item_key(item),
+            "question": item["question"],
+            "expected_answer": item["expected_answer"],
+        }
+        async with semaphore:
+            await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                record["model_answer"] = await self.answer(item["question"])
+                record["status"] = "ok"
+            except Exception as e:
+                logger.warning(f"Błąd odpowiedzi na pytanie {record['key']}: {e}")
+                record["model_answer"] = f"[ERROR] {e}"
+                record["status"] = "error"
+            record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+            record["score"] = None
+            if record["status"] == "ok":
+                await limiter.acquire()
+                prompt = JUDGE_PROMPT.format(
+                    expected=item["expected_answer"], model=record["model_answer"]
+                )
+                try:
+                    record["score"] = parse_score(await self.judge(prompt))
+                except Exception as e:
+                    logger.warning(f"Błąd oceny pytania {record['key']}: {e}")
+        return record
+
+    async def run(self, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Wyniki w kolejności pytań. Pozycje z checkpointu nie są liczone ponownie;
+        każda nowa jest dopisywana do checkpointu zaraz po ocenie.
+        """
+        done = load_checkpoint(self.checkpoint)
+        todo = [item for item in items if item_key(item) not in done]
+        logger.info(f"Ewaluacja: {len(items) - len(todo)} z checkpointu, {len(todo)} do oceny")
+
+        limiter = RateLimiter(self.rate)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        self.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        _end_with_newline(self.checkpoint)
+        with self.checkpoint.open("a", encoding="utf-8") as f:
+            tasks = [
+                asyncio.ensure_future(self._evaluate(item, limiter, semaphore))
+                for item in todo
+            ]
+            for finished, task in enumerate(asyncio.as_completed(tasks), start=1):
+                record = await task
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                done[record["key"]] = record
+                logger.info(
+                    f"[{finished}/{len(todo)}] {record['question']} "
+                    f"ocena={record['score']} czas={record['latency_ms']} ms"
+                )
+        return [done[item_key(item)] for item in items]
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Ewaluacja odpowiedzi RAG")
+    parser.add_argument("--qa", type=Path, default=QA_PATH, help="pytania i odpowiedzi")
+    parser.add_argument("--out", type=Path, default=RESULTS_PATH, help="plik wyników")
+    parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_PATH)
+    parser.add_argument("--concurrency", type=int, default=4, help="pytania naraz")
+    parser.add_argument("--rate", type=float, default=0.0, help="wywołań/s, 0 = bez limitu")
+    parser.add_argument("--restart", action="store_true", help="zacznij od zera")
+    args = parser.parse_args()
+
+    if args.restart:
+        args.checkpoint.unlink(missing_ok=True)
+    items = json.loads(args.qa.read_text("utf-8"))
+    runner = EvalRunner(
+        concurrency=args.concurrency, rate=args.rate, checkpoint=args.checkpoint
+    )
+    records = asyncio.run(runner.run(items))
+
+    results = [{k: v for k, v in r.items() if k != "key"} for r in records]
+    args.out.write_text(json.dumps(results, ensure_ascii=False, indent=2), "utf-8")
+    summary = summarize(records)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
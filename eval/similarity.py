@@ -0,0 +1,110 @@
+"""
+Podobieństwo semantyczne odpowiedzi modelu do oczekiwanych.
+
+Model sentence-transformers jest ładowany raz, wszystkie brakujące teksty są
+kodowane jednym wywołaniem encode, a podobieństwa kosinusowe liczone jedną
+operacją na macierzach. Wektory trafiają do cache embeddingów na dysku
+(src/embedding_cache.py), więc kolejne przebiegi kodują tylko nowe odpowiedzi.
+"""
+
+import logging
+import sys
+from collections.abc import Callable, Sequence
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.embedding_cache import EmbeddingCache, get_embedding_cache
+
+logger = logging.getLogger(__name__)
+
+# ten sam model, którego używał prompttools.utils.semantic_similarity
+DEFAULT_MODEL = "paraphrase-MiniLM-L6-v2"
+
+Encoder = Callable[[list[str]], np.ndarray]
+
+
+def cosine_similarities(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    podobieństwo kosinusowe par wierszy: wynik[i] = cos(left[i], right[i])
+    """
+    left_norms = np.linalg.norm(left, axis=1)
+    right_norms = np.linalg.norm(right, axis=1)
+    dots = np.einsum("ij,ij->i", left, right)
+    denominator = left_norms * right_norms
+    return np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+
+
+@lru_cache(maxsize=2)
+def load_encoder(model_name: str = DEFAULT_MODEL) -> Encoder:
+    from sentence_transformers import (  # noqa: PLC0415 - zależność tylko dla eval (dev)
+        SentenceTransformer,
+    )
+
+    model = SentenceTransformer(model_name)
+
+    def encode(texts: list[str]) -> np.ndarray:
+        return np.asarray(model.encode(texts, batch_size=64, convert_to_numpy=True))
+
+    return encode
+
+
+class SimilarityScorer:
+    def __init__(
+        self,
+        encode: Encoder,
+        model_name: str = DEFAULT_MODEL,
+        cache: EmbeddingCache | None = None,
+    ) -> None:
+        self.encode = encode
+        self.cache_key = f"sentence-transformers/{model_name}"
+        self.cache = cache
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Macierz wektorów dla texts; teksty spoza cache kodowane jednym wywołaniem.
+        """
+        unique = list(dict.fromkeys(texts))
+        cached: list[np.ndarray | None] = [None] * len(unique)
+        if self.cache is not None:
+            cached = self.cache.get_many(self.cache_key, unique)
+        missing = [text for text, vector in zip(unique, cached, strict=True) if vector is None]
+
+        vectors = dict(zip(unique, cached, strict=True))
+        if missing:
+            encoded = np.asarray(self.encode(missing), dtype=np.float32)
+            vectors.update(zip(missing, encoded, strict=True))
+            if self.cache is not None:
+                self.cache.put_many(self.cache_key, missing, encoded)
+        logger.info(
+            f"Embeddingi eval: {len(unique) - len(missing)} z cache, {len(missing)} nowe"
+        )
+        return np.stack([np.asarray(vectors[text], dtype=np.float32) for text in texts])
+
+    def score(self, expected: Sequence[str], answers: Sequence[str]) -> np.ndarray:
+        if not expected:
+            return np.zeros(0, dtype=np.float32)
+        matrix = self.embed([*expected, *answers])
+        return cosine_similarities(matrix[: len(expected)], matrix[len(expected) :])
+
+    def score_records(
+        self,
+        records: list[dict[str, Any]],
+        expected_field: str = "expected_answer",
+        answer_field: str = "model_answer",
+    ) -> list[dict[str, Any]]:
+        scores = self.score(
+            [r[expected_field] for r in records], [r[answer_field] for r in records]
+        )
+        return [
+            {**r, "semantic_similarity": round(float(s), 6)}
+            for r, s in zip(records, scores, strict=True)
+        ]
+
+
+def get_scorer(model_name: str = DEFAULT_MODEL) -> SimilarityScorer:
+    return SimilarityScorer(load_encoder(model_name), model_name, get_embedding_cache())
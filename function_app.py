@@ -1,37 +1,194 @@
 import json
 import logging
+import os
+import threading
+import uuid
+from collections.abc import AsyncIterator
 
-from azure.functions import HttpRequest, HttpResponse
 from azure.functions.decorators import FunctionApp
+from azurefunctions.extensions.http.fastapi import (
+    JSONResponse,
+    PlainTextResponse,
+    Request,
+    Response,
+    StreamingResponse,
+)
 
-from src.ask_rag import ask_rag
+from src.ask_batch import BatchError, aask_batch, parse_questions
+from src.ask_rag import aask_rag, astream_rag
+from src.clients import schedule_async_warm_up, warm_up
+from src.quote import QuoteError, aquote
+from src.tracing import RequestTrace, configure_logging, get_metrics, span, start_request
 
-logging.basicConfig(level=logging.INFO, format="[%(asctime)s] [%(levelname)s] %(message)s")
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FunctionApp()
 
+threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+# klienci asynchroniczni są związani z pętlą workera - rozgrzewani na niej, gdy
+# import odbywa się w działającej pętli, a najpóźniej przy pierwszym żądaniu
+schedule_async_warm_up()
+
+
+def timing_header_enabled() -> bool:
+    return os.getenv("TIMING_HEADER_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def with_trace_headers(response: Response, trace: RequestTrace) -> Response:
+    """
+    X-Request-ID zawsze, rozbicie czasu (Server-Timing) gdy TIMING_HEADER_ENABLED
+    """
+    response.headers["X-Request-ID"] = trace.request_id
+    if timing_header_enabled() and trace.spans:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+async def read_question(req: Request) -> str:
+    try:
+        body = await req.json()
+    except ValueError:
+        return ""
+    return str(body.get("question", "")).strip()
+
 
 @app.function_name(name="ask_rag")
 @app.route(route="ask_rag", methods=["POST"])
-def ask_rag_func(req: HttpRequest) -> HttpResponse:
+async def ask_rag_func(req: Request) -> Response:
+    schedule_async_warm_up()
+    with start_request(req.headers.get("x-request-id")) as trace:
+        return with_trace_headers(await answer_question(req), trace)
+
+
+async def answer_question(req: Request) -> Response:
     try:
-        body = req.get_json()
-        query = body.get("question", "").strip()
+        query = await read_question(req)
         if not query:
             logger.warning("Brak pytania w żądaniu.")
-            return HttpResponse("Brak pytania", status_code=400)
+            return PlainTextResponse("Brak pytania", status_code=400)
 
         logger.info(f"Zapytanie: {query}")
-        answer = ask_rag(query)
+        with span("request.ask_rag"):
+            answer = await aask_rag(query)
 
-        return HttpResponse(
-            json.dumps({"answer": answer}), status_code=200, mimetype="application/json"
-        )
+        return JSONResponse({"answer": answer}, status_code=200)
 
     except Exception:
         logger.exception("Błąd podczas obsługi zapytania.")
-        return HttpResponse(
+        return PlainTextResponse(
             "Wystąpił błąd serwera — nie udało się przetworzyć zapytania.",
             status_code=500,
         )
+
+
+async def sse_events(query: str, request_id: str) -> AsyncIterator[str]:
+    """
+    Server-Sent Events: każdy fragment odpowiedzi jako osobne zdarzenie 'data',
+    na końcu zdarzenie 'end'.
+    """
+    # strumień jest odczytywany już po zwróceniu odpowiedzi - własny kontekst żądania
+    with start_request(request_id), span("request.ask_rag_stream"):
+        async for token in astream_rag(query):
+            if token:
+                yield f"data: {json.dumps({'token': token}, ensure_ascii=False)}\n\n"
+    yield "event: end\ndata: {}\n\n"
+
+
+@app.function_name(name="ask_rag_batch")
+@app.route(route="ask_rag_batch", methods=["POST"])
+async def ask_rag_batch_func(req: Request) -> Response:
+    """
+    Wiele pytań naraz {"questions": [...]}; wynik każdego pytania ma własny status.
+    """
+    schedule_async_warm_up()
+    with start_request(req.headers.get("x-request-id")) as trace:
+        return with_trace_headers(await answer_batch(req), trace)
+
+
+async def answer_batch(req: Request) -> Response:
+    try:
+        questions = parse_questions(await req.json())
+    except ValueError as e:
+        message = str(e) if isinstance(e, BatchError) else "Niepoprawny JSON"
+        logger.warning(f"Niepoprawne zapytanie wsadowe: {message}")
+        return PlainTextResponse(message, status_code=400)
+
+    try:
+        with span("request.ask_rag_batch"):
+            batch = await aask_batch(questions)
+    except Exception:
+        logger.exception("Błąd podczas obsługi zapytania wsadowego.")
+        return PlainTextResponse(
+            "Wystąpił błąd serwera — nie udało się przetworzyć zapytań.",
+            status_code=500,
+        )
+
+    return JSONResponse(batch, status_code=200)
+
+
+@app.function_name(name="ask_rag_stream")
+@app.route(route="ask_rag_stream", methods=["POST"])
+async def ask_rag_stream_func(req: Request) -> Response:
+    schedule_async_warm_up()
+    request_id = req.headers.get("x-request-id") or uuid.uuid4().hex
+    query = await read_question(req)
+    if not query:
+        logger.warning("Brak pytania w żądaniu.")
+        return PlainTextResponse("Brak pytania", status_code=400)
+
+    logger.info(f"Zapytanie (stream): {query}")
+    return StreamingResponse(
+        sse_events(query, request_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Request-ID": request_id,
+        },
+    )
+
+
+@app.function_name(name="quote")
+@app.route(route="quote", methods=["POST"])
+async def quote_func(req: Request) -> Response:
+    """
+    Wycena listy pozycji {"items": [{"text", "quantity", "unit"}]} bez LLM.
+    """
+    schedule_async_warm_up()
+    with start_request(req.headers.get("x-request-id")) as trace:
+        return with_trace_headers(await prepare_quote(req), trace)
+
+
+async def prepare_quote(req: Request) -> Response:
+    try:
+        payload = await req.json()
+    except ValueError:
+        return PlainTextResponse("Niepoprawny JSON", status_code=400)
+
+    try:
+        with span("request.quote"):
+            quote = await aquote(payload)
+    except QuoteError as e:
+        logger.warning(f"Niepoprawne zamówienie: {e}")
+        return PlainTextResponse(str(e), status_code=400)
+    except Exception:
+        logger.exception("Błąd podczas wyceny.")
+        return PlainTextResponse(
+            "Wystąpił błąd serwera — nie udało się przygotować wyceny.",
+            status_code=500,
+        )
+
+    logger.info(f"Wycena: {len(quote['lines'])} pozycji, suma {quote['total']} PLN")
+    return JSONResponse(quote, status_code=200)
+
+
+@app.function_name(name="metrics")
+@app.route(route="metrics", methods=["GET"])
+async def metrics_func(req: Request) -> Response:
+    """
+    metryki etapów w formacie Prometheusa
+    """
+    return PlainTextResponse(
+        get_metrics().render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,116 @@
+"""
+Wiele pytań w jednym żądaniu: powtórzone pytania są obsługiwane raz, naraz
+działa co najwyżej ASK_BATCH_MAX_CONCURRENCY zapytań, a błąd jednego pytania
+nie przerywa pozostałych.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from src.ask_rag import aanswer_question
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+
+
+class BatchError(ValueError):
+    pass
+
+
+def question_key(question: str) -> str:
+    """
+    pytania różniące się tylko wielkością liter i odstępami to to samo pytanie
+    """
+    return " ".join(question.split()).casefold()
+
+
+def parse_questions(payload: Any) -> list[str]:
+    max_questions = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "50"))
+    questions = payload.get("questions") if isinstance(payload, dict) else None
+    if not isinstance(questions, list) or not questions:
+        raise BatchError("Brak listy pytań 'questions'")
+    if len(questions) > max_questions:
+        raise BatchError(f"Za dużo pytań (maksymalnie {max_questions})")
+
+    parsed = []
+    for number, question in enumerate(questions, start=1):
+        if not isinstance(question, str) or not question.strip():
+            raise BatchError(f"Pytanie {number}: oczekiwano niepustego tekstu")
+        parsed.append(question.strip())
+    return parsed
+
+
+async def _answer_one(
+    answer: Callable[[str], Awaitable[str]],
+    question: str,
+    semaphore: asyncio.Semaphore,
+    timeout: float | None,
+) -> dict[str, Any]:
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            result = {
+                "status": OK,
+                "answer": await asyncio.wait_for(answer(question), timeout),
+            }
+        except TimeoutError:
+            logger.warning(f"Przekroczony czas odpowiedzi na pytanie: {question}")
+            result = {"status": TIMEOUT, "error": "Przekroczony czas odpowiedzi"}
+        except Exception as e:
+            logger.exception(f"Błąd odpowiedzi na pytanie: {question}")
+            result = {"status": ERROR, "error": str(e) or type(e).__name__}
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+
+async def aask_batch(
+    questions: list[str],
+    max_concurrency: int | None = None,
+    *,
+    answer: Callable[[str], Awaitable[str]] = aanswer_question,
+) -> dict[str, Any]:
+    """
+    Odpowiedzi w kolejności pytań. Każdy wynik ma status (ok/error/timeout) i czas;
+    powtórzenia dostają wynik pierwszego wystąpienia z duplicate=True.
+    """
+    limit = max_concurrency or int(os.getenv("ASK_BATCH_MAX_CONCURRENCY", "4"))
+    timeout = float(os.getenv("ASK_BATCH_ITEM_TIMEOUT", "0")) or None
+    start = time.perf_counter()
+
+    first: dict[str, str] = {}
+    for question in questions:
+        first.setdefault(question_key(question), question)
+    unique = list(first)
+
+    semaphore = asyncio.Semaphore(max(1, limit))
+    answers = await asyncio.gather(
+        *(_answer_one(answer, first[key], semaphore, timeout) for key in unique)
+    )
+    by_key = dict(zip(unique, answers, strict=True))
+
+    results = []
+    seen = set()
+    for question in questions:
+        key = question_key(question)
+        results.append({"question": question, **by_key[key], "duplicate": key in seen})
+        seen.add(key)
+
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    failed = sum(result["status"] != OK for result in answers)
+    logger.info(
+        f"Zapytanie wsadowe: {len(questions)} pytań, {len(unique)} unikalnych, "
+        f"{failed} błędów, {elapsed_ms} ms"
+    )
+    return {
+        "results": results,
+        "unique": len(unique),
+        "failed": failed,
+        "elapsed_ms": elapsed_ms,
+    }
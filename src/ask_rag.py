@@ -1,23 +1,39 @@
-import json
+import asyncio
 import logging
-import os
 import sys
+from collections.abc import AsyncIterator, Awaitable, Callable
 from pathlib import Path
 from typing import Any
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-import pyodbc
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from dotenv import load_dotenv
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
-from langchain_community.retrievers import AzureAISearchRetriever
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
-
-from src.calc_materials import calculate_materials_cost, determine_query_type
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+
+from src.calc_materials import (
+    acalculate_materials_cost,
+    adetermine_query_type,
+    amaterials_cost,
+    astream_materials_cost,
+)
+from src.clients import (
+    LOCAL_BACKEND,
+    PRODUCTS_INDEX,
+    REGULAMIN_INDEX,
+    get_async_embeddings,
+    get_async_llm,
+    get_retriever,
+    get_search_client,
+    run_sync,
+    search_backend,
+)
+from src.context_assembler import assemble_context
+from src.local_search import get_local_index
+from src.semantic_cache import get_semantic_cache
+from src.stock import get_product_quantity_and_price
+from src.tracing import span
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,50 +42,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-cfg = Path(__file__).parent.parent / "local.settings.json"
-if cfg.exists():
-    data = json.loads(cfg.read_text("utf-8")).get("Values", {})
-    for k, v in data.items():
-        os.environ.setdefault(k, v)
-
-search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-search_key = os.getenv("AZURE_SEARCH_KEY")
-products_index = "products-index"
-
-search_client_products = SearchClient(
-    endpoint=search_endpoint,
-    index_name=products_index,
-    credential=AzureKeyCredential(search_key),
-)
-
-
-def connect_sql():
-    return pyodbc.connect(os.getenv("SQL_CONNECTION_STRING"))
-
-
-def get_product_quantity_and_price(product_id: str) -> tuple[int, float] | None:
-    try:
-        conn = connect_sql()
-        cursor = conn.cursor()
-        cursor.execute("SELECT quantity, price FROM stock WHERE product_id = ?", product_id)
-        row = cursor.fetchone()
-        conn.close()
-        return (row.quantity, row.price) if row else None
-    except Exception as e:
-        logger.warning(f"SQL Error: {e}")
-        return None
-
 
 def find_best_product_match(query: str) -> dict[str, Any] | None:
+    if search_backend() == LOCAL_BACKEND:
+        results = get_local_index().search(query, top_k=1, name_only=True)
+        return results[0] if results else None
     try:
-        results = search_client_products.search(
-            search_text=query,
-            top=1,
-            search_fields=["name"],
-        )
-        for doc in results:
-            return doc
+        with span(f"search.{PRODUCTS_INDEX}"):
+            results = get_search_client(PRODUCTS_INDEX).search(
+                search_text=query,
+                top=1,
+                search_fields=["name"],
+            )
+            for doc in results:
+                return doc
     except Exception as e:
         logger.warning(f"Błąd w wyszukiwaniu produktu: {e}")
     return None
@@ -78,11 +64,13 @@ def find_best_product_match(query: str) -> dict[str, Any] | None:
 def find_alternatives_by_category(
     category: str, exclude_id: str | None = None, max_results: int = 3
 ) -> list[dict[str, Any]]:
+    if search_backend() == LOCAL_BACKEND:
+        return get_local_index().by_category(category, exclude_id, max_results)
     try:
         filter_query = f"category eq '{category}'"
         if exclude_id:
             filter_query += f" and id ne '{exclude_id}'"
-        results = search_client_products.search(
+        results = get_search_client(PRODUCTS_INDEX).search(
             search_text="*",
             filter=filter_query,
             top=max_results,
@@ -93,94 +81,245 @@ def find_alternatives_by_category(
         return []
 
 
-def handle_general_query(query: str) -> str:
-    try:
-        logger.info(f"General query: {query}")
-        search_service_name = search_endpoint.split("//")[-1].split(".")[0]
-
-        retriever_products = AzureAISearchRetriever(
-            content_key="content",
-            index_name="products-index",
-            top_k=3,
-            service_name=search_service_name,
-            api_key=search_key,
-        )
-        retriever_regulamin = AzureAISearchRetriever(
-            content_key="content",
-            index_name="regulamin-index",
-            top_k=3,
-            service_name=search_service_name,
-            api_key=search_key,
-        )
-
-        docs_products = retriever_products.invoke(query)
-        docs_regulamin = retriever_regulamin.invoke(query)
-        all_docs = docs_products + docs_regulamin
+def best_product_match(docs: list[Document]) -> dict[str, Any] | None:
+    """
+    najlepiej dopasowany produkt z wyników retrievera (bez osobnego wyszukiwania)
+    """
+    for doc in docs:
+        if doc.metadata.get("id"):
+            return {"id": doc.metadata["id"], "name": doc.metadata.get("name", "")}
+    return None
 
-        if not all_docs:
-            return "Brak informacji w bazie wiedzy."
 
-        product_details = []
-        matched_product = find_best_product_match(query)
+def describe_matched_product(matched_product: dict[str, Any] | None) -> list[str]:
+    if not matched_product:
+        return []
+    sql_data = get_product_quantity_and_price(matched_product["id"])
+    if not sql_data:
+        return []
+    quantity, price = sql_data
+    return [f"Produkt '{matched_product['name']}': Ilość: {quantity}, Cena: {price} zł"]
 
-        if matched_product:
-            matched_name = matched_product["name"]
-            matched_id = matched_product["id"]
 
-            sql_data = get_product_quantity_and_price(matched_id)
-            if sql_data:
-                quantity, price = sql_data
-                product_details.append(
-                    f"Produkt '{matched_name}': Ilość: {quantity}, Cena: {price} zł"
-                )
+GENERAL_PROMPT = PromptTemplate.from_template(
+    "Jesteś asystentem klienta hurtowni B2B.\n"
+    "Odpowiedz na podstawie poniższych dokumentów:\n\n"
+    "{context}\n\nPytanie: {input}\nOdpowiedź:"
+)
 
-        enriched_docs = all_docs.copy()
-        if product_details:
-            sql_info_doc = Document(
-                page_content="\n".join(product_details),
-                metadata={"source": "sql", "type": "product_data"},
-            )
-            enriched_docs.append(sql_info_doc)
 
-        llm = AzureAIChatCompletionsModel(
-            endpoint=os.getenv("AZURE_FOUNDRY_ENDPOINT"),
-            credential=os.getenv("AZURE_FOUNDRY_KEY"),
-            model=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT"),
-            temperature=0.0,
+async def traced_search(
+    retriever: BaseRetriever, index_name: str, query: str
+) -> list[Document]:
+    with span(f"search.{index_name}") as attributes:
+        docs = await retriever.ainvoke(query)
+        attributes["results"] = len(docs)
+    for doc in docs:
+        # źródło dokumentu dla deduplikacji kontekstu (context_assembler)
+        doc.metadata.setdefault("index", index_name)
+    return docs
+
+
+async def aretrieve_general_context(query: str) -> list[Document]:
+    """
+    dokumenty z obu indeksów + dane SQL najlepiej dopasowanego produktu
+    (pusta lista, gdy nic nie znaleziono)
+    """
+    retriever_products = get_retriever(PRODUCTS_INDEX, 3)
+    retriever_regulamin = get_retriever(REGULAMIN_INDEX, 3)
+
+    regulamin_task = asyncio.ensure_future(
+        traced_search(retriever_regulamin, REGULAMIN_INDEX, query)
+    )
+    try:
+        # zapytanie SQL startuje, gdy tylko znany jest najlepszy produkt,
+        # równolegle z wyszukiwaniem w regulaminie
+        docs_products = await traced_search(retriever_products, PRODUCTS_INDEX, query)
+        product_details = await asyncio.to_thread(
+            describe_matched_product, best_product_match(docs_products)
         )
+        docs_regulamin = await regulamin_task
+    finally:
+        regulamin_task.cancel()
+
+    all_docs = docs_products + docs_regulamin
+
+    if not all_docs:
+        return []
 
-        prompt = PromptTemplate.from_template(
-            "Jesteś asystentem klienta hurtowni B2B.\n"
-            "Odpowiedz na podstawie poniższych dokumentów:\n\n"
-            "{context}\n\nPytanie: {input}\nOdpowiedź:"
+    enriched_docs = all_docs.copy()
+    if product_details:
+        sql_info_doc = Document(
+            page_content="\n".join(product_details),
+            metadata={"source": "sql", "type": "product_data"},
         )
+        enriched_docs.append(sql_info_doc)
+    return enriched_docs
+
+
+def general_answer_chain() -> Runnable:
+    # langchain.chains jest ciężki w imporcie, potrzebny dopiero przy pierwszej odpowiedzi
+    from langchain.chains.combine_documents import (  # noqa: PLC0415
+        create_stuff_documents_chain,
+    )
+
+    return create_stuff_documents_chain(llm=get_async_llm(), prompt=GENERAL_PROMPT)
 
-        chain = create_stuff_documents_chain(llm=llm, prompt=prompt)
-        response = chain.invoke({"input": query, "context": enriched_docs})
 
-        return response
+async def aembed_question(query: str) -> list[float] | None:
+    try:
+        with span("embedding"):
+            return await get_async_embeddings().aembed_query(query)
+    except Exception as e:
+        logger.warning(f"Nie udało się policzyć embeddingu pytania: {e}")
+        return None
+
 
+async def acached_answer_or_context(
+    query: str,
+) -> tuple[str | None, list[float] | None, list[Document]]:
+    """
+    (odpowiedź z cache, embedding pytania, dokumenty kontekstu).
+    Embedding liczony równolegle z wyszukiwaniem - przy trafieniu w cache
+    wyszukiwanie jest przerywane.
+    """
+    context_task = asyncio.ensure_future(aretrieve_general_context(query))
+    try:
+        vector = await aembed_question(query) if get_semantic_cache() else None
+        if vector is not None:
+            cached = get_semantic_cache().lookup(vector, query)
+            if cached is not None:
+                return cached, vector, []
+        return None, vector, await context_task
+    finally:
+        context_task.cancel()
+
+
+def remember_answer(
+    query: str, vector: list[float] | None, answer: str, docs: list[Document]
+) -> None:
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None or vector is None:
+        return
+    product_ids = [doc.metadata["id"] for doc in docs if doc.metadata.get("id")]
+    semantic_cache.store(vector, answer, product_ids, query)
+
+
+async def aanswer_general_query(query: str) -> str:
+    """
+    odpowiedź na pytanie ogólne; błędy wyszukiwania i LLM są zgłaszane dalej
+    """
+    logger.info(f"General query: {query}")
+    cached, vector, enriched_docs = await acached_answer_or_context(query)
+    if cached is not None:
+        return cached
+    if not enriched_docs:
+        return "Brak informacji w bazie wiedzy."
+
+    context = assemble_context(query, enriched_docs).docs
+    chain = general_answer_chain()
+    response = await chain.ainvoke({"input": query, "context": context})
+    # wszystkie znalezione produkty, także te poza kontekstem - zmiana ceny
+    # dopasowanego produktu musi unieważnić odpowiedź
+    remember_answer(query, vector, response, enriched_docs)
+    return response
+
+
+async def ahandle_general_query(query: str) -> str:
+    try:
+        return await aanswer_general_query(query)
     except Exception as e:
         logger.error(f"Błąd w handle_general_query: {e}")
         return "Wystąpił błąd przetwarzania zapytania."
 
 
-def ask_rag(query: str) -> str:
+async def astream_general_query(query: str) -> AsyncIterator[str]:
+    """
+    jak ahandle_general_query, ale tokeny odpowiedzi wysyłane na bieżąco
+    """
     try:
-        logger.info(f"Zapytanie użytkownika: {query}")
-        query_type = determine_query_type(query)
-        logger.info(f"Typ zapytania: {query_type}")
+        logger.info(f"General query (stream): {query}")
+        cached, vector, enriched_docs = await acached_answer_or_context(query)
+        if cached is not None:
+            yield cached
+            return
+        if not enriched_docs:
+            yield "Brak informacji w bazie wiedzy."
+            return
+
+        context = assemble_context(query, enriched_docs).docs
+        chain = general_answer_chain()
+        chunks = []
+        async for chunk in chain.astream({"input": query, "context": context}):
+            chunks.append(chunk)
+            yield chunk
+        remember_answer(query, vector, "".join(chunks), enriched_docs)
 
-        if query_type == "materials_calculation":
-            return calculate_materials_cost(query)
+    except Exception as e:
+        logger.error(f"Błąd w astream_general_query: {e}")
+        yield "Wystąpił błąd przetwarzania zapytania."
+
+
+def handle_general_query(query: str) -> str:
+    return run_sync(ahandle_general_query(query))
+
+
+async def _aroute(
+    query: str,
+    general: Callable[[str], Awaitable[str]],
+    materials: Callable[[str], Awaitable[str]],
+) -> str:
+    logger.info(f"Zapytanie użytkownika: {query}")
+    query_type = await adetermine_query_type(query)
+    logger.info(f"Typ zapytania: {query_type}")
+
+    if query_type == "materials_calculation":
+        return await materials(query)
+    return await general(query)
 
-        return handle_general_query(query)
+
+async def aanswer_question(query: str) -> str:
+    """
+    jak aask_rag, ale błędy (także wyszukiwania i LLM w obu ścieżkach) są
+    zgłaszane dalej zamiast tekstu zastępczego - np. dla zapytań wsadowych
+    """
+    return await _aroute(query, aanswer_general_query, amaterials_cost)
+
+
+async def aask_rag(query: str) -> str:
+    try:
+        return await _aroute(query, ahandle_general_query, acalculate_materials_cost)
 
     except Exception:
         logger.exception("Wewnętrzny błąd ask_rag")
         return "Błąd podczas przetwarzania zapytania."
 
 
+async def astream_rag(query: str) -> AsyncIterator[str]:
+    try:
+        logger.info(f"Zapytanie użytkownika (stream): {query}")
+        query_type = await adetermine_query_type(query)
+        logger.info(f"Typ zapytania: {query_type}")
+
+        if query_type == "materials_calculation":
+            parts = astream_materials_cost(query)
+        else:
+            parts = astream_general_query(query)
+        async for part in parts:
+            yield part
+
+    except Exception:
+        logger.exception("Wewnętrzny błąd astream_rag")
+        yield "Błąd podczas przetwarzania zapytania."
+
+
+def ask_rag(query: str) -> str:
+    """
+    synchroniczny wrapper na aask_rag (CLI, skrypty eval)
+    """
+    return run_sync(aask_rag(query))
+
+
 if __name__ == "__main__":
     user_query = input("Zadaj pytanie: ")
     print(ask_rag(user_query))
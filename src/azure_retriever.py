@@ -0,0 +1,33 @@
+from typing import Any
+
+from langchain_community.retrievers import AzureAISearchRetriever
+from langchain_core.documents import Document
+
+from src.clients import get_async_search_client
+
+
+class PooledAzureAISearchRetriever(AzureAISearchRetriever):
+    """
+    AzureAISearchRetriever korzystający ze współdzielonej sesji requests
+    zamiast nowego połączenia przy każdym wyszukiwaniu.
+    """
+
+    session: Any = None
+
+    def _search(self, query: str) -> list[dict]:
+        if self.session is None:
+            return super()._search(query)
+        response = self.session.get(self._build_search_url(query), headers=self._headers)
+        if response.status_code != 200:  # noqa: PLR2004
+            raise Exception(f"Error in search request: {response}")
+        return response.json()["value"]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: Any
+    ) -> list[Document]:
+        client = get_async_search_client(self.index_name)
+        results = await client.search(search_text=query, top=self.top_k)
+        return [
+            Document(page_content=result.pop(self.content_key), metadata=result)
+            async for result in results
+        ]
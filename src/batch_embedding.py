@@ -0,0 +1,126 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+HTTP_TOO_MANY_REQUESTS = 429
+HTTP_SERVER_ERROR = 500
+# błędy połączenia klienta OpenAI/httpx (bez importu tych bibliotek)
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError"}
+
+
+class EmbeddingProgress:
+    """
+    Postęp embeddingu: liczba dokumentów, przepustowość i ponowienia po
+    błędach przejściowych (429, 5xx, połączenie).
+    """
+
+    def __init__(self, total: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.total = total
+        self.done = 0
+        self.batches = 0
+        self.retries = 0
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    def add_batch(self, size: int) -> None:
+        with self._lock:
+            self.done += size
+            self.batches += 1
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def throughput(self) -> float:
+        elapsed = self._clock() - self._started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        # przy strumieniowym przetwarzaniu liczba dokumentów nie jest znana z góry
+        done = f"{self.done}/{self.total}" if self.total else str(self.done)
+        return (
+            f"{done} dokumentów, {self.batches} paczek, "
+            f"{self.throughput:.1f} dok./s, ponowienia: {self.retries}"
+        )
+
+
+def _retry_after(error: Exception) -> float | None:
+    """
+    Minimalny czas oczekiwania przed ponowieniem: Retry-After dla 429, 0 dla
+    błędów serwera (5xx), przekroczenia czasu i zerwanego połączenia; None dla
+    błędów, których ponawianie nic nie da (np. 400).
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status >= HTTP_SERVER_ERROR:
+        return 0.0
+    if isinstance(error, TimeoutError | ConnectionError) or any(
+        cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__
+    ):
+        return 0.0
+    if status != HTTP_TOO_MANY_REQUESTS:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+@dataclass(frozen=True)
+class BatchSettings:
+    batch_size: int = 64
+    max_in_flight: int = 4
+    max_retries: int = 6
+    base_delay: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "BatchSettings":
+        return cls(
+            batch_size=int(os.getenv("EMBED_BATCH_SIZE", "64")),
+            max_in_flight=int(os.getenv("EMBED_MAX_IN_FLIGHT", "4")),
+            max_retries=int(os.getenv("EMBED_MAX_RETRIES", "6")),
+        )
+
+
+def embed_with_retry(
+    embed: Callable[[list[str]], list[list[float]]],
+    batch: list[str],
+    settings: BatchSettings,
+    progress: EmbeddingProgress,
+    sleep: Callable[[float], None] = time.sleep,
+) -> list[list[float]]:
+    """
+    Po błędzie przejściowym (429, 5xx, timeout, połączenie) paczka jest
+    ponawiana z wykładniczym opóźnieniem (co najmniej Retry-After), inne błędy
+    przechodzą dalej.
+    """
+    attempt = 0
+    while True:
+        try:
+            vectors = embed(batch)
+        except Exception as e:
+            retry_after = _retry_after(e)
+            if retry_after is None or attempt >= settings.max_retries:
+                raise
+            delay = max(retry_after, settings.base_delay * 2**attempt) * random.uniform(
+                1, 1.25
+            )
+            logger.warning(
+                f"Błąd przejściowy embeddingu ({type(e).__name__}: {e}), "
+                f"ponawiam za {delay:.1f}s"
+            )
+            progress.add_retry()
+            sleep(delay)
+            attempt += 1
+            continue
+        progress.add_batch(len(batch))
+        return vectors
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from typing import Any
+
+
+class TTLCache:
+    """
+    Cache w pamięci procesu: ograniczony rozmiar (LRU) i TTL dla każdego wpisu.
+    Zlicza trafienia, chybienia, wpisy przeterminowane i usunięte.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._hit_age_total = 0.0
+
+    def _lookup(self, key: Hashable, now: float) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return False, None
+        stored_at, value = entry
+        age = now - stored_at
+        if age > self.ttl_seconds:
+            del self._entries[key]
+            self._expired += 1
+            self._misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        self._hit_age_total += age
+        return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._lookup(key, self._clock())
+        return value if found else default
+
+    def get_many(self, keys: Iterable[Hashable]) -> dict[Hashable, Any]:
+        with self._lock:
+            now = self._clock()
+            found = {}
+            for key in keys:
+                hit, value = self._lookup(key, now)
+                if hit:
+                    found[key] = value
+            return found
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: dict[Hashable, Any]) -> None:
+        with self._lock:
+            now = self._clock()
+            for key, value in items.items():
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable] | None = None) -> int:
+        """
+        Usuwa podane klucze (albo wszystko, gdy keys=None). Zwraca liczbę usuniętych.
+        """
+        with self._lock:
+            if keys is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                removed = sum(self._entries.pop(key, None) is not None for key in keys)
+            self._invalidations += removed
+            return removed
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "avg_hit_age_s": self._hit_age_total / self._hits if self._hits else 0.0,
+            }
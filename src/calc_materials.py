@@ -1,17 +1,33 @@
-import json
+import asyncio
 import logging
+import math
 import os
+import sqlite3
+import sys
+from collections import defaultdict
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
-import pyodbc
-from dotenv import load_dotenv
-from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
-from langchain_community.retrievers import AzureAISearchRetriever
-from langchain_community.tools import DuckDuckGoSearchRun
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 
+from src.clients import PRODUCTS_INDEX, get_async_llm, get_retriever, run_sync
+from src.extraction_cache import get_extraction_cache
+from src.materials_catalog import estimate_materials
+from src.nlp_utils import stem_tokens
+from src.query_router import (
+    GENERAL,
+    GENERAL_EXAMPLES,
+    MATERIALS_CALCULATION,
+    MATERIALS_EXAMPLES,
+    get_router,
+)
+from src.stock import get_products_quantity_and_price
+from src.tracing import span
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] [%(levelname)s] %(message)s",
@@ -19,44 +35,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-cfg = Path(__file__).parent.parent / "local.settings.json"
-if cfg.exists():
-    data = json.loads(cfg.read_text("utf-8")).get("Values", {})
-    for k, v in data.items():
-        os.environ.setdefault(k, v)
 
-load_dotenv()
-
-
-def connect_sql():
-    return pyodbc.connect(os.getenv("SQL_CONNECTION_STRING"))
+async def adetermine_query_type(query: str) -> str:
+    """
+    'materials_calculation' lub 'general'
+    """
+    with span("classification"):
+        return await get_router().aroute(query, aclassify_query_with_llm)
 
-def get_product_quantity_and_price(product_id: str) -> tuple[int, float] | None:
 
-    try:
-        conn = connect_sql()
-        cursor = conn.cursor()
-        cursor.execute("SELECT quantity, price FROM stock WHERE product_id = ?", product_id)
-        row = cursor.fetchone()
-        conn.close()
-        return (row.quantity, row.price) if row else None
-    except Exception as e:
-        logger.warning(f"SQL Error: {e}")
-        return None
+def determine_query_type(query: str) -> str:
+    return run_sync(adetermine_query_type(query))
 
 
-def determine_query_type(query: str) -> str:
-    """
-    'materials_calculation' lub 'general'
-    """
+async def aclassify_query_with_llm(query: str) -> str:
     try:
-        llm = AzureAIChatCompletionsModel(
-            endpoint=os.getenv("AZURE_FOUNDRY_ENDPOINT"),
-            credential=os.getenv("AZURE_FOUNDRY_KEY"),
-            model=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT"),
-            temperature=0.0,
-        )
+        llm = get_async_llm()
 
+        materials_examples = "".join(f"- {q}\n" for q in MATERIALS_EXAMPLES)
+        general_examples = "".join(f"- {q}\n" for q in GENERAL_EXAMPLES)
         classification_prompt = PromptTemplate.from_template(
             "Jesteś ekspertem w klasyfikacji zapytań klientów hurtowni budowlanej.\n"
             "Musisz określić typ zapytania i odpowiedzieć TYLKO jednym słowem.\n\n"
@@ -65,43 +62,43 @@ def determine_query_type(query: str) -> str:
             "ile potrzebuje do konkretnego zadania budowlanego\n"
             "general - wszystkie inne zapytania\n\n"
             "PRZYKŁADY materials_calculation:\n"
-            "- Chcę wyremontować łazienkę 10m²\n"
-            "- Ile potrzebuję materiałów do malowania pokoju?\n"
-            "- Chcę zbudować taras 20m²\n"
-            "- Potrzebuję materiałów na remont kuchni\n"
-            "- Materiały do budowy tarasu 15m²\n\n"
+            f"{materials_examples}\n"
             "PRZYKŁADY general:\n"
-            "- Czy macie cement?\n"
-            "- Ile kosztuje farba?\n"
-            "- Jaki jest regulamin zwrotów?\n"
-            "- Jakie macie płytki?\n\n"
+            f"{general_examples}\n"
             "Zapytanie klienta: '{query}'\n\n"
             "Odpowiedź (TYLKO jedno słowo):"
         )
 
         chain = classification_prompt | llm
-        response = chain.invoke({"query": query})
+        response = await chain.ainvoke({"query": query})
 
         if hasattr(response, "content"):
             result = response.content.strip()
         else:
             result = str(response).strip()
 
-        if "materials_calculation" in result:
-            return "materials_calculation"
+        if MATERIALS_CALCULATION in result:
+            return MATERIALS_CALCULATION
         else:
-            return "general"
+            return GENERAL
 
     except Exception as e:
         logger.error(f"Błąd podczas klasyfikacji zapytania: {e}")
-        return "general"
+        return GENERAL
 
 
-def search_materials_info(query: str) -> str:
+def web_search_tool() -> Any:
+    from langchain_community.tools import DuckDuckGoSearchRun  # noqa: PLC0415
+
+    return DuckDuckGoSearchRun()
+
+
+async def asearch_materials_info(query: str) -> str:
     try:
         search_query = f"materiały budowlane potrzebne do {query} lista ilość"
-        search = DuckDuckGoSearchRun()
-        search_results = search.run(search_query)
+        search = web_search_tool()
+        with span("web_search"):
+            search_results = await search.ainvoke(search_query)
         logger.info(f"Wyniki wyszukiwania dla: {search_query}")
         return search_results
     except Exception as e:
@@ -109,52 +106,62 @@ def search_materials_info(query: str) -> str:
         return "Nie udało się wyszukać informacji o materiałach."
 
 
-def find_products_in_database(materials_list: list[str]) -> list[dict[str, Any]]:
+def search_materials_info(query: str) -> str:
+    return run_sync(asearch_materials_info(query))
+
+
+async def asearch_material_products(
+    retriever: Any, material: str, semaphore: asyncio.Semaphore
+) -> list[dict[str, Any]]:
+    """
+    wyszukiwanie produktów dla jednego materiału, błąd nie przerywa pozostałych
+    """
+    try:
+        async with semaphore:
+            with span(f"search.{PRODUCTS_INDEX}"):
+                docs = await retriever.ainvoke(material)
+    except Exception as e:
+        logger.error(f"Błąd podczas wyszukiwania produktu {material}: {e}")
+        return []
+    return [
+        {
+            "content": doc.page_content,
+            "metadata": doc.metadata,
+            "search_term": material,
+            "rank": rank,
+            # tokeny liczone raz, przy dopasowaniu do materiału tylko porównanie zbiorów
+            "tokens": frozenset(
+                stem_tokens(f"{doc.metadata.get('name', '')} {doc.page_content}")
+            ),
+        }
+        for rank, doc in enumerate(docs)
+    ]
+
+
+async def afind_products_in_database(
+    materials_list: list[str], max_concurrency: int | None = None
+) -> list[dict[str, Any]]:
+    """
+    Wyszukiwania dla wszystkich materiałów jednocześnie (co najwyżej max_concurrency,
+    domyślnie MATERIALS_MAX_CONCURRENCY), potem jedno zapytanie o stany i ceny.
+    """
     try:
-        search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT") or ""
-        search_service_name = search_endpoint.split("//")[-1].split(".")[0]
-        search_api_key = os.getenv("AZURE_SEARCH_KEY") or ""
-
-        products_retriever = AzureAISearchRetriever(
-            content_key="content",
-            index_name="products-index",
-            top_k=5,
-            service_name=search_service_name,
-            api_key=search_api_key,
+        products_retriever = get_retriever(PRODUCTS_INDEX, 5)
+        materials = list(dict.fromkeys(m for m in materials_list if m))
+        if not materials:
+            return []
+
+        limit = max_concurrency or int(os.getenv("MATERIALS_MAX_CONCURRENCY", "8"))
+        semaphore = asyncio.Semaphore(limit)
+        results = await asyncio.gather(
+            *(
+                asearch_material_products(products_retriever, material, semaphore)
+                for material in materials
+            )
         )
+        found_products = [product for products in results for product in products]
 
-        found_products = []
-
-        for material in materials_list:
-            try:
-                docs = products_retriever.invoke(material)
-
-                for doc in docs:
-                    product_info = {
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "search_term": material,
-                    }
-                    
-                    product_id = doc.metadata.get("id")
-                    if product_id:
-                        sql_data = get_product_quantity_and_price(product_id)
-                        if sql_data:
-                            quantity, price = sql_data
-                            product_info["current_quantity"] = quantity
-                            product_info["current_price"] = price
-                        else:
-                            product_info["current_quantity"] = 0
-                            product_info["current_price"] = None
-                    else:
-                        product_info["current_quantity"] = 0
-                        product_info["current_price"] = None
-                    
-                    found_products.append(product_info)
-
-            except Exception as e:
-                logger.error(f"Błąd podczas wyszukiwania produktu {material}: {e}")
-
+        await asyncio.to_thread(enrich_with_stock, found_products)
         return found_products
 
     except Exception as e:
@@ -162,31 +169,81 @@ def find_products_in_database(materials_list: list[str]) -> list[dict[str, Any]]
         return []
 
 
+def find_products_in_database(
+    materials_list: list[str], max_concurrency: int | None = None
+) -> list[dict[str, Any]]:
+    return run_sync(afind_products_in_database(materials_list, max_concurrency))
+
+
+def enrich_with_stock(products: list[dict[str, Any]]) -> None:
+    """
+    uzupełnia current_quantity/current_price jednym zapytaniem do bazy
+    """
+    stock = get_products_quantity_and_price(
+        p["metadata"].get("id") for p in products if p["metadata"].get("id")
+    )
+    for product_info in products:
+        quantity, price = stock.get(product_info["metadata"].get("id"), (0, None))
+        product_info["current_quantity"] = quantity
+        product_info["current_price"] = price
+
+
 def format_product_info(product, material_name):
     name = product["metadata"].get("name", "Produkt")
     current_price = product.get("current_price")
     current_quantity = product.get("current_quantity", 0)
     if current_price is not None:
-        availability = (
-            "✅ Dostępny" if current_quantity > 0 else "❌ Brak w magazynie"
-        )
-        return (
-            f"    - {name}: {current_price} zł "
-            f"({availability}, {current_quantity} szt.)\n"
-        )
+        availability = "✅ Dostępny" if current_quantity > 0 else "❌ Brak w magazynie"
+        return f"    - {name}: {current_price} zł ({availability}, {current_quantity} szt.)\n"
     else:
         return f"    - {name}: ❌ Brak danych o cenie i dostępności\n"
 
+
+def group_by_search_term(products: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+    grouped: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for product in products:
+        grouped[product["search_term"]].append(product)
+    return grouped
+
+
+def match_score(material_tokens: set[str], product: dict[str, Any]) -> float:
+    """
+    udział słów z nazwy materiału obecnych w produkcie (0-1)
+    """
+    matched = material_tokens & product.get("tokens", frozenset())
+    return len(matched) / (len(material_tokens) or 1)
+
+
+def rank_products(
+    material_name: str, candidates: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """
+    Kandydaci znalezieni dla materiału, od najlepszego: udział słów z nazwy
+    materiału w produkcie, dostępność, cena, kolejność z wyszukiwarki.
+    """
+    material_tokens = set(stem_tokens(material_name))
+
+    def key(product: dict[str, Any]) -> tuple[float, bool, float, int]:
+        price = product.get("current_price")
+        return (
+            -match_score(material_tokens, product),
+            product.get("current_quantity", 0) <= 0,
+            price if price is not None else math.inf,
+            product.get("rank", 0),
+        )
+
+    return sorted(candidates, key=key)
+
+
 def format_material_section(materials, products, section_title):
+    by_term = group_by_search_term(products)
     result = f"{section_title}\n"
     for material in materials:
         material_name = material.get("name", "")
         quantity = material.get("quantity", "")
         unit = material.get("unit", "")
         result += f"• {material_name}: {quantity} {unit}\n"
-        matching_products = [
-            p for p in products if material_name.lower() in p["content"].lower()
-        ]
+        matching_products = rank_products(material_name, by_term.get(material_name, []))
         if matching_products:
             result += "  Dostępne produkty:\n"
             for product in matching_products[:2]:
@@ -196,68 +253,140 @@ def format_material_section(materials, products, section_title):
         result += "\n"
     return result
 
-def calculate_materials_cost(query: str) -> str:
+
+MATERIALS_ERROR_MESSAGE = "Wystąpił błąd podczas kalkulacji materiałów. Spróbuj ponownie."
+
+
+async def aextract_materials(query: str) -> dict[str, Any]:
     """
-    kalkulacja materiałów
+    lista materiałów z wyszukiwania w internecie i ekstrakcji przez LLM
     """
-    try:
-        logger.info(f"Kalkulacja materiałów dla: {query}")
-        search_results = search_materials_info(query)
-        llm = AzureAIChatCompletionsModel(
-            endpoint=os.getenv("AZURE_FOUNDRY_ENDPOINT") or "",
-            credential=os.getenv("AZURE_FOUNDRY_KEY") or "",
-            model=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT") or "",
-            temperature=0.0,
-        )
-        analysis_prompt = PromptTemplate.from_template(
-            "Na podstawie informacji z internetu, wyodrębnij materiały potrzebne do:"
-            "{query}\n\n"
-            "Informacje z internetu:\n{search_results}\n\n"
-            "Podziel materiały na dwie kategorie:\n"
-            "1. PODSTAWOWE - absolutnie niezbędne do wykonania zadania\n"
-            "2. DODATKOWE - mogą być pomocne, ale nie są konieczne\n\n"
-            "Zwróć JSON w formacie:\n"
-            "{{\n"
-            '  "basic_materials": [\n'
-            '    {{"name": "nazwa", "quantity": "ilość", "unit": "jednostka"}}\n'
-            "  ],\n"
-            '  "additional_materials": [\n'
-            '    {{"name": "nazwa", "quantity": "ilość", "unit": "jednostka"}}\n'
-            "  ]\n"
-            "}}"
-        )
-        parser = JsonOutputParser()
-        analysis_chain = analysis_prompt | llm | parser
-        materials_analysis = analysis_chain.invoke(
-            {"query": query, "search_results": search_results}
-        )
-        basic_materials = materials_analysis.get("basic_materials", [])
-        additional_materials = materials_analysis.get("additional_materials", [])
-        basic_names = [m.get("name", "") for m in basic_materials]
-        additional_names = [m.get("name", "") for m in additional_materials]
-        basic_products = find_products_in_database(basic_names)
-        additional_products = find_products_in_database(additional_names)
-        result = "KALKULACJA MATERIAŁÓW\n\n"
-        result += format_material_section(
-            basic_materials, basic_products, "MATERIAŁY PODSTAWOWE (niezbędne):"
+    search_results = await asearch_materials_info(query)
+    llm = get_async_llm()
+    analysis_prompt = PromptTemplate.from_template(
+        "Na podstawie informacji z internetu, wyodrębnij materiały potrzebne do:"
+        "{query}\n\n"
+        "Informacje z internetu:\n{search_results}\n\n"
+        "Podziel materiały na dwie kategorie:\n"
+        "1. PODSTAWOWE - absolutnie niezbędne do wykonania zadania\n"
+        "2. DODATKOWE - mogą być pomocne, ale nie są konieczne\n\n"
+        "Zwróć JSON w formacie:\n"
+        "{{\n"
+        '  "basic_materials": [\n'
+        '    {{"name": "nazwa", "quantity": "ilość", "unit": "jednostka"}}\n'
+        "  ],\n"
+        '  "additional_materials": [\n'
+        '    {{"name": "nazwa", "quantity": "ilość", "unit": "jednostka"}}\n'
+        "  ]\n"
+        "}}"
+    )
+    parser = JsonOutputParser()
+    analysis_chain = analysis_prompt | llm | parser
+    return await analysis_chain.ainvoke({"query": query, "search_results": search_results})
+
+
+async def aanalyze_materials(query: str) -> dict[str, Any]:
+    """
+    Ekstrakcja z cache (przeliczona na powierzchnię z zapytania), a gdy jej brak -
+    wyszukiwanie i LLM, z zapisem wyniku do cache.
+    """
+    cache = get_extraction_cache()
+    if cache is not None:
+        try:
+            cached = await asyncio.to_thread(cache.lookup, query)
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd odczytu cache ekstrakcji: {e}")
+        else:
+            if cached is not None:
+                return cached
+
+    materials_analysis = await aextract_materials(query)
+    if cache is not None:
+        try:
+            await asyncio.to_thread(cache.store, query, materials_analysis)
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd zapisu cache ekstrakcji: {e}")
+    return materials_analysis
+
+
+def describe_estimate(estimate: dict[str, Any]) -> str:
+    if estimate["area"] is None:
+        return (
+            f"Zużycie na 1 m² dla: {estimate['job']} "
+            "(podaj powierzchnię, aby otrzymać dokładne ilości)\n\n"
         )
-        if additional_materials:
-            result += format_material_section(
-                additional_materials,
-                additional_products,
-                "MATERIAŁY DODATKOWE (mogą być pomocne):",
-            )
-        result += (
-            "Potrzebujesz dokładnej wyceny? Skontaktuj się z naszym doradcą!\n"
-            "Ceny i dostępność sprawdzane w czasie rzeczywistym."
+    return (
+        f"Zestawienie dla: {estimate['job']}, {estimate['area']:g} m² "
+        f"(katalog materiałów {estimate['catalog_version']})\n\n"
+    )
+
+
+async def amaterials_report_parts(query: str) -> AsyncIterator[str]:
+    """
+    Kolejne fragmenty raportu materiałów, wysyłane gdy tylko są gotowe
+    (nagłówek od razu, sekcje po wyszukaniu produktów).
+    """
+    logger.info(f"Kalkulacja materiałów dla: {query}")
+    yield "KALKULACJA MATERIAŁÓW\n\n"
+    materials_analysis = estimate_materials(query)
+    if materials_analysis is not None:
+        yield describe_estimate(materials_analysis)
+    else:
+        materials_analysis = await aanalyze_materials(query)
+    basic_materials = materials_analysis.get("basic_materials", [])
+    additional_materials = materials_analysis.get("additional_materials", [])
+    basic_names = [m.get("name", "") for m in basic_materials]
+    additional_names = [m.get("name", "") for m in additional_materials]
+    found_products = await afind_products_in_database(basic_names + additional_names)
+    basic_products = [p for p in found_products if p["search_term"] in basic_names]
+    additional_products = [p for p in found_products if p["search_term"] in additional_names]
+    yield format_material_section(
+        basic_materials, basic_products, "MATERIAŁY PODSTAWOWE (niezbędne):"
+    )
+    if additional_materials:
+        yield format_material_section(
+            additional_materials,
+            additional_products,
+            "MATERIAŁY DODATKOWE (mogą być pomocne):",
         )
-        return result
+    yield (
+        "Potrzebujesz dokładnej wyceny? Skontaktuj się z naszym doradcą!\n"
+        "Ceny i dostępność sprawdzane w czasie rzeczywistym."
+    )
+
+
+async def amaterials_cost(query: str) -> str:
+    """
+    kalkulacja materiałów; błędy są zgłaszane dalej (zapytania wsadowe, eval)
+    """
+    return "".join([part async for part in amaterials_report_parts(query)])
+
+
+async def acalculate_materials_cost(query: str) -> str:
+    """
+    kalkulacja materiałów
+    """
+    try:
+        return await amaterials_cost(query)
+    except Exception as e:
+        logger.error(f"Błąd podczas kalkulacji materiałów: {e}")
+        return MATERIALS_ERROR_MESSAGE
+
+
+async def astream_materials_cost(query: str) -> AsyncIterator[str]:
+    try:
+        async for part in amaterials_report_parts(query):
+            yield part
     except Exception as e:
         logger.error(f"Błąd podczas kalkulacji materiałów: {e}")
-        return "Wystąpił błąd podczas kalkulacji materiałów. Spróbuj ponownie."
+        yield f"\n{MATERIALS_ERROR_MESSAGE}"
+
+
+def calculate_materials_cost(query: str) -> str:
+    return run_sync(acalculate_materials_cost(query))
 
 
 if __name__ == "__main__":
     test_query = "Chcę wyremontować łazienkę 10m²"
     result = determine_query_type(test_query)
-    print(f"'{test_query}' - {result}")
\ No newline at end of file
+    print(f"'{test_query}' - {result}")
@@ -0,0 +1,294 @@
+"""
+Rejestr klientów współdzielonych w obrębie procesu workera.
+
+Klienci LLM i wyszukiwarki tworzeni są raz i używani ponownie przez wszystkie
+zapytania. Klienci Azure Search i retrievery korzystają z jednej sesji HTTP
+(ten sam host, wspólna pula połączeń keep-alive).
+
+Klienci asynchroniczni są związani z pętlą zdarzeń, więc są trzymani osobno
+dla każdej pętli. Synchroniczne wrappery (run_sync) wykonują korutyny na jednej
+długo żyjącej pętli w tle, dzięki czemu jej klienci też są używani ponownie.
+
+Biblioteki klientów (LangChain OpenAI/Azure AI, Azure Search, requests) są
+importowane dopiero przy tworzeniu pierwszego klienta - import modułu nie
+wydłuża zimnego startu funkcji, a warm_up (klienci synchroniczni, w wątku) i
+awarm_up (klienci asynchroniczni, na pętli workera) tworzą je w tle.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from collections.abc import Callable, Coroutine, Hashable
+from functools import cache, lru_cache
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import SecretStr
+
+from src.embedding_cache import with_embedding_cache
+from src.local_search import LocalProductRetriever, get_local_index, local_search_hybrid
+from src.settings import get_settings
+from src.tracing import get_callback_handler
+
+if TYPE_CHECKING:
+    import requests
+    from azure.search.documents import SearchClient
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from azure.search.documents.indexes import SearchIndexClient
+    from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_INDEX = "products-index"
+REGULAMIN_INDEX = "regulamin-index"
+
+LOCAL_BACKEND = "local"
+
+
+def search_backend() -> str:
+    """
+    'azure' (domyślnie) albo 'local' - lokalny indeks produktów z products.json
+    """
+    return os.getenv("SEARCH_BACKEND", "azure").lower()
+
+
+@lru_cache(maxsize=1)
+def get_http_session() -> "requests.Session":
+    import requests  # noqa: PLC0415
+    from requests.adapters import HTTPAdapter  # noqa: PLC0415
+
+    pool_size = get_settings().http_pool_size
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _create_llm() -> "AzureAIChatCompletionsModel":
+    from langchain_azure_ai.chat_models import AzureAIChatCompletionsModel  # noqa: PLC0415
+
+    settings = get_settings()
+    return AzureAIChatCompletionsModel(
+        endpoint=settings.foundry_endpoint,
+        credential=settings.foundry_key,
+        model=settings.chat_deployment,
+        temperature=0.0,
+        callbacks=[get_callback_handler()],
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm() -> "AzureAIChatCompletionsModel":
+    return _create_llm()
+
+
+def _create_embeddings() -> Embeddings:
+    from langchain_openai import AzureOpenAIEmbeddings  # noqa: PLC0415
+
+    settings = get_settings()
+    deployment = settings.embedding_deployment
+    embeddings = AzureOpenAIEmbeddings(
+        azure_deployment=deployment,
+        model=deployment,
+        azure_endpoint=settings.openai_endpoint,
+        api_key=SecretStr(settings.openai_key),
+        api_version="2023-07-01-preview",
+    )
+    return with_embedding_cache(embeddings, deployment)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> Embeddings:
+    return _create_embeddings()
+
+
+@cache
+def get_search_client(index_name: str) -> "SearchClient":
+    from azure.core.credentials import AzureKeyCredential  # noqa: PLC0415
+    from azure.core.pipeline.transport import RequestsTransport  # noqa: PLC0415
+    from azure.search.documents import SearchClient  # noqa: PLC0415
+
+    settings = get_settings()
+    return SearchClient(
+        endpoint=settings.search_endpoint,
+        index_name=index_name,
+        credential=AzureKeyCredential(settings.search_key),
+        transport=RequestsTransport(session=get_http_session(), session_owner=False),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_index_client() -> "SearchIndexClient":
+    from azure.core.credentials import AzureKeyCredential  # noqa: PLC0415
+    from azure.core.pipeline.transport import RequestsTransport  # noqa: PLC0415
+    from azure.search.documents.indexes import SearchIndexClient  # noqa: PLC0415
+
+    settings = get_settings()
+    return SearchIndexClient(
+        endpoint=settings.search_endpoint,
+        credential=AzureKeyCredential(settings.search_key),
+        transport=RequestsTransport(session=get_http_session(), session_owner=False),
+    )
+
+
+@cache
+def get_retriever(index_name: str, top_k: int) -> BaseRetriever:
+    if index_name == PRODUCTS_INDEX and search_backend() == LOCAL_BACKEND:
+        return LocalProductRetriever(
+            index=get_local_index(),
+            top_k=top_k,
+            embeddings=get_embeddings() if local_search_hybrid() else None,
+        )
+    from src.azure_retriever import PooledAzureAISearchRetriever  # noqa: PLC0415
+
+    settings = get_settings()
+    return PooledAzureAISearchRetriever(
+        content_key="content",
+        index_name=index_name,
+        top_k=top_k,
+        service_name=settings.search_service_name,
+        api_key=settings.search_key,
+        session=get_http_session(),
+    )
+
+
+_loop_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, Any]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _loop_cached(key: Hashable, factory: Callable[[], T]) -> T:  # noqa: UP047
+    clients = _loop_clients.setdefault(asyncio.get_running_loop(), {})
+    if key not in clients:
+        clients[key] = factory()
+    return clients[key]
+
+
+def get_async_llm() -> "AzureAIChatCompletionsModel":
+    """
+    model do ainvoke/astream - osobna instancja dla każdej pętli zdarzeń
+    """
+    return _loop_cached("llm", _create_llm)
+
+
+def get_async_embeddings() -> Embeddings:
+    return _loop_cached("embeddings", _create_embeddings)
+
+
+def _create_async_search_client(index_name: str) -> "AsyncSearchClient":
+    from azure.core.credentials import AzureKeyCredential  # noqa: PLC0415
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient  # noqa: PLC0415
+
+    settings = get_settings()
+    return AsyncSearchClient(
+        endpoint=settings.search_endpoint,
+        index_name=index_name,
+        credential=AzureKeyCredential(settings.search_key),
+    )
+
+
+def get_async_search_client(index_name: str) -> "AsyncSearchClient":
+    return _loop_cached(
+        ("search", index_name), lambda: _create_async_search_client(index_name)
+    )
+
+
+_background_loop: asyncio.AbstractEventLoop | None = None
+_background_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop  # noqa: PLW0603
+    with _background_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="async-clients", daemon=True
+            ).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:  # noqa: UP047
+    """
+    Wykonuje korutynę z kodu synchronicznego (CLI, skrypty eval, wątki).
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+def _warm(name: str, step: Callable[[], Any]) -> bool:
+    try:
+        step()
+        return True
+    except Exception as e:
+        logger.warning(f"Nie udało się rozgrzać: {name}: {e}")
+        return False
+
+
+def warm_up() -> None:
+    """
+    Tworzy klientów i otwiera połączenia przy zimnym starcie funkcji,
+    żeby pierwsze zapytanie nie płaciło za TLS. Każdy klient osobno - błąd
+    jednej usługi nie blokuje rozgrzania pozostałych.
+    """
+    steps: list[tuple[str, Callable[[], Any]]] = [("LLM", get_llm)]
+    if search_backend() == LOCAL_BACKEND:
+        steps.append(("lokalny indeks produktów", get_local_index))
+    else:
+        steps.append(
+            (PRODUCTS_INDEX, lambda: get_search_client(PRODUCTS_INDEX).get_document_count())
+        )
+    # regulamin jest zawsze w Azure AI Search
+    steps += [
+        (REGULAMIN_INDEX, lambda: get_search_client(REGULAMIN_INDEX).get_document_count()),
+        ("retrievery", lambda: [get_retriever(PRODUCTS_INDEX, k) for k in (3, 5)]),
+        ("retriever regulaminu", lambda: get_retriever(REGULAMIN_INDEX, 3)),
+    ]
+    ready = [name for name, step in steps if _warm(name, step)]
+    logger.info(f"Rozgrzani klienci: {', '.join(ready) or 'brak'}")
+
+
+async def awarm_up() -> None:
+    """
+    Rozgrzewa klientów asynchronicznych bieżącej pętli - tych używa obsługa
+    zapytań (get_async_llm, get_async_search_client), z osobną pulą połączeń.
+    """
+    _warm("LLM (async)", get_async_llm)
+
+    async def count(index_name: str) -> None:
+        try:
+            await get_async_search_client(index_name).get_document_count()
+        except Exception as e:
+            logger.warning(f"Nie udało się rozgrzać: {index_name} (async): {e}")
+
+    indexes = [REGULAMIN_INDEX]
+    if search_backend() != LOCAL_BACKEND:
+        indexes.insert(0, PRODUCTS_INDEX)
+    await asyncio.gather(*(count(name) for name in indexes))
+
+
+_warm_loops: weakref.WeakSet[asyncio.AbstractEventLoop] = weakref.WeakSet()
+_warm_tasks: set[asyncio.Task[None]] = set()
+
+
+def schedule_async_warm_up() -> None:
+    """
+    Uruchamia awarm_up w tle na bieżącej pętli, raz na pętlę. Bez działającej
+    pętli (import poza workerem, CLI) nic nie robi.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if loop in _warm_loops:
+        return
+    _warm_loops.add(loop)
+    task = loop.create_task(awarm_up())
+    _warm_tasks.add(task)
+    task.add_done_callback(_warm_tasks.discard)
@@ -0,0 +1,165 @@
+"""
+Składanie kontekstu odpowiedzi ogólnej w limicie tokenów.
+
+Dokumenty z obu indeksów są najpierw deduplikowane (nakładające się fragmenty
+regulaminu mają prawie te same słowa), potem sortowane lokalnie przez BM25
+względem pytania i pakowane od najlepszego do wyczerpania budżetu tokenów.
+Dane SQL dopasowanego produktu są zawsze na początku kontekstu. Tokeny są
+szacowane z liczby znaków - bez tokenizera modelu, wystarczająco do budżetu.
+"""
+
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.clients import PRODUCTS_INDEX
+from src.local_search import BM25
+from src.nlp_utils import stem_tokens
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# średnio dla polskiego tekstu w tokenizerach GPT (cl100k/o200k)
+CHARS_PER_TOKEN = 3.5
+# separator dokumentów w create_stuff_documents_chain ("\n\n")
+SEPARATOR_TOKENS = 1
+
+
+def context_token_budget() -> int:
+    """
+    budżet tokenów dokumentów w prompcie; 0 - bez limitu
+    """
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+
+
+def dedup_threshold() -> float:
+    return float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def is_pinned(doc: Document) -> bool:
+    return doc.metadata.get("source") == "sql"
+
+
+def product_id(doc: Document) -> str | None:
+    """
+    id produktu dla dokumentów z indeksu produktów (znacznik "index" nadaje
+    ask_rag.traced_search), None dla fragmentów regulaminu
+    """
+    if doc.metadata.get("index") != PRODUCTS_INDEX:
+        return None
+    return doc.metadata.get("id")
+
+
+@dataclass
+class AssembledContext:
+    docs: list[Document]
+    tokens_before: int
+    tokens_after: int
+    duplicates: int = 0
+    over_budget: int = 0
+    scores: list[float] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def doc_tokens(doc: Document) -> int:
+    return estimate_tokens(doc.page_content) + SEPARATOR_TOKENS
+
+
+def deduplicate(
+    docs: list[Document], threshold: float
+) -> tuple[list[Document], list[list[str]]]:
+    """
+    Pomija fragmenty regulaminu, których słowa w co najmniej `threshold`
+    pokrywają się ze słowami fragmentu już zachowanego (|A ∩ B| / min(|A|, |B|))
+    - łapie fragmenty z zakładką. Produkty są duplikatami tylko przy tym samym
+    id: warianty tej samej farby mają prawie te same słowa, a różne ceny.
+    Zwraca zachowane dokumenty i ich tokeny (do rankingu).
+    """
+    kept: list[Document] = []
+    kept_tokens: list[list[str]] = []
+    kept_sets: list[set[str]] = []
+    kept_products: set[str] = set()
+    for doc in docs:
+        tokens = stem_tokens(doc.page_content)
+        terms = set(tokens)
+        if (product := product_id(doc)) is not None:
+            duplicate = product in kept_products
+            kept_products.add(product)
+        else:
+            duplicate = not is_pinned(doc) and any(
+                terms
+                and other
+                and len(terms & other) / min(len(terms), len(other)) >= threshold
+                for other, previous in zip(kept_sets, kept, strict=True)
+                if product_id(previous) is None and not is_pinned(previous)
+            )
+        if duplicate:
+            continue
+        kept.append(doc)
+        kept_tokens.append(tokens)
+        kept_sets.append(terms)
+    return kept, kept_tokens
+
+
+def rank(query: str, tokens: list[list[str]]) -> tuple[list[int], np.ndarray]:
+    """
+    kolejność dokumentów wg BM25 dla pytania (remisy - kolejność z wyszukiwarki)
+    """
+    scores = BM25(tokens).scores(stem_tokens(query)) if tokens else np.zeros(0)
+    order = np.argsort(-scores, kind="stable")
+    return [int(i) for i in order], scores
+
+
+def assemble_context(
+    query: str, docs: list[Document], token_budget: int | None = None
+) -> AssembledContext:
+    budget = context_token_budget() if token_budget is None else token_budget
+    with span("context", documents=len(docs)) as attributes:
+        tokens_before = sum(doc_tokens(doc) for doc in docs)
+        unique, tokens = deduplicate(docs, dedup_threshold())
+        order, scores = rank(query, tokens)
+
+        pinned = [i for i in order if is_pinned(unique[i])]
+        selected: list[int] = []
+        used = 0
+        over_budget = 0
+        for i in pinned + [i for i in order if not is_pinned(unique[i])]:
+            cost = doc_tokens(unique[i])
+            # mniejszy dokument z dalszej pozycji może się jeszcze zmieścić
+            if budget and used + cost > budget and not is_pinned(unique[i]):
+                over_budget += 1
+                continue
+            selected.append(i)
+            used += cost
+
+        context = AssembledContext(
+            docs=[unique[i] for i in selected],
+            tokens_before=tokens_before,
+            tokens_after=used,
+            duplicates=len(docs) - len(unique),
+            over_budget=over_budget,
+            scores=[round(float(scores[i]), 4) for i in selected],
+        )
+        attributes.update(
+            tokens_before=context.tokens_before,
+            tokens_after=context.tokens_after,
+            tokens_saved=context.tokens_saved,
+        )
+    logger.info(
+        f"Kontekst: {len(context.docs)}/{len(docs)} dokumentów "
+        f"(duplikaty: {context.duplicates}, poza budżetem: {context.over_budget}), "
+        f"~{context.tokens_after}/{context.tokens_before} tokenów, "
+        f"zaoszczędzono ~{context.tokens_saved}"
+    )
+    return context
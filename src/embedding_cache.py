@@ -0,0 +1,527 @@
+"""
+Trwały cache embeddingów na dysku, klucz: (model, skrót treści).
+
+Wektory każdego modelu leżą w jednym pliku binarnym (float32 albo float16),
+czytanym przez np.memmap, więc odczyt to widok na stronę pliku bez kopiowania
+i bez deserializacji - wiele procesów dzieli te same strony w page cache.
+Indeks (model, skrót) -> numer wiersza jest w SQLite obok plików.
+Dopisywanie jest chronione blokadą pliku, więc cache może być współdzielony
+przez workery funkcji i skrypt indeksujący (na Windows, bez fcntl, blokada
+obejmuje tylko bieżący proces). Embeddingi pytań są zapisywane w tle, partiami,
+a liczba wpisów jest ograniczona - najdawniej używane są usuwane.
+
+CLI: python src/embedding_cache.py inspect | compact | prune
+"""
+
+import argparse
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(__file__).parent.parent / "data" / "embedding_cache"
+
+# SQLite ma limit liczby parametrów w jednym zapytaniu
+MAX_KEYS_PER_QUERY = 500
+# last_used jest odświeżane najwyżej raz na dobę, żeby odczyty nie zapisywały do bazy
+TOUCH_INTERVAL = 24 * 3600
+# embeddingi pytań czekają w pamięci najwyżej tyle sekund albo do tylu wpisów
+QUERY_FLUSH_SECONDS = 5.0
+QUERY_FLUSH_BATCH = 64
+
+# zastępstwo blokady pliku tam, gdzie nie ma fcntl
+_process_write_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self, directory: Path = CACHE_DIR, dtype: str = "float32", max_entries: int = 0
+    ) -> None:
+        """
+        max_entries: limit wpisów wszystkich modeli (0 - bez limitu)
+        """
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        directory.mkdir(parents=True, exist_ok=True)
+        self._maps: dict[str, np.memmap] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "model TEXT PRIMARY KEY, filename TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, dtype TEXT NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, row INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, hash))"
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        # jedno połączenie na wątek (odczyty idą też z asyncio.to_thread)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.directory / "index.sqlite", timeout=30)
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            with _process_write_lock:
+                yield
+            return
+        with (self.directory / ".lock").open("w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _matrix(self, filename: str, dim: int, dtype: str, min_rows: int) -> np.memmap:
+        with self._lock:
+            matrix = self._maps.get(filename)
+            if matrix is None or matrix.shape[0] < min_rows:
+                path = self.directory / filename
+                rows = path.stat().st_size // (dim * np.dtype(dtype).itemsize)
+                matrix = np.memmap(path, dtype=dtype, mode="r", shape=(rows, dim))
+                self._maps[filename] = matrix
+            return matrix
+
+    def _find(self, model: str, hashes: list[str]) -> dict[str, tuple[int, str, int, str]]:
+        found: dict[str, tuple[int, str, int, str]] = {}
+        stale: list[str] = []
+        now = time.time()
+        db = self._db()
+        for start in range(0, len(hashes), MAX_KEYS_PER_QUERY):
+            chunk = hashes[start : start + MAX_KEYS_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            # indeks i plik czytane jednym zapytaniem - spójne także w trakcie kompaktowania
+            rows = db.execute(
+                "SELECT v.hash, v.row, v.last_used, f.filename, f.dim, f.dtype "
+                "FROM vectors v JOIN files f ON f.model = v.model "
+                f"WHERE v.model = ? AND v.hash IN ({placeholders})",
+                [model, *chunk],
+            ).fetchall()
+            for digest, row, last_used, filename, dim, dtype in rows:
+                found[digest] = (row, filename, dim, dtype)
+                if now - last_used > TOUCH_INTERVAL:
+                    stale.append(digest)
+        if stale:
+            with db:
+                db.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, digest) for digest in stale],
+                )
+        return found
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[np.ndarray | None]:
+        """
+        Wektory (widoki na plik, tylko do odczytu) albo None dla brakujących.
+        """
+        hashes = [content_hash(t) for t in texts]
+        found = self._find(model, list(dict.fromkeys(hashes)))
+        result: list[np.ndarray | None] = []
+        for digest in hashes:
+            entry = found.get(digest)
+            if entry is None:
+                result.append(None)
+                continue
+            row, filename, dim, dtype = entry
+            result.append(self._matrix(filename, dim, dtype, row + 1)[row])
+        missing = sum(v is None for v in result)
+        with self._lock:
+            self.hits += len(hashes) - missing
+            self.misses += missing
+        return result
+
+    def put_many(
+        self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        if not texts:
+            return
+        array = np.asarray(vectors)
+        with self._write_lock():
+            grown = self._append(model, texts, array)
+        # martwe wiersze po eviction zajmują dysk - plik przepisywany, gdy
+        # jest ponad dwa razy większy niż limit
+        if self.max_entries and grown > 2 * self.max_entries:
+            freed = self.compact()
+            logger.info(f"Cache embeddingów skompaktowany, zwolniono {freed / 1e6:.1f} MB")
+
+    def _append(self, model: str, texts: Sequence[str], array: np.ndarray) -> int:
+        """
+        dopisuje brakujące wektory (pod blokadą zapisu); zwraca liczbę wierszy pliku
+        modelu, gdy limit wpisów wymusił usunięcie starych, inaczej 0
+        """
+        db = self._db()
+        meta = db.execute(
+            "SELECT filename, dim, dtype FROM files WHERE model = ?", (model,)
+        ).fetchone()
+        if meta is None:
+            filename = f"{content_hash(model)[:16]}-0.{self.dtype.name}"
+            meta = (filename, array.shape[1], self.dtype.name)
+            with db:
+                db.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (model, *meta))
+        filename, dim, dtype = meta
+        if array.shape[1] != dim:
+            raise ValueError(f"Wymiar {array.shape[1]} różny od {dim} dla modelu {model}")
+
+        new: dict[str, int] = {}
+        for i, text in enumerate(texts):
+            new.setdefault(content_hash(text), i)
+        present = self._find(model, list(new))
+        new = {digest: i for digest, i in new.items() if digest not in present}
+        if not new:
+            return 0
+
+        path = self.directory / filename
+        row_bytes = dim * np.dtype(dtype).itemsize
+        with path.open("ab") as f:
+            size = f.tell()
+            # niedokończony zapis (np. przerwany proces) - obcinamy do pełnego wiersza
+            if size % row_bytes:
+                size -= size % row_bytes
+                f.truncate(size)
+            first_row = size // row_bytes
+            f.write(array[list(new.values())].astype(dtype).tobytes())
+        now = time.time()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?)",
+                [(model, digest, first_row + n, now, now) for n, digest in enumerate(new)],
+            )
+            evicted = self._evict(db)
+        return first_row + len(new) if evicted else 0
+
+    def _evict(self, db: sqlite3.Connection) -> int:
+        """
+        Usuwa z indeksu najdawniej używane wpisy ponad max_entries (last_used
+        odświeżane raz na dobę - kolejność przybliżona). Wywoływane w transakcji.
+        """
+        if not self.max_entries:
+            return 0
+        (entries,) = db.execute("SELECT COUNT(*) FROM vectors").fetchone()
+        excess = entries - self.max_entries
+        if excess <= 0:
+            return 0
+        db.execute(
+            "DELETE FROM vectors WHERE rowid IN "
+            "(SELECT rowid FROM vectors ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        logger.info(f"Cache embeddingów: usunięto {excess} najdawniej używanych wpisów")
+        return excess
+
+    def inspect(self) -> list[dict[str, Any]]:
+        db = self._db()
+        report = []
+        for model, filename, dim, dtype in db.execute(
+            "SELECT model, filename, dim, dtype FROM files ORDER BY model"
+        ).fetchall():
+            entries, oldest = db.execute(
+                "SELECT COUNT(*), MIN(last_used) FROM vectors WHERE model = ?", (model,)
+            ).fetchone()
+            path = self.directory / filename
+            size = path.stat().st_size if path.exists() else 0
+            rows = size // (dim * np.dtype(dtype).itemsize)
+            report.append(
+                {
+                    "model": model,
+                    "entries": entries,
+                    "dim": dim,
+                    "dtype": dtype,
+                    "file_bytes": size,
+                    "dead_rows": rows - entries,
+                    "oldest_use": oldest,
+                }
+            )
+        return report
+
+    def prune(self, older_than_days: float | None = None, model: str | None = None) -> int:
+        """
+        Usuwa z indeksu wpisy nieużywane od older_than_days dni albo cały model.
+        Miejsce na dysku zwalnia dopiero compact().
+        """
+        conditions, params = [], []
+        if older_than_days is not None:
+            conditions.append("last_used < ?")
+            params.append(time.time() - older_than_days * 24 * 3600)
+        if model is not None:
+            conditions.append("model = ?")
+            params.append(model)
+        if not conditions:
+            return 0
+        with self._write_lock():
+            db = self._db()
+            with db:
+                removed = db.execute(
+                    f"DELETE FROM vectors WHERE {' AND '.join(conditions)}", params
+                ).rowcount
+        return removed
+
+    def compact(self, dtype: str | None = None) -> int:
+        """
+        Przepisuje pliki wektorów bez usuniętych wierszy (opcjonalnie w innym
+        typie, np. float16). Zwraca liczbę zwolnionych bajtów.
+        """
+        freed = 0
+        with self._write_lock():
+            db = self._db()
+            for model, filename, dim, old_dtype in db.execute(
+                "SELECT model, filename, dim, dtype FROM files"
+            ).fetchall():
+                new_dtype = np.dtype(dtype or old_dtype).name
+                old_path = self.directory / filename
+                old_size = old_path.stat().st_size if old_path.exists() else 0
+                entries = db.execute(
+                    "SELECT hash, row FROM vectors WHERE model = ? ORDER BY row", (model,)
+                ).fetchall()
+                if not entries:
+                    with db:
+                        db.execute("DELETE FROM files WHERE model = ?", (model,))
+                    old_path.unlink(missing_ok=True)
+                    freed += old_size
+                    continue
+
+                rows = old_size // (dim * np.dtype(old_dtype).itemsize)
+                old = np.memmap(old_path, dtype=old_dtype, mode="r", shape=(rows, dim))
+                generation = int(filename.rsplit("-", 1)[1].split(".")[0]) + 1
+                new_filename = f"{content_hash(model)[:16]}-{generation}.{new_dtype}"
+                new_path = self.directory / new_filename
+                old[[row for _, row in entries]].astype(new_dtype).tofile(new_path)
+                del old
+                with db:
+                    db.executemany(
+                        "UPDATE vectors SET row = ? WHERE model = ? AND hash = ?",
+                        [(n, model, digest) for n, (digest, _) in enumerate(entries)],
+                    )
+                    db.execute(
+                        "UPDATE files SET filename = ?, dtype = ? WHERE model = ?",
+                        (new_filename, new_dtype, model),
+                    )
+                # otwarte memmapy w innych procesach dalej widzą stary plik
+                old_path.unlink()
+                freed += old_size - new_path.stat().st_size
+        with self._lock:
+            self._maps.clear()
+        return freed
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings z cache na dysku przed właściwym modelem. Błąd cache nie
+    przerywa zapytania - wtedy embedding liczy model. Embeddingi pytań nie są
+    zapisywane w trakcie żądania: czekają w pamięci i wątek w tle dopisuje je
+    partiami (co flush_seconds albo po flush_batch wpisach).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        model: str,
+        flush_seconds: float = QUERY_FLUSH_SECONDS,
+        flush_batch: int = QUERY_FLUSH_BATCH,
+    ) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self._pending: dict[str, list[float]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._writer: threading.Thread | None = None
+
+    def _cached(self, texts: list[str]) -> list[np.ndarray | None]:
+        try:
+            cached = self.cache.get_many(self.model, texts)
+        except (OSError, sqlite3.Error, ValueError) as e:
+            logger.warning(f"Błąd odczytu cache embeddingów: {e}")
+            cached = [None] * len(texts)
+        with self._pending_lock:
+            if self._pending:
+                cached = [
+                    np.asarray(self._pending[t]) if v is None and t in self._pending else v
+                    for t, v in zip(texts, cached, strict=True)
+                ]
+        return cached
+
+    def _defer(self, text: str, vector: list[float]) -> None:
+        with self._pending_lock:
+            self._pending[text] = vector
+            full = len(self._pending) >= self.flush_batch
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_pending, name="embedding-cache-writer", daemon=True
+                )
+                self._writer.start()
+                atexit.register(self.flush)
+        if full:
+            self._flush_requested.set()
+
+    def _write_pending(self) -> None:
+        while True:
+            self._flush_requested.wait(self.flush_seconds)
+            self._flush_requested.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        zapisuje oczekujące embeddingi pytań
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            self._store(list(pending), list(pending.values()))
+
+    def _store(self, texts: list[str], vectors: list[list[float]]) -> None:
+        try:
+            self.cache.put_many(self.model, texts, vectors)
+        except (OSError, sqlite3.Error, ValueError) as e:
+            logger.warning(f"Błąd zapisu cache embeddingów: {e}")
+
+    @staticmethod
+    def _missing(texts: list[str], cached: list[np.ndarray | None]) -> list[str]:
+        return list(dict.fromkeys(t for t, v in zip(texts, cached, strict=True) if v is None))
+
+    @staticmethod
+    def _merge(
+        texts: list[str], cached: list[np.ndarray | None], fresh: dict[str, list[float]]
+    ) -> list[list[float]]:
+        return [
+            fresh[t] if v is None else v.tolist() for t, v in zip(texts, cached, strict=True)
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached = self._cached(texts)
+        missing = self._missing(texts, cached)
+        fresh = {}
+        if missing:
+            vectors = self.embeddings.embed_documents(missing)
+            self._store(missing, vectors)
+            fresh = dict(zip(missing, vectors, strict=True))
+        return self._merge(texts, cached, fresh)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        cached = await asyncio.to_thread(self._cached, texts)
+        missing = self._missing(texts, cached)
+        fresh = {}
+        if missing:
+            vectors = await self.embeddings.aembed_documents(missing)
+            await asyncio.to_thread(self._store, missing, vectors)
+            fresh = dict(zip(missing, vectors, strict=True))
+        return self._merge(texts, cached, fresh)
+
+    # embeddingi OpenAI są symetryczne - pytanie i dokument o tej samej treści
+    # mają ten sam wektor, więc dzielą wpis w cache
+    def embed_query(self, text: str) -> list[float]:
+        cached = self._cached([text])[0]
+        if cached is not None:
+            return cached.tolist()
+        vector = self.embeddings.embed_query(text)
+        self._defer(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        cached = (await asyncio.to_thread(self._cached, [text]))[0]
+        if cached is not None:
+            return cached.tolist()
+        vector = await self.embeddings.aembed_query(text)
+        self._defer(text, vector)
+        return vector
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache | None:
+    """
+    cache współdzielony w procesie (None, gdy EMBEDDING_CACHE_ENABLED=false
+    albo katalog jest niedostępny, np. system plików tylko do odczytu)
+    """
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    try:
+        return EmbeddingCache(
+            directory=Path(os.getenv("EMBEDDING_CACHE_DIR", str(CACHE_DIR))),
+            dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+        )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Cache embeddingów niedostępny: {e}")
+        return None
+
+
+def with_embedding_cache(embeddings: Embeddings, model: str) -> Embeddings:
+    cache = get_embedding_cache()
+    return embeddings if cache is None else CachedEmbeddings(embeddings, cache, model)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache embeddingów na dysku")
+    parser.add_argument("--dir", type=Path, default=CACHE_DIR, help="katalog cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("inspect", help="modele, liczba wpisów, rozmiar plików")
+    compact = commands.add_parser("compact", help="usuń martwe wiersze z plików")
+    compact.add_argument("--dtype", choices=["float32", "float16"], help="zmień typ wektorów")
+    prune = commands.add_parser("prune", help="usuń stare wpisy i skompaktuj")
+    prune.add_argument("--older-than-days", type=float, help="nieużywane od N dni")
+    prune.add_argument("--model", help="wszystkie wpisy modelu")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.dir)
+    if args.command == "inspect":
+        for entry in cache.inspect():
+            print(
+                f"{entry['model']}: {entry['entries']} wektorów "
+                f"{entry['dim']}x{entry['dtype']}, {entry['file_bytes'] / 1e6:.1f} MB, "
+                f"martwe wiersze: {entry['dead_rows']}"
+            )
+    elif args.command == "compact":
+        print(f"Zwolniono {cache.compact(args.dtype) / 1e6:.1f} MB")
+    else:
+        removed = cache.prune(args.older_than_days, args.model)
+        freed = cache.compact()
+        print(f"Usunięto {removed} wpisów, zwolniono {freed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from src.nlp_utils import AREA_PATTERN, normalize_text, parse_area
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(__file__).parent.parent / "data" / "materials_extraction_cache.sqlite"
+
+# słowa, które nie zmieniają rodzaju pracy
+STOPWORDS = {
+    "a", "bede", "chce", "chcialbym", "chcialabym", "co", "czego", "dla", "do", "i",
+    "ile", "jak", "jakie", "jaki", "kupic", "mam", "material", "materialow", "materialy",
+    "mi", "mnie", "moj", "moja", "moje", "na", "o", "okolo", "planuje", "potrzebne",
+    "potrzebuje", "potrzeba", "prosze", "sie", "trzeba", "w", "z", "ze",
+}  # fmt: skip
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+# ilość na początku napisu, także zakres ('20-25 kg'); dalsze liczby
+# ('2 worki po 25kg') to wielkość opakowania i zostają bez zmian
+_LEADING_QUANTITY_PATTERN = re.compile(
+    r"^\s*(?:ok\.?|około|~)?\s*\d+(?:[.,]\d+)?(?:\s*[-\u2013]\s*\d+(?:[.,]\d+)?)?"
+)
+
+SECTIONS = ("basic_materials", "additional_materials")
+_VERB_PREFIX_PATTERN = re.compile(r"^(?:wy|po|z)(?=\w{5,}(?:ac|ic|yc)$)")
+
+
+def job_key(query: str) -> str:
+    """
+    Rodzaj pracy bez powierzchni i liczb, np. 'Chcę wyremontować łazienkę 10m²'
+    i 'remont łazienki 12 m2' -> 'lazie remon'.
+    """
+    text = AREA_PATTERN.sub(" ", normalize_text(query))
+    tokens = re.findall(r"[a-z]+", text)
+    stems = {
+        _VERB_PREFIX_PATTERN.sub("", token)[:5] for token in tokens if token not in STOPWORDS
+    }
+    return " ".join(sorted(stems))
+
+
+def _scale_quantity(quantity: Any, factor: float) -> Any:
+    """
+    Przelicza ilość na początku wartości ('20-25' -> '40-50', '2 worki po 25kg'
+    -> '4 worki po 25kg'), zaokrąglając w górę do 0,1 (do całości, gdy oryginał
+    był liczbą całkowitą).
+    """
+
+    def scale(number: str) -> str:
+        value = float(number.replace(",", "."))
+        if value.is_integer():
+            return str(math.ceil(value * factor))
+        return f"{math.ceil(value * factor * 10) / 10:g}"
+
+    if isinstance(quantity, int | float):
+        return float(scale(str(quantity)))
+    if isinstance(quantity, str):
+        return _LEADING_QUANTITY_PATTERN.sub(
+            lambda lead: _NUMBER_PATTERN.sub(lambda m: scale(m.group(0)), lead.group(0)),
+            quantity,
+        )
+    return quantity
+
+
+def validate_analysis(analysis: Any) -> dict[str, Any] | None:
+    """
+    Same sekcje materiałów (inne klucze od LLM są pomijane), gdy każda jest
+    listą słowników z nazwą; None dla wyniku, którego nie da się zapisać.
+    """
+    if not isinstance(analysis, dict):
+        return None
+    cleaned = {}
+    for section in SECTIONS:
+        materials = analysis.get(section, [])
+        if not isinstance(materials, list) or not all(
+            isinstance(m, dict) and isinstance(m.get("name"), str) for m in materials
+        ):
+            return None
+        cleaned[section] = materials
+    return cleaned
+
+
+def rescale_analysis(analysis: dict[str, Any], factor: float) -> dict[str, Any]:
+    return {
+        section: [
+            {**material, "quantity": _scale_quantity(material.get("quantity"), factor)}
+            for material in analysis.get(section, [])
+        ]
+        for section in SECTIONS
+    }
+
+
+class ExtractionCache:
+    """
+    Wyniki ekstrakcji materiałów przez LLM zapisane w SQLite (wspólne dla
+    wszystkich workerów). Klucz to rodzaj pracy, ilości są przeliczane
+    proporcjonalnie do powierzchni z zapytania.
+    """
+
+    def __init__(
+        self,
+        path: Path = CACHE_PATH,
+        ttl_seconds: float = 30 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "job_key TEXT NOT NULL, has_area INTEGER NOT NULL, area REAL, "
+                "analysis TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (job_key, has_area))"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def lookup(self, query: str) -> dict[str, Any] | None:
+        key = job_key(query)
+        area = parse_area(query)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT area, analysis, created_at FROM extractions "
+                "WHERE job_key = ? AND has_area = ?",
+                (key, area is not None),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or self._clock() - row[2] > self.ttl_seconds:
+            return None
+
+        stored_area = row[0]
+        try:
+            analysis = validate_analysis(json.loads(row[1]))
+            if analysis is None:
+                raise ValueError("niepoprawna struktura")
+            if area is not None and area != stored_area:
+                analysis = rescale_analysis(analysis, area / stored_area)
+        except (ValueError, TypeError, ZeroDivisionError) as e:
+            # uszkodzony wpis traktujemy jak brak - zostanie nadpisany nową ekstrakcją
+            logger.warning(f"Pominięto wpis cache ekstrakcji '{key}': {e}")
+            return None
+        logger.info(f"Materiały z cache ekstrakcji: '{key}' ({stored_area} -> {area} m²)")
+        return analysis
+
+    def store(self, query: str, analysis: dict[str, Any]) -> None:
+        area = parse_area(query)
+        if area == 0:
+            return
+        cleaned = validate_analysis(analysis)
+        if cleaned is None:
+            logger.warning(f"Niepoprawny wynik ekstrakcji, pomijam zapis do cache: {query}")
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                    (
+                        job_key(query),
+                        area is not None,
+                        area,
+                        json.dumps(cleaned, ensure_ascii=False),
+                        self._clock(),
+                    ),
+                )
+        finally:
+            conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_extraction_cache() -> ExtractionCache | None:
+    """
+    cache współdzielony (None, gdy MATERIALS_CACHE_ENABLED=false albo baza niedostępna)
+    """
+    if os.getenv("MATERIALS_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    try:
+        return ExtractionCache(
+            path=Path(os.getenv("MATERIALS_CACHE_PATH", str(CACHE_PATH))),
+            ttl_seconds=float(os.getenv("MATERIALS_CACHE_TTL", str(30 * 24 * 3600))),
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Cache ekstrakcji materiałów niedostępny: {e}")
+        return None
@@ -1,9 +1,39 @@
+import json
 import os
+from collections.abc import AsyncIterator
 
 import chainlit as cl
-import requests
+import httpx
 
 API_URL = os.getenv("API_URL", "http://localhost:7071/api/ask_rag")
+API_STREAM_URL = os.getenv("API_STREAM_URL", f"{API_URL}_stream")
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # jeden klient na proces - połączenia keep-alive do API współdzielone między czatami
+    global _http_client  # noqa: PLW0603
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, read=60.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def stream_answer(question: str) -> AsyncIterator[str]:
+    async with get_http_client().stream(
+        "POST", API_STREAM_URL, json={"question": question}
+    ) as response:
+        if response.status_code != 200:  # noqa: PLR2004
+            yield f"api error: {response.status_code}"
+            return
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                token = json.loads(line.removeprefix("data: ")).get("token")
+                if token:
+                    yield token
 
 
 @cl.on_chat_start
@@ -15,29 +45,20 @@ async def start():
 
 @cl.on_message
 async def main(message: cl.Message):
+    answer = cl.Message(content="")
     async with cl.Step(name="Searching information") as step:
         step.input = message.content
 
         try:
-            response = requests.post(
-                API_URL,
-                json={"question": message.content},
-                headers={"Content-Type": "application/json"},
-                timeout=30,
-            )
-
-            if response.ok:
-                answer = response.json().get("answer", "")
-                step.output = answer
-            else:
-                answer = f"api error: {response.status_code}"
-                step.output = answer
+            async for token in stream_answer(message.content):
+                await answer.stream_token(token)
 
         except Exception as e:
-            answer = f"connection error: {e!s}"
-            step.output = answer
+            await answer.stream_token(f"connection error: {e!s}")
+
+        step.output = answer.content
 
-    await cl.Message(content=answer).send()
+    await answer.send()
 
 
 @cl.on_settings_update
@@ -0,0 +1,50 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+MANIFEST_PATH = Path(__file__).parent.parent / "data" / "index_manifest.json"
+
+
+def document_hash(doc: dict[str, Any]) -> str:
+    """
+    skrót pól dokumentu (bez wektora) - zmiana treści oznacza ponowny embedding
+    """
+    fields = {k: v for k, v in doc.items() if k != "embedding"}
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_id(prefix: str, filename: str, chunk: str) -> str:
+    """
+    Stałe ID fragmentu wyliczone z pliku i treści - ten sam fragment dostaje
+    to samo ID przy każdym uruchomieniu.
+    """
+    digest = hashlib.sha256(f"{filename}\0{chunk}".encode()).hexdigest()
+    return f"{prefix}_{digest[:32]}"
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict[str, Any]:
+    try:
+        return json.loads(path.read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict[str, Any], path: Path = MANIFEST_PATH) -> None:
+    # zapis przez plik tymczasowy, żeby przerwany zapis nie zostawił połowy manifestu
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), "utf-8")
+    os.replace(tmp_path, path)
+
+
+def plan_changes(
+    previous: dict[str, str], current: dict[str, str]
+) -> tuple[list[str], list[str]]:
+    """
+    (ID nowych lub zmienionych dokumentów, ID dokumentów do usunięcia z indeksu)
+    """
+    changed = [doc_id for doc_id, digest in current.items() if previous.get(doc_id) != digest]
+    deleted = [doc_id for doc_id in previous if doc_id not in current]
+    return changed, deleted
@@ -1,125 +1,233 @@
-import json
+import argparse
 import os
-import uuid
+import sys
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 from typing import Any
 
-from dotenv import load_dotenv
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_community.vectorstores import AzureSearch
+from langchain_core.embeddings import Embeddings
 from langchain_openai import AzureOpenAIEmbeddings
 from pydantic import SecretStr
 
-cfg = Path(__file__).parent.parent / "local.settings.json"
-if cfg.exists():
-    data = json.loads(cfg.read_text("utf-8")).get("Values", {})
-    for k, v in data.items():
-        os.environ.setdefault(k, v)
+from src.embedding_cache import with_embedding_cache
+from src.index_manifest import (
+    chunk_id,
+    document_hash,
+    load_manifest,
+    plan_changes,
+    save_manifest,
+)
+from src.ingest_pipeline import (
+    MAX_UPLOAD_DOCS,
+    IngestPipeline,
+    PipelineSettings,
+    iter_json_array,
+    retry_call,
+)
+from src.products import PRODUCTS_PATH, product_docs
+from src.semantic_cache import bump_index_version
+from src.settings import load_environment
 
-load_dotenv()
+PDF_PATH = Path(__file__).parent.parent / "docs" / "REGULAMIN.pdf"
 
-required = [
+REQUIRED_ENV = [
     "AZURE_OPENAI_ENDPOINT",
     "AZURE_OPENAI_KEY",
     "AZURE_OPENAI_EMBEDDING_DEPLOYMENT",
     "AZURE_SEARCH_ENDPOINT",
     "AZURE_SEARCH_KEY",
 ]
-for env in required:
-    if not os.getenv(env):
-        raise ValueError(f"Brakuje zmiennej {env}")
-
-emb = AzureOpenAIEmbeddings(
-    azure_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or "",
-    model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or "",
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT") or "",
-    api_key=SecretStr(os.getenv("AZURE_OPENAI_KEY") or ""),
-    api_version="2023-07-01-preview",
-)
 
-products_path = Path(__file__).parent.parent / "data" / "products.json"
-products: list[dict[str, Any]] = json.loads(products_path.read_text("utf-8"))
-
-prod_docs = []
-for p in products:
-    content = " ".join(
-        [
-            p.get("name", ""),
-            p.get("description", ""),
-            p.get("content", ""),
-            f"Cena: {p.get('price', 'brak ceny')} PLN",
-        ]
+
+def load_settings() -> None:
+    load_environment()
+    for env in REQUIRED_ENV:
+        if not os.getenv(env):
+            raise ValueError(f"Brakuje zmiennej {env}")
+
+
+def create_embeddings() -> Embeddings:
+    deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or ""
+    embeddings = AzureOpenAIEmbeddings(
+        azure_deployment=deployment,
+        model=deployment,
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT") or "",
+        api_key=SecretStr(os.getenv("AZURE_OPENAI_KEY") or ""),
+        api_version="2023-07-01-preview",
+        # 429, 5xx i błędy połączenia ponawia embed_with_retry (z raportem ponowień)
+        max_retries=0,
     )
-    embedding = emb.embed_documents([content])[0]
-    prod_docs.append(
-        {
-            "id": p["id"],
-            "name": p.get("name", ""),
-            "description": p.get("description", ""),
-            "content": content,
-            "category": p.get("category", "brak"),
-            "embedding": embedding,
-        }
+    # niezmienione teksty nie są ponownie wysyłane do modelu
+    return with_embedding_cache(embeddings, deployment)
+
+
+def split_pdf(pdf_path: Path) -> list[str]:
+    loader = PyMuPDFLoader(str(pdf_path))
+    pdf_docs = loader.load()
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=150,
+        separators=[
+            "\n## ",
+            "\n### ",
+            "\n#### ",
+            "\n\n",
+            "\n",
+            ". ",
+            " ",
+        ],
+    )
+    return [chunk for doc in pdf_docs for chunk in splitter.split_text(doc.page_content)]
+
+
+def pdf_docs(chunks: list[str], filename: str = "REGULAMIN.pdf") -> list[dict[str, Any]]:
+    # identyczne fragmenty dostają to samo ID, więc trafiają do indeksu raz
+    docs = {
+        chunk_id("pdf", filename, chunk): {"filename": filename, "content": chunk}
+        for chunk in chunks
+    }
+    return [{"id": doc_id, **fields} for doc_id, fields in docs.items()]
+
+
+def create_store(index_name: str, emb: Embeddings) -> AzureSearch:
+    return AzureSearch(
+        azure_search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT") or "",
+        azure_search_key=os.getenv("AZURE_SEARCH_KEY") or "",
+        index_name=index_name,
+        embedding_function=emb,
+        text_key="content",
+        vector_field_name="embedding",
+        document_id_key="id",
     )
 
-print(f"Wczytano {len(prod_docs)} produktów")
-
-pdf_path = Path(__file__).parent.parent / "docs" / "REGULAMIN.pdf"
-loader = PyMuPDFLoader(str(pdf_path))
-pdf_docs = loader.load()
-
-splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=150,
-    separators=[
-        "\n## ",
-        "\n### ",
-        "\n#### ",
-        "\n\n",
-        "\n",
-        ". ",
-        " ",
-    ],
-)
 
-pdf_docs_to_upload = []
-for doc in pdf_docs:
-    chunks = splitter.split_text(doc.page_content)
-    for chunk in chunks:
-        embedding = emb.embed_documents([chunk])[0]
-        pdf_docs_to_upload.append(
-            {
-                "id": f"pdf_{uuid.uuid4()}",
-                "filename": "REGULAMIN.pdf",
-                "content": chunk,
-                "embedding": embedding,
-            }
+def indexed_ids(store: AzureSearch) -> set[str]:
+    return {r["id"] for r in store.client.search(search_text="*", select=["id"])}
+
+
+def upload_chunk(store: AzureSearch, chunk: list[dict[str, Any]]) -> None:
+    results = store.client.upload_documents(chunk)
+    failed = [r.key for r in results if not r.succeeded]
+    if failed:
+        raise RuntimeError(f"Nie zaindeksowano {len(failed)} dokumentów, np. {failed[:5]}")
+
+
+def delete_documents(
+    store: AzureSearch, doc_ids: list[str], settings: PipelineSettings
+) -> None:
+    for start in range(0, len(doc_ids), MAX_UPLOAD_DOCS):
+        chunk = [{"id": doc_id} for doc_id in doc_ids[start : start + MAX_UPLOAD_DOCS]]
+        retry_call(
+            lambda chunk=chunk: store.client.delete_documents(chunk),
+            settings.upload_attempts,
+            settings.upload_base_delay,
         )
 
-print(f"Wczytano {len(pdf_docs_to_upload)} fragmentów PDF")
 
-azure_products = AzureSearch(
-    azure_search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT") or "",
-    azure_search_key=os.getenv("AZURE_SEARCH_KEY") or "",
-    index_name="products-index",
-    embedding_function=emb,
-    text_key="content",
-    vector_field_name="embedding",
-    document_id_key="id",
-)
+def sync_index(
+    index_name: str,
+    docs: Iterable[dict[str, Any]],
+    manifest: dict[str, Any],
+    cleanup: bool,
+    emb: Embeddings,
+) -> bool:
+    """
+    Strumieniowo: embedding i upload tylko nowych lub zmienionych dokumentów.
+    Każda wysłana paczka trafia od razu do manifestu, więc przerwane
+    uruchomienie wznawia się od miejsca przerwania. Po przejściu wszystkich
+    dokumentów usuwa te, których już nie ma (przy cleanup=True - każde ID
+    z indeksu spoza bieżącego zestawu). Zwraca True, gdy indeks się zmienił.
+    """
+    store = create_store(index_name, emb)
+    settings = PipelineSettings.from_env()
+    previous: dict[str, str] = dict(manifest.get(index_name, {}))
+    checkpoint: dict[str, str] = manifest.setdefault(index_name, {})
+    current: dict[str, str] = {}
+
+    def changed_docs() -> Iterator[dict[str, Any]]:
+        for doc in docs:
+            digest = document_hash(doc)
+            current[doc["id"]] = digest
+            if previous.get(doc["id"]) != digest:
+                yield doc
+
+    def save_checkpoint(chunk: list[dict[str, Any]]) -> None:
+        for doc in chunk:
+            checkpoint[doc["id"]] = document_hash(doc)
+        save_manifest(manifest)
+        print(
+            f"{index_name}: wysłano {pipeline.uploaded} dokumentów, "
+            f"embedding: {pipeline.progress}",
+            flush=True,
+        )
 
-azure_regulamin = AzureSearch(
-    azure_search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT") or "",
-    azure_search_key=os.getenv("AZURE_SEARCH_KEY") or "",
-    index_name="regulamin-index",
-    embedding_function=emb,
-    text_key="content",
-    vector_field_name="embedding",
-    document_id_key="id",
-)
+    pipeline = IngestPipeline(
+        emb.embed_documents,
+        lambda chunk: upload_chunk(store, chunk),
+        save_checkpoint,
+        settings,
+    )
+    uploaded = pipeline.run(changed_docs())
+
+    if cleanup:
+        deleted = sorted(indexed_ids(store) - current.keys())
+    else:
+        _, deleted = plan_changes(previous, current)
+    if deleted:
+        delete_documents(store, deleted, settings)
+    manifest[index_name] = current
+    save_manifest(manifest)
+
+    print(
+        f"{index_name}: {len(current)} dokumentów, {uploaded} zaindeksowanych "
+        f"({pipeline.upload_requests} żądań), {len(deleted)} usuniętych"
+    )
+    return bool(uploaded or deleted)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Indeksowanie produktów i regulaminu")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="przebuduj całe indeksy zamiast tylko zmienionych dokumentów",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    load_settings()
+    emb = create_embeddings()
+
+    manifest = load_manifest()
+    # inny model embeddingów - wszystkie wektory trzeba policzyć od nowa
+    model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or ""
+    if args.full or manifest.get("embedding_model") != model:
+        manifest = {"embedding_model": model, "full_rebuild": True}
+        save_manifest(manifest)
+    # flaga zostaje w manifeście do końca, więc wznowiona przebudowa też sprząta indeks
+    cleanup = manifest.get("full_rebuild", False)
+
+    changed = sync_index(
+        "products-index", product_docs(iter_json_array(PRODUCTS_PATH)), manifest, cleanup, emb
+    )
+    changed |= sync_index(
+        "regulamin-index", pdf_docs(split_pdf(PDF_PATH)), manifest, cleanup, emb
+    )
+
+    manifest.pop("full_rebuild", None)
+    save_manifest(manifest)
+    if changed:
+        bump_index_version()
+    print("Dokumenty zaindeksowane.")
 
-azure_products.client.upload_documents(prod_docs)
-azure_regulamin.client.upload_documents(pdf_docs_to_upload)
 
-print("Dokumenty zaindeksowane.")
+if __name__ == "__main__":
+    main()
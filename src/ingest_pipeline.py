@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from src.batch_embedding import BatchSettings, EmbeddingProgress, embed_with_retry
+
+logger = logging.getLogger(__name__)
+
+# limit Azure AI Search: 1000 dokumentów i 16 MB na jedno żądanie
+MAX_UPLOAD_DOCS = 1000
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+
+_DONE = object()
+
+
+def iter_json_array(path: Path, read_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Kolejne elementy tablicy JSON z pliku, bez wczytywania całego pliku do pamięci.
+    """
+    decoder = json.JSONDecoder()
+    with path.open(encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def fill() -> bool:
+            nonlocal buffer, pos, eof
+            chunk = f.read(read_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                if not fill():
+                    raise ValueError(f"Niekompletna tablica JSON w {path}")
+                continue
+
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError(f"Oczekiwano tablicy JSON w {path}")
+                started = True
+                pos += 1
+            elif char == "]":
+                return
+            elif char == ",":
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if fill():
+                        continue
+                    raise
+                # liczba na końcu bufora mogła zostać ucięta
+                if end == len(buffer) and not eof and fill():
+                    continue
+                pos = end
+                yield item
+
+
+def retry_call(
+    func: Callable[[], Any],
+    attempts: int,
+    base_delay: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = base_delay * 2**attempt
+            logger.warning(f"Błąd wysyłania paczki ({e}), ponawiam za {delay:.1f}s")
+            sleep(delay)
+    return None
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    embedding: BatchSettings = field(default_factory=BatchSettings)
+    queue_size: int = 8
+    upload_max_docs: int = MAX_UPLOAD_DOCS
+    upload_max_bytes: int = MAX_UPLOAD_BYTES
+    upload_attempts: int = 5
+    upload_base_delay: float = 2.0
+
+    @classmethod
+    def from_env(cls) -> "PipelineSettings":
+        return cls(
+            embedding=BatchSettings.from_env(),
+            queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "8")),
+            upload_max_docs=int(os.getenv("UPLOAD_MAX_DOCS", str(MAX_UPLOAD_DOCS))),
+            upload_max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", str(MAX_UPLOAD_BYTES))),
+        )
+
+
+class IngestPipeline:
+    """
+    Etapy: dokumenty -> paczki do embeddingu -> embedding (max_in_flight wątków)
+    -> upload w paczkach ograniczonych liczbą dokumentów i rozmiarem JSON.
+    Kolejki między etapami są ograniczone, więc w pamięci jest najwyżej kilka
+    paczek naraz. Po każdym udanym uploadzie wołane jest on_uploaded (checkpoint).
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], list[list[float]]],
+        upload: Callable[[list[dict[str, Any]]], None],
+        on_uploaded: Callable[[list[dict[str, Any]]], None] | None = None,
+        settings: PipelineSettings | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.embed = embed
+        self.upload = upload
+        self.on_uploaded = on_uploaded
+        self.settings = settings or PipelineSettings()
+        self._sleep = sleep
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self.progress = EmbeddingProgress(total=0)
+        self.uploaded = 0
+        self.upload_requests = 0
+
+    def _fail(self, error: BaseException) -> None:
+        self._errors.append(error)
+        self._stop.set()
+
+    def _put(self, q: queue.Queue[Any], item: Any) -> None:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue[Any]) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _produce(self, docs: Iterable[dict[str, Any]], out: queue.Queue[Any]) -> None:
+        workers = max(1, self.settings.embedding.max_in_flight)
+        try:
+            batch: list[dict[str, Any]] = []
+            for doc in docs:
+                if self._stop.is_set():
+                    return
+                batch.append(doc)
+                if len(batch) == self.settings.embedding.batch_size:
+                    self._put(out, batch)
+                    batch = []
+            if batch:
+                self._put(out, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(workers):
+                self._put(out, _DONE)
+
+    def _embed_worker(self, inp: queue.Queue[Any], out: queue.Queue[Any]) -> None:
+        try:
+            while (batch := self._get(inp)) is not _DONE:
+                texts = [doc["content"] for doc in batch]
+                vectors = embed_with_retry(
+                    self.embed,
+                    texts,
+                    self.settings.embedding,
+                    self.progress,
+                    sleep=self._sleep,
+                )
+                for doc, vector in zip(batch, vectors, strict=True):
+                    doc["embedding"] = vector
+                self._put(out, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out, _DONE)
+
+    def _flush(self, chunk: list[dict[str, Any]]) -> None:
+        retry_call(
+            lambda: self.upload(chunk),
+            self.settings.upload_attempts,
+            self.settings.upload_base_delay,
+            self._sleep,
+        )
+        self.uploaded += len(chunk)
+        self.upload_requests += 1
+        if self.on_uploaded is not None:
+            self.on_uploaded(chunk)
+
+    def _upload_loop(self, inp: queue.Queue[Any], workers: int) -> None:
+        chunk: list[dict[str, Any]] = []
+        chunk_bytes = 0
+        finished = 0
+        while finished < workers:
+            batch = self._get(inp)
+            if self._stop.is_set():
+                return
+            if batch is _DONE:
+                finished += 1
+                continue
+            for doc in batch:
+                size = len(json.dumps(doc, ensure_ascii=False).encode("utf-8"))
+                if chunk and (
+                    len(chunk) >= self.settings.upload_max_docs
+                    or chunk_bytes + size > self.settings.upload_max_bytes
+                ):
+                    self._flush(chunk)
+                    chunk, chunk_bytes = [], 0
+                chunk.append(doc)
+                chunk_bytes += size
+        if chunk:
+            self._flush(chunk)
+
+    def run(self, docs: Iterable[dict[str, Any]]) -> int:
+        """
+        Przetwarza wszystkie dokumenty, zwraca liczbę wysłanych. Błąd dowolnego
+        etapu zatrzymuje pozostałe i jest zgłaszany dalej.
+        """
+        workers = max(1, self.settings.embedding.max_in_flight)
+        to_embed: queue.Queue[Any] = queue.Queue(maxsize=self.settings.queue_size)
+        to_upload: queue.Queue[Any] = queue.Queue(maxsize=self.settings.queue_size)
+
+        threads = [threading.Thread(target=self._produce, args=(docs, to_embed), daemon=True)]
+        threads += [
+            threading.Thread(
+                target=self._embed_worker, args=(to_embed, to_upload), daemon=True
+            )
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._upload_loop(to_upload, workers)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return self.uploaded
@@ -0,0 +1,210 @@
+"""
+Lokalna wyszukiwarka produktów zbudowana z data/products.json.
+
+BM25 na odwróconym indeksie z polską normalizacją (bez znaków diakrytycznych,
+uproszczony stemming), opcjonalnie łączony (Reciprocal Rank Fusion) z
+podobieństwem kosinusowym do embeddingów produktów z cache embeddingów.
+Zwraca dokumenty w tej samej postaci co products-index w Azure AI Search.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.embedding_cache import get_embedding_cache
+from src.nlp_utils import stem_tokens
+from src.products import PRODUCTS_PATH, product_docs
+
+logger = logging.getLogger(__name__)
+
+# stała k z Reciprocal Rank Fusion
+RRF_K = 60
+# ile najlepszych wyników z każdej listy bierze udział w fuzji
+FUSION_CANDIDATES = 50
+
+
+class BM25:
+    def __init__(self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75) -> None:
+        self.size = len(documents)
+        lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.any() else 1.0
+        # część mianownika zależna tylko od długości dokumentu - liczona raz
+        self._norm = k1 * (1 - b + b * lengths / avg_length)
+        self._k1 = k1
+
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        for doc_id, tokens in enumerate(documents):
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            ids = np.array([doc_id for doc_id, _ in entries], dtype=np.int64)
+            tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+            df = len(entries)
+            idf = float(np.log(1 + (self.size - df + 0.5) / (df + 0.5)))
+            self._postings[term] = (ids, tfs, idf)
+
+    def scores(self, terms: list[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self._k1 + 1) / (tfs + self._norm[ids])
+        return scores
+
+
+def _ranks(scores: np.ndarray, candidates: np.ndarray) -> dict[int, int]:
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return {int(doc_id): rank for rank, doc_id in enumerate(order[:FUSION_CANDIDATES])}
+
+
+class LocalProductIndex:
+    def __init__(self, docs: list[dict[str, Any]], vectors: np.ndarray | None = None) -> None:
+        self.docs = docs
+        self._names = BM25([stem_tokens(d.get("name", "")) for d in docs])
+        self._texts = BM25(
+            [
+                stem_tokens(
+                    " ".join([d.get("name", ""), d.get("content", ""), d.get("category", "")])
+                )
+                for d in docs
+            ]
+        )
+        self._vectors = None
+        if vectors is not None:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._vectors = np.divide(
+                vectors, norms, out=np.zeros_like(vectors), where=norms > 0
+            )
+
+    @property
+    def has_vectors(self) -> bool:
+        return self._vectors is not None
+
+    def _result(self, doc_id: int, score: float) -> dict[str, Any]:
+        return {**self.docs[doc_id], "@search.score": score}
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        name_only: bool = False,
+        query_vector: list[float] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Najlepsze dokumenty dla zapytania. Z query_vector (i wektorami produktów)
+        wynik to fuzja rankingów BM25 i podobieństwa kosinusowego.
+        """
+        bm25 = (self._names if name_only else self._texts).scores(stem_tokens(query))
+        matched = np.flatnonzero(bm25 > 0)
+        if query_vector is None or self._vectors is None:
+            top = matched[np.argsort(-bm25[matched], kind="stable")][:top_k]
+            return [self._result(int(i), float(bm25[i])) for i in top]
+
+        vector = np.asarray(query_vector, dtype=np.float32)
+        cosine = self._vectors @ (vector / (np.linalg.norm(vector) or 1.0))
+        fused: dict[int, float] = defaultdict(float)
+        for ranks in (_ranks(bm25, matched), _ranks(cosine, np.arange(len(self.docs)))):
+            for doc_id, rank in ranks.items():
+                fused[doc_id] += 1 / (RRF_K + rank + 1)
+        top = sorted(fused, key=lambda doc_id: -fused[doc_id])[:top_k]
+        return [self._result(doc_id, fused[doc_id]) for doc_id in top]
+
+    def by_category(
+        self, category: str, exclude_id: str | None = None, max_results: int = 3
+    ) -> list[dict[str, Any]]:
+        found = [
+            d for d in self.docs if d.get("category") == category and d.get("id") != exclude_id
+        ]
+        return [{**d, "@search.score": 1.0} for d in found[:max_results]]
+
+
+def to_document(result: dict[str, Any]) -> Document:
+    """
+    jak AzureAISearchRetriever: treść z pola content, reszta pól w metadata
+    """
+    metadata = {k: v for k, v in result.items() if k != "content"}
+    return Document(page_content=result.get("content", ""), metadata=metadata)
+
+
+class LocalProductRetriever(BaseRetriever):
+    """
+    Retriever na lokalnym indeksie produktów. Z embeddings - wyszukiwanie
+    hybrydowe (BM25 + wektory), bez - samo BM25.
+    """
+
+    index: Any
+    top_k: int = 3
+    embeddings: Any = None
+
+    def _vector(self, query: str) -> list[float] | None:
+        if self.embeddings is None or not self.index.has_vectors:
+            return None
+        try:
+            return self.embeddings.embed_query(query)
+        except Exception as e:
+            logger.warning(f"Brak embeddingu zapytania, samo BM25: {e}")
+            return None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        results = self.index.search(query, self.top_k, query_vector=self._vector(query))
+        return [to_document(r) for r in results]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        vector = await asyncio.to_thread(self._vector, query)
+        results = self.index.search(query, self.top_k, query_vector=vector)
+        return [to_document(r) for r in results]
+
+
+def local_search_hybrid() -> bool:
+    return os.getenv("LOCAL_SEARCH_HYBRID", "false").lower() in ("1", "true", "yes")
+
+
+def load_product_vectors(docs: list[dict[str, Any]]) -> np.ndarray | None:
+    """
+    Wektory produktów z cache embeddingów (wypełnianego przez ingest_all).
+    Produkty bez wektora dostają zera, więc trafiają tylko przez BM25.
+    """
+    cache = get_embedding_cache()
+    model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or ""
+    if cache is None or not model:
+        return None
+    cached = cache.get_many(model, [d["content"] for d in docs])
+    present = [v for v in cached if v is not None]
+    if not present:
+        logger.warning("Brak embeddingów produktów w cache - lokalne wyszukiwanie tylko BM25")
+        return None
+    dim = present[0].shape[0]
+    vectors = np.zeros((len(docs), dim), dtype=np.float32)
+    for i, vector in enumerate(cached):
+        if vector is not None:
+            vectors[i] = vector
+    logger.info(f"Lokalne wyszukiwanie hybrydowe: {len(present)}/{len(docs)} wektorów")
+    return vectors
+
+
+@lru_cache(maxsize=4)
+def get_local_index(path: Path = PRODUCTS_PATH) -> LocalProductIndex:
+    docs = list(product_docs(json.loads(path.read_text("utf-8"))))
+    vectors = load_product_vectors(docs) if local_search_hybrid() else None
+    logger.info(f"Lokalny indeks produktów: {len(docs)} dokumentów")
+    return LocalProductIndex(docs, vectors)
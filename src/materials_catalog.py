@@ -0,0 +1,78 @@
+import json
+import logging
+import math
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from src.nlp_utils import normalize_text, parse_area
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = Path(__file__).parent.parent / "data" / "materials_catalog.json"
+
+
+@lru_cache(maxsize=4)
+def load_catalog(path: Path = CATALOG_PATH) -> dict[str, Any]:
+    return json.loads(path.read_text("utf-8"))
+
+
+def match_job(query: str, catalog: dict[str, Any]) -> dict[str, Any] | None:
+    """
+    Zadanie z katalogu najlepiej pasujące do zapytania: najpierw priority
+    (czynność - malowanie, ocieplenie - przed pomieszczeniem), potem liczba
+    trafionych słów kluczowych, przy remisie kolejność w katalogu.
+    """
+    normalized = normalize_text(query)
+    best, best_score = None, (0, 0)
+    for job in catalog["jobs"]:
+        hits = sum(keyword in normalized for keyword in job["keywords"])
+        if not hits:
+            continue
+        score = (job.get("priority", 0), hits)
+        if best is None or score > best_score:
+            best, best_score = job, score
+    return best
+
+
+def _quantity(material: dict[str, Any], area: float | None) -> dict[str, Any]:
+    if "fixed" in material:
+        return {
+            "name": material["name"],
+            "quantity": material["fixed"],
+            "unit": material["unit"],
+        }
+    if area is None:
+        # bez powierzchni podajemy zużycie na m²
+        return {
+            "name": material["name"],
+            "quantity": material["per_m2"],
+            "unit": f"{material['unit']}/m²",
+        }
+    quantity = max(math.ceil(material["per_m2"] * area), material.get("min", 0))
+    return {"name": material["name"], "quantity": quantity, "unit": material["unit"]}
+
+
+def estimate_materials(
+    query: str, catalog: dict[str, Any] | None = None
+) -> dict[str, Any] | None:
+    """
+    Lista materiałów podstawowych i dodatkowych z lokalnego katalogu, przeliczona
+    na powierzchnię z zapytania. None, gdy katalog nie obejmuje zadania.
+    """
+    catalog = catalog or load_catalog()
+    job = match_job(query, catalog)
+    if job is None:
+        return None
+
+    area = parse_area(query)
+    logger.info(
+        f"Materiały z katalogu v{catalog['version']}: {job['name']}, powierzchnia: {area}"
+    )
+    return {
+        "job": job["name"],
+        "area": area,
+        "catalog_version": catalog["version"],
+        "basic_materials": [_quantity(m, area) for m in job["basic_materials"]],
+        "additional_materials": [_quantity(m, area) for m in job["additional_materials"]],
+    }
@@ -1,3 +1,27 @@
+import re
+import unicodedata
+
+# 10m2, 10 m^2, 10 mkw, 10,5 m kw, 10 m. kw., 20 metrów kwadratowych, 20 metrów kw.
+AREA_PATTERN = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*"
+    r"(?:m2|m\^2|m\.?\s*kw\b\.?|metr(?:ow|y|a)?\s+(?:kwadratow(?:ych|e|y)?|kw\b\.?))"
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# końcówki fleksyjne (po normalize_text), od najdłuższych
+_SUFFIXES = sorted(
+    [
+        "ami", "ach", "ego", "emu", "ich", "ych", "imi", "ymi", "owi", "iem",
+        "ow", "om", "ie", "ej", "em", "mi",
+        "a", "e", "i", "o", "u", "y",
+    ],
+    key=len,
+    reverse=True,
+)  # fmt: skip
+_MIN_STEM = 3
+
+
 def classify_question(question: str) -> str:
     q = question.lower()
     if any(word in q for word in ["zwrot", "reklamacja", "czas", "termin"]):
@@ -7,3 +31,43 @@ def classify_question(question: str) -> str:
     if not q.strip():
         return "nieznane"
     return "inne"
+
+
+def normalize_text(text: str) -> str:
+    """
+    małe litery, bez polskich znaków, m² -> m2
+    """
+    text = text.lower().replace("ł", "l").replace("²", "2")
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(normalize_text(text))
+
+
+def stem(token: str) -> str:
+    """
+    Uproszczony stemming: obcina końcówkę fleksyjną, np. farba/farby/farbę -> farb.
+    Liczby i krótkie słowa bez zmian.
+    """
+    if token.isdigit():
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[: -len(suffix)]
+    return token
+
+
+def stem_tokens(text: str) -> list[str]:
+    return [stem(token) for token in tokenize(text)]
+
+
+def parse_area(text: str) -> float | None:
+    """
+    powierzchnia w m² z zapytania, np. 'łazienka 10,5m²' -> 10.5
+    """
+    match = AREA_PATTERN.search(normalize_text(text))
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "."))
@@ -0,0 +1,30 @@
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+PRODUCTS_PATH = Path(__file__).parent.parent / "data" / "products.json"
+
+
+def product_content(p: dict[str, Any]) -> str:
+    return " ".join(
+        [
+            p.get("name", ""),
+            p.get("description", ""),
+            p.get("content", ""),
+            f"Cena: {p.get('price', 'brak ceny')} PLN",
+        ]
+    )
+
+
+def product_docs(products: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    """
+    dokumenty w takiej postaci, w jakiej trafiają do products-index
+    """
+    for p in products:
+        yield {
+            "id": p["id"],
+            "name": p.get("name", ""),
+            "description": p.get("description", ""),
+            "content": product_content(p),
+            "category": p.get("category", "brak"),
+        }
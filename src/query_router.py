@@ -0,0 +1,244 @@
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from src.nlp_utils import AREA_PATTERN, normalize_text, tokenize
+from src.tracing import get_metrics
+
+logger = logging.getLogger(__name__)
+
+MATERIALS_CALCULATION = "materials_calculation"
+GENERAL = "general"
+
+DECISION_BOUNDARY = 0.5
+# naiwny Bayes sumuje log-odds kilkudziesięciu zależnych n-gramów z ~40 przykładów
+# i jest przesadnie pewny - jego wkład jest skalowany (temperatura) i obcięty,
+# żeby o wyniku współdecydowały reguły, a niepewne pytania trafiały do LLM
+NB_TEMPERATURE = 2.0
+NB_MAX_LOG_ODDS = 3.0
+
+MATERIALS_EXAMPLES = [
+    "Chcę wyremontować łazienkę 10m²",
+    "Ile potrzebuję materiałów do malowania pokoju?",
+    "Chcę zbudować taras 20m²",
+    "Potrzebuję materiałów na remont kuchni",
+    "Materiały do budowy tarasu 15m²",
+]
+
+GENERAL_EXAMPLES = [
+    "Czy macie cement?",
+    "Ile kosztuje farba?",
+    "Jaki jest regulamin zwrotów?",
+    "Jakie macie płytki?",
+    # pytania o obsługę zamówień, w których padają słowa "materiały" i "budowa"
+    "Jak długo trwa dostawa materiałów budowlanych?",
+    "Czy dowozicie materiały na plac budowy?",
+    "Ile kosztuje transport materiałów na budowę?",
+    "Czy mogę zwrócić nieużyte materiały budowlane?",
+    "Czy wystawiacie fakturę na materiały budowlane?",
+]
+
+TEST_QA_PATH = Path(__file__).parent.parent / "data" / "test_qa.json"
+
+# cechy regułowe: (wzorzec na znormalizowanym tekście, waga log-odds na korzyść materiałów)
+RULES: list[tuple[re.Pattern[str], float]] = [
+    (AREA_PATTERN, 2.5),
+    (re.compile(r"\b(?:wy)?remont\w*"), 2.0),
+    (re.compile(r"\b(?:z|wy|od)?budow\w*"), 2.0),
+    (re.compile(r"\b(?:po)?malowa\w*"), 1.5),
+    (re.compile(r"\b(?:ociepl|docieplen|wykoncz|uloz|poloz)\w*"), 1.5),
+    (re.compile(r"\bile\s+(?:potrzebuje|potrzeba|trzeba|bede\s+potrzebowac)\b"), 1.5),
+    (re.compile(r"\bmaterial\w*\s+(?:do|na)\b"), 2.0),
+    (re.compile(r"\b(?:czy\s+)?macie\b"), -1.5),
+    (re.compile(r"\b(?:ile\s+kosztuj\w*|cena|cene|ceny|rabat\w*)\b"), -1.5),
+    (
+        re.compile(
+            r"\b(?:regulamin|zwrot|zwroc|reklamac|dostaw|dostarcz|dowoz|dowiez|faktur"
+            r"|zamowieni|anulowa|transport)\w*"
+        ),
+        -3.0,
+    ),
+]
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    label: str
+    confidence: float
+
+
+def _features(text: str) -> list[str]:
+    """
+    unigramy (obcięte do 5 znaków jako prosty stemming) i bigramy
+    """
+    stems = [token[:5] for token in tokenize(text)]
+    return stems + [f"{a}_{b}" for a, b in itertools.pairwise(stems)]
+
+
+def load_training_examples() -> list[tuple[str, str]]:
+    examples = [(q, MATERIALS_CALCULATION) for q in MATERIALS_EXAMPLES]
+    examples += [(q, GENERAL) for q in GENERAL_EXAMPLES]
+    if TEST_QA_PATH.exists():
+        qa_data: list[dict[str, Any]] = json.loads(TEST_QA_PATH.read_text("utf-8"))
+        examples += [(item["question"], GENERAL) for item in qa_data if item.get("question")]
+    return examples
+
+
+class QueryRouter:
+    """
+    Lokalny klasyfikator zapytań (reguły + naiwny Bayes na n-gramach).
+    LLM wołany tylko gdy pewność jest poniżej progu.
+    """
+
+    def __init__(self, examples: list[tuple[str, str]], threshold: float = 0.85) -> None:
+        self.threshold = threshold
+        self._counts: dict[str, Counter[str]] = {
+            MATERIALS_CALCULATION: Counter(),
+            GENERAL: Counter(),
+        }
+        for text, label in examples:
+            self._counts[label].update(_features(text))
+        self._vocabulary = set(self._counts[MATERIALS_CALCULATION]) | set(
+            self._counts[GENERAL]
+        )
+        self._totals = {label: sum(c.values()) for label, c in self._counts.items()}
+
+        self._lock = threading.Lock()
+        self._local_hits = 0
+        self._llm_fallbacks = 0
+        self._local_seconds = 0.0
+        self._llm_seconds = 0.0
+
+    def _log_prob(self, feature: str, label: str) -> float:
+        # wygładzanie Laplace'a, rozkład a priori jednostajny
+        count = self._counts[label][feature]
+        return math.log((count + 1) / (self._totals[label] + len(self._vocabulary)))
+
+    def classify(self, query: str) -> RouteDecision:
+        normalized = normalize_text(query)
+        bayes = 0.0
+        for feature in _features(query):
+            if feature in self._vocabulary:
+                bayes += self._log_prob(feature, MATERIALS_CALCULATION)
+                bayes -= self._log_prob(feature, GENERAL)
+        log_odds = max(-NB_MAX_LOG_ODDS, min(NB_MAX_LOG_ODDS, bayes / NB_TEMPERATURE))
+        for pattern, weight in RULES:
+            if pattern.search(normalized):
+                log_odds += weight
+
+        p_materials = 1 / (1 + math.exp(-log_odds))
+        if p_materials >= DECISION_BOUNDARY:
+            return RouteDecision(MATERIALS_CALCULATION, p_materials)
+        return RouteDecision(GENERAL, 1 - p_materials)
+
+    def _local_route(self, query: str) -> tuple[str | None, float]:
+        """
+        etykieta, gdy lokalna pewność wystarcza (inaczej None), i czas klasyfikacji
+        """
+        start = time.perf_counter()
+        decision = self.classify(query)
+        local_elapsed = time.perf_counter() - start
+
+        if decision.confidence >= self.threshold:
+            with self._lock:
+                self._local_hits += 1
+                self._local_seconds += local_elapsed
+            logger.info(
+                f"Klasyfikacja lokalna: {decision.label} (pewność {decision.confidence:.2f})"
+            )
+            return decision.label, local_elapsed
+
+        logger.info(
+            f"Niska pewność klasyfikacji lokalnej ({decision.confidence:.2f}), pytam LLM"
+        )
+        return None, local_elapsed
+
+    def _record_fallback(self, local_elapsed: float, llm_elapsed: float) -> None:
+        with self._lock:
+            self._llm_fallbacks += 1
+            self._local_seconds += local_elapsed
+            self._llm_seconds += llm_elapsed
+
+    def route(self, query: str, fallback: Callable[[str], str]) -> str:
+        label, local_elapsed = self._local_route(query)
+        if label is not None:
+            return label
+        start = time.perf_counter()
+        try:
+            return fallback(query)
+        finally:
+            self._record_fallback(local_elapsed, time.perf_counter() - start)
+
+    async def aroute(self, query: str, fallback: Callable[[str], Awaitable[str]]) -> str:
+        label, local_elapsed = self._local_route(query)
+        if label is not None:
+            return label
+        start = time.perf_counter()
+        try:
+            return await fallback(query)
+        finally:
+            self._record_fallback(local_elapsed, time.perf_counter() - start)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            total = self._local_hits + self._llm_fallbacks
+            return {
+                "requests": total,
+                "local_hits": self._local_hits,
+                "llm_fallbacks": self._llm_fallbacks,
+                "hit_rate": self._local_hits / total if total else 0.0,
+                "avg_local_ms": 1000 * self._local_seconds / total if total else 0.0,
+                "avg_llm_ms": (
+                    1000 * self._llm_seconds / self._llm_fallbacks
+                    if self._llm_fallbacks
+                    else 0.0
+                ),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_router() -> QueryRouter:
+    threshold = float(os.getenv("QUERY_ROUTER_THRESHOLD", "0.85"))
+    return QueryRouter(load_training_examples(), threshold=threshold)
+
+
+def router_counters() -> dict[str, dict[str, float]]:
+    """
+    decyzje i łączny czas routera wg ścieżki (local/llm) dla /api/metrics;
+    puste, dopóki router nie został użyty - odczyt metryk go nie buduje
+    """
+    if not get_router.cache_info().currsize:
+        return {"decisions": {}, "seconds": {}}
+    stats = get_router().stats()
+    return {
+        "decisions": {"local": stats["local_hits"], "llm": stats["llm_fallbacks"]},
+        "seconds": {
+            "local": round(stats["avg_local_ms"] * stats["requests"] / 1000, 6),
+            "llm": round(stats["avg_llm_ms"] * stats["llm_fallbacks"] / 1000, 6),
+        },
+    }
+
+
+get_metrics().register_counter(
+    "hurtbot_router_decisions_total",
+    "Klasyfikacje zapytań: lokalnie albo przez LLM (niska pewność).",
+    "route",
+    lambda: router_counters()["decisions"],
+)
+get_metrics().register_counter(
+    "hurtbot_router_seconds_total",
+    "Łączny czas klasyfikacji lokalnej i zapytań do LLM.",
+    "route",
+    lambda: router_counters()["seconds"],
+)
@@ -0,0 +1,166 @@
+"""
+Wycena listy zamówieniowej bez LLM: wszystkie pozycje wyszukiwane równolegle,
+stany i ceny jednym zapytaniem do bazy, liczba opakowań z rozmiaru opakowania
+odczytanego z nazwy produktu.
+"""
+
+import math
+import os
+import re
+from typing import Any
+
+from src.calc_materials import afind_products_in_database, group_by_search_term, match_score
+from src.nlp_utils import normalize_text, stem_tokens
+
+PACK_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(kg|g|ml|l|m2|mb|m|szt)\b")
+
+# jednostka -> (jednostka bazowa, mnożnik)
+UNITS = {
+    "kg": ("kg", 1.0),
+    "g": ("kg", 0.001),
+    "l": ("l", 1.0),
+    "ml": ("l", 0.001),
+    "m2": ("m2", 1.0),
+    "mkw": ("m2", 1.0),
+    "m": ("m", 1.0),
+    "mb": ("m", 1.0),
+    "szt": ("szt", 1.0),
+}
+
+OK = "ok"
+INSUFFICIENT_STOCK = "insufficient_stock"
+NO_PRICE = "no_price"
+NOT_FOUND = "not_found"
+
+
+class QuoteError(ValueError):
+    pass
+
+
+def normalize_unit(unit: str | None) -> tuple[str, float] | None:
+    if not unit:
+        return None
+    return UNITS.get(normalize_text(unit).strip(". "))
+
+
+def parse_pack(name: str) -> tuple[float, str] | None:
+    """
+    rozmiar opakowania z nazwy, w jednostce bazowej: 'Klej do tapet 200g' -> (0.2, 'kg')
+    """
+    match = PACK_PATTERN.search(normalize_text(name))
+    if not match:
+        return None
+    base_unit, factor = UNITS[match.group(2)]
+    return float(match.group(1).replace(",", ".")) * factor, base_unit
+
+
+def parse_items(payload: Any) -> list[dict[str, Any]]:
+    max_items = int(os.getenv("QUOTE_MAX_ITEMS", "500"))
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise QuoteError("Brak listy pozycji 'items'")
+    if len(items) > max_items:
+        raise QuoteError(f"Za dużo pozycji (maksymalnie {max_items})")
+
+    parsed = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise QuoteError(f"Pozycja {number}: oczekiwano obiektu")
+        text = str(item.get("text", "")).strip()
+        try:
+            quantity = float(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise QuoteError(f"Pozycja {number}: niepoprawna ilość") from None
+        if not text or not quantity > 0 or math.isinf(quantity):
+            raise QuoteError(f"Pozycja {number}: wymagane 'text' i dodatnia 'quantity'")
+        parsed.append({"text": text, "quantity": quantity, "unit": item.get("unit") or None})
+    return parsed
+
+
+def packs_needed(quantity: float, unit: str | None, pack: tuple[float, str] | None) -> int:
+    """
+    Ilość w kg/l/m² przeliczana na opakowania (w górę). Sztuki, opakowania albo
+    jednostka niezgodna z opakowaniem - ilość to liczba opakowań.
+    """
+    requested = normalize_unit(unit)
+    if pack is not None and requested is not None and requested[0] == pack[1] != "szt":
+        # zaokrąglenie chroni przed 2.0000000001 opakowania z błędów float
+        return math.ceil(round(quantity * requested[1] / pack[0], 6))
+    return math.ceil(quantity)
+
+
+def price_offer(item: dict[str, Any], product: dict[str, Any]) -> dict[str, Any]:
+    name = product["metadata"].get("name", "")
+    pack = parse_pack(name)
+    packs = packs_needed(item["quantity"], item["unit"], pack)
+    price = product.get("current_price")
+    available = product.get("current_quantity", 0)
+    if price is None:
+        status = NO_PRICE
+    elif available < packs:
+        status = INSUFFICIENT_STOCK
+    else:
+        status = OK
+    return {
+        "product": {"id": product["metadata"].get("id"), "name": name},
+        "pack": {"size": pack[0], "unit": pack[1]} if pack else None,
+        "packs": packs,
+        "unit_price": price,
+        "line_total": round(packs * price, 2) if price is not None else None,
+        "available_quantity": available,
+        "status": status,
+    }
+
+
+def choose_offer(item: dict[str, Any], candidates: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Spośród najlepiej pasujących produktów: najpierw dostępny w potrzebnej ilości,
+    potem najtańszy w sumie za pozycję (uwzględnia różne opakowania).
+    """
+    if not candidates:
+        return {
+            "product": None,
+            "pack": None,
+            "packs": 0,
+            "unit_price": None,
+            "line_total": None,
+            "available_quantity": 0,
+            "status": NOT_FOUND,
+        }
+
+    tokens = set(stem_tokens(item["text"]))
+    best_score = max(match_score(tokens, p) for p in candidates)
+    offers = [
+        (price_offer(item, p), p.get("rank", 0))
+        for p in candidates
+        if match_score(tokens, p) == best_score
+    ]
+    status_order = {OK: 0, INSUFFICIENT_STOCK: 1, NO_PRICE: 2}
+    offer, _ = min(
+        offers,
+        key=lambda o: (
+            status_order[o[0]["status"]],
+            o[0]["line_total"] if o[0]["line_total"] is not None else math.inf,
+            o[1],
+        ),
+    )
+    return offer
+
+
+async def aquote(payload: Any) -> dict[str, Any]:
+    """
+    Wycena pozycji {"items": [{"text", "quantity", "unit"}]}. Zwraca pozycje
+    w kolejności zamówienia i sumę dla pozycji z ceną.
+    """
+    items = parse_items(payload)
+    products = await afind_products_in_database([item["text"] for item in items])
+    by_text = group_by_search_term(products)
+
+    lines = [{**item, **choose_offer(item, by_text.get(item["text"], []))} for item in items]
+    total = sum(line["line_total"] for line in lines if line["line_total"] is not None)
+    return {
+        "lines": lines,
+        "total": round(total, 2),
+        "currency": "PLN",
+        "complete": all(line["status"] == OK for line in lines),
+    }
@@ -0,0 +1,312 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from src import stock
+from src.clients import (
+    LOCAL_BACKEND,
+    PRODUCTS_INDEX,
+    REGULAMIN_INDEX,
+    get_index_client,
+    search_backend,
+)
+from src.nlp_utils import normalize_text
+from src.tracing import get_metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION_PATH = Path(__file__).parent.parent / "data" / "index_version.txt"
+
+# liczby z jednostką (10L, 5 l, 25kg, 15cm) - warianty produktu różniące się
+# opakowaniem mają prawie identyczne embeddingi pytań
+_QUANTITY_PATTERN = re.compile(r"\d+(?:[.,]\d+)?\s*[a-z]*\d?")
+
+
+def question_quantities(question: str) -> frozenset[str]:
+    return frozenset(
+        re.sub(r"\s+", "", match).replace(",", ".")
+        for match in _QUANTITY_PATTERN.findall(normalize_text(question))
+    )
+
+
+def read_index_version(path: Path = INDEX_VERSION_PATH) -> str:
+    try:
+        return path.read_text("utf-8").strip()
+    except OSError:
+        return ""
+
+
+def bump_index_version(path: Path = INDEX_VERSION_PATH) -> str:
+    """
+    Wołane po ponownym zaindeksowaniu - unieważnia odpowiedzi workerów na tym
+    samym hoście (lokalnie); pozostałe widzą zmianę w statystykach indeksów.
+    """
+    version = str(time.time_ns())
+    path.write_text(version, "utf-8")
+    return version
+
+
+def fetch_index_version() -> str:
+    """
+    Wersja indeksów widoczna dla wszystkich workerów: liczba dokumentów i
+    rozmiar każdego indeksu w Azure AI Search (zmieniają się po indeksowaniu)
+    plus lokalny index_version.txt.
+    """
+    indexes = [REGULAMIN_INDEX]
+    if search_backend() != LOCAL_BACKEND:
+        indexes.insert(0, PRODUCTS_INDEX)
+    parts = [read_index_version()]
+    for index_name in indexes:
+        stats = get_index_client().get_index_statistics(index_name)
+        parts.append(f"{index_name}:{stats['document_count']}:{stats['storage_size']}")
+    return "|".join(parts)
+
+
+class IndexVersionPoller:
+    """
+    Ostatnia znana wersja indeksów, odświeżana co `interval` sekund w tle -
+    wywołanie nie czeka na sieć. Błąd odczytu zostawia poprzednią wersję.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], str] = fetch_index_version,
+        interval: float = 60,
+        clock: Callable[[], float] = time.monotonic,
+        start: Callable[[Callable[[], None]], None] | None = None,
+    ) -> None:
+        self._fetch = fetch
+        self.interval = interval
+        self._clock = clock
+        self._start = start or (
+            lambda refresh: threading.Thread(
+                target=refresh, name="index-version", daemon=True
+            ).start()
+        )
+        self._value = ""
+        self._checked_at: float | None = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        try:
+            value = self._fetch()
+        except Exception as e:
+            logger.warning(f"Nie udało się odczytać wersji indeksów: {e}")
+        else:
+            self._value = value
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def __call__(self) -> str:
+        now = self._clock()
+        with self._lock:
+            due = self._checked_at is None or now - self._checked_at >= self.interval
+            if due and not self._refreshing:
+                self._checked_at = now
+                self._refreshing = True
+            else:
+                due = False
+        if due:
+            self._start(self.refresh)
+        return self._value
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    answer: str
+    product_ids: frozenset[str]
+    stored_at: float
+    quantities: frozenset[str] = frozenset()
+
+
+class SemanticCache:
+    """
+    Cache odpowiedzi dla pytań ogólnych wyszukiwanych po podobieństwie
+    kosinusowym embeddingów pytania. Ograniczony rozmiar (LRU) i TTL.
+    Wpisy są unieważniane po zmianie stanów/cen produktów, na które się
+    powołują, i po ponownym zaindeksowaniu (zmiana index_version). Odpowiedź
+    z danymi produktów żyje najwyżej product_max_age() sekund - tyle, ile
+    mogą być nieaktualne stany/ceny, o których zmianie nikt nie powiadomi.
+    Trafienie wymaga też tych samych ilości w pytaniu (10L to nie 5L).
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        threshold: float = 0.97,
+        max_size: int = 1000,
+        ttl_seconds: float = 3600,
+        index_version: Callable[[], str] = read_index_version,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        product_max_age: Callable[[], float] = lambda: math.inf,
+    ) -> None:
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._index_version = index_version
+        self._clock = clock
+        self._product_max_age = product_max_age
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        self._next_key = 0
+        self._matrix: np.ndarray | None = None
+        self._matrix_keys: list[int] = []
+        self._version = index_version()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expired_entries = 0
+        self._invalidations = 0
+
+    def _check_index_version(self) -> None:
+        version = self._index_version()
+        if version != self._version:
+            logger.info("Indeksy zostały przebudowane, czyszczę cache odpowiedzi")
+            self._version = version
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._matrix = None
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        ttl = self.ttl_seconds
+        if entry.product_ids:
+            ttl = min(ttl, self._product_max_age())
+        return self._clock() - entry.stored_at > ttl
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[k].vector for k in self._matrix_keys])
+        return self._matrix
+
+    def lookup(self, vector: Iterable[float], question: str = "") -> str | None:
+        """
+        Najbardziej podobna ważna odpowiedź powyżej progu; wpisy przeterminowane
+        są usuwane po drodze, a te z innymi ilościami w pytaniu pomijane.
+        """
+        query = _normalize(vector)
+        quantities = question_quantities(question)
+        with self._lock:
+            self._check_index_version()
+            if self._entries:
+                scores = self._vectors() @ query
+                keys = self._matrix_keys
+                for i in np.argsort(-scores, kind="stable"):
+                    if scores[i] < self.threshold:
+                        break
+                    entry = self._entries[keys[i]]
+                    if self._expired(entry):
+                        self._drop(keys[i])
+                        self._expired_entries += 1
+                        continue
+                    if entry.quantities != quantities:
+                        continue
+                    self._entries.move_to_end(keys[i])
+                    self._hits += 1
+                    logger.info(f"Odpowiedź z cache (podobieństwo {scores[i]:.3f})")
+                    return entry.answer
+            self._misses += 1
+            return None
+
+    def store(
+        self,
+        vector: Iterable[float],
+        answer: str,
+        product_ids: Iterable[str],
+        question: str = "",
+    ) -> None:
+        with self._lock:
+            self._check_index_version()
+            self._entries[self._next_key] = CachedAnswer(
+                vector=_normalize(vector),
+                answer=answer,
+                product_ids=frozenset(product_ids),
+                stored_at=self._clock(),
+                quantities=question_quantities(question),
+            )
+            self._next_key += 1
+            self._stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+            self._matrix = None
+
+    def _drop(self, key: int) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def invalidate_products(self, product_ids: Iterable[str] | None) -> int:
+        """
+        Usuwa odpowiedzi powołujące się na podane produkty (wszystkie, gdy None).
+        """
+        with self._lock:
+            if product_ids is None:
+                stale = list(self._entries)
+            else:
+                changed = set(product_ids)
+                stale = [k for k, e in self._entries.items() if e.product_ids & changed]
+            for key in stale:
+                self._drop(key)
+            self._invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "expired": self._expired_entries,
+                "invalidations": self._invalidations,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+def _normalize(vector: Iterable[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache | None:
+    """
+    cache współdzielony w procesie (None, gdy SEMANTIC_CACHE_ENABLED=false)
+    """
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    cache = SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97")),
+        max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+        index_version=IndexVersionPoller(
+            interval=float(os.getenv("SEMANTIC_CACHE_VERSION_INTERVAL", "60"))
+        ),
+        product_max_age=stock.max_data_age,
+    )
+    stock.add_invalidation_listener(cache.invalidate_products)
+    get_metrics().register_stats(
+        "hurtbot_semantic_cache",
+        "Cache odpowiedzi na pytania ogólne: trafienia, chybienia, zapisy, "
+        "wpisy usunięte i unieważnione, rozmiar i trafialność.",
+        cache.stats,
+        counters=("hits", "misses", "stores", "evictions", "expired", "invalidations"),
+    )
+    return cache
@@ -0,0 +1,70 @@
+"""
+Konfiguracja połączeń z usługami zewnętrznymi.
+
+local.settings.json i .env są wczytywane do zmiennych środowiskowych raz,
+przy pierwszym imporcie tego modułu (zmienne ustawione w procesie mają
+pierwszeństwo, potem local.settings.json, potem .env). Adresy, klucze i nazwy
+wdrożeń są czytane przez jeden obiekt Settings; przełączniki i limity
+poszczególnych modułów nadal czytają swoje zmienne przez os.getenv.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+LOCAL_SETTINGS_PATH = Path(__file__).parent.parent / "local.settings.json"
+
+
+def load_environment(local_settings: Path = LOCAL_SETTINGS_PATH) -> None:
+    if local_settings.exists():
+        values = json.loads(local_settings.read_text("utf-8")).get("Values", {})
+        for key, value in values.items():
+            os.environ.setdefault(key, value)
+    load_dotenv()
+
+
+@dataclass(frozen=True)
+class Settings:
+    foundry_endpoint: str = ""
+    foundry_key: str = ""
+    chat_deployment: str = ""
+    openai_endpoint: str = ""
+    openai_key: str = ""
+    embedding_deployment: str = ""
+    search_endpoint: str = ""
+    search_key: str = ""
+    sql_connection_string: str = ""
+    sql_pool_size: int = 5
+    http_pool_size: int = 20
+
+    @property
+    def search_service_name(self) -> str:
+        return self.search_endpoint.split("//")[-1].split(".")[0]
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            foundry_endpoint=os.getenv("AZURE_FOUNDRY_ENDPOINT") or "",
+            foundry_key=os.getenv("AZURE_FOUNDRY_KEY") or "",
+            chat_deployment=os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT") or "",
+            openai_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT") or "",
+            openai_key=os.getenv("AZURE_OPENAI_KEY") or "",
+            embedding_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT") or "",
+            search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT") or "",
+            search_key=os.getenv("AZURE_SEARCH_KEY") or "",
+            sql_connection_string=os.getenv("SQL_CONNECTION_STRING") or "",
+            sql_pool_size=int(os.getenv("SQL_POOL_SIZE", "5")),
+            http_pool_size=int(os.getenv("HTTP_POOL_SIZE", "20")),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings.from_env()
+
+
+load_environment()
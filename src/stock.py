@@ -0,0 +1,292 @@
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from src.cache import TTLCache
+from src.settings import get_settings
+from src.tracing import get_metrics, span
+
+logger = logging.getLogger(__name__)
+
+# SQL Server przyjmuje maksymalnie 2100 parametrów w jednym zapytaniu
+MAX_IDS_PER_QUERY = 1000
+
+
+class ConnectionPool:
+    """
+    Prosta pula połączeń DB-API. Połączenie, na którym wystąpił błąd,
+    jest zamykane zamiast wracać do puli.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 5) -> None:
+        self._connect = connect
+        self._idle: queue.LifoQueue[Any] = queue.LifoQueue(maxsize=max_size)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            _close_quietly(conn)
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            _close_quietly(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def _close_quietly(conn: Any) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def connect_sql() -> Any:
+    import pyodbc  # noqa: PLC0415 - sterownik ODBC potrzebny tylko przy pierwszym połączeniu
+
+    return pyodbc.connect(get_settings().sql_connection_string)
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def configure(connect: Callable[[], Any], max_size: int = 5) -> None:
+    """
+    Podmienia źródło połączeń (np. SQLite w testach).
+    """
+    global _pool  # noqa: PLW0603
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(connect, max_size=max_size)
+    purge()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool  # noqa: PLW0603
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(connect_sql, max_size=get_settings().sql_pool_size)
+        return _pool
+
+
+def _fetch_stock(ids: list[str]) -> dict[str, tuple[int, float]]:
+    result: dict[str, tuple[int, float]] = {}
+    with span("sql.stock", ids=len(ids)), get_pool().connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+            chunk = ids[start : start + MAX_IDS_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(
+                "SELECT product_id, quantity, price FROM stock "
+                f"WHERE product_id IN ({placeholders})",
+                chunk,
+            )
+            for row in cursor.fetchall():
+                result[row[0]] = (row[1], row[2])
+        cursor.close()
+    return result
+
+
+def get_products_quantity_and_price(
+    product_ids: Iterable[str],
+) -> dict[str, tuple[int, float]]:
+    """
+    Stan i cena dla wielu produktów. Wpisy z cache, brakujące jednym zapytaniem
+    WHERE product_id IN (...). Produkty, których nie ma w tabeli stock, są pomijane.
+    """
+    ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+    if not ids:
+        return {}
+
+    poll_changes()
+    found = _cache.get_many(ids)
+    missing = [pid for pid in ids if pid not in found]
+    if missing:
+        try:
+            fetched = _fetch_stock(missing)
+        except Exception as e:
+            logger.warning(f"SQL Error: {e}")
+        else:
+            # brak wiersza też zapamiętujemy, żeby nie odpytywać bazy ponownie
+            rows = {pid: fetched.get(pid) for pid in missing}
+            _cache.set_many(rows)
+            found.update(rows)
+    return {pid: row for pid, row in found.items() if row is not None}
+
+
+def get_product_quantity_and_price(product_id: str) -> tuple[int, float] | None:
+    return get_products_quantity_and_price([product_id]).get(product_id)
+
+
+_cache = TTLCache(
+    max_size=int(os.getenv("STOCK_CACHE_SIZE", "2000")),
+    ttl_seconds=float(os.getenv("STOCK_CACHE_TTL", "60")),
+)
+_change_column = os.getenv("STOCK_CHANGE_COLUMN") or None
+_poll_interval = float(os.getenv("STOCK_CHANGE_POLL_SECONDS", "5"))
+_poll_lock = threading.Lock()
+_last_poll = float("-inf")
+_polling = False
+_watermark: Any = None
+_change_polls = 0
+_changed_rows = 0
+_invalidation_listeners: list[Callable[[list[str] | None], None]] = []
+
+
+def configure_cache(
+    max_size: int,
+    ttl_seconds: float,
+    change_column: str | None = None,
+    poll_interval: float = 5.0,
+) -> None:
+    """
+    change_column: kolumna rowversion/updated_at w tabeli stock, po której
+    wykrywane są zmiany cen i stanów (None - tylko TTL i purge()). Tabela
+    stock w tym repozytorium nie ma takiej kolumny - trzeba ją dodać w bazie.
+    """
+    global _cache, _change_column, _poll_interval, _last_poll, _watermark  # noqa: PLW0603
+    if change_column is not None and not change_column.isidentifier():
+        raise ValueError(f"Niepoprawna nazwa kolumny: {change_column}")
+    with _poll_lock:
+        _cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        _change_column = change_column
+        _poll_interval = poll_interval
+        _last_poll = float("-inf")
+        _watermark = None
+    # nowy, pusty cache - zależne cache (odpowiedzi) też tracą aktualność
+    _notify_listeners(None)
+
+
+def add_invalidation_listener(listener: Callable[[list[str] | None], None]) -> None:
+    """
+    listener dostaje listę zmienionych product_id albo None (wszystko unieważnione)
+    """
+    _invalidation_listeners.append(listener)
+
+
+def purge(product_ids: Iterable[str] | None = None) -> int:
+    """
+    Jawne unieważnienie cache (wszystko, gdy product_ids=None).
+    """
+    ids = None if product_ids is None else list(product_ids)
+    removed = _cache.invalidate(ids)
+    _notify_listeners(ids)
+    return removed
+
+
+def _notify_listeners(ids: list[str] | None) -> None:
+    for listener in _invalidation_listeners:
+        try:
+            listener(ids)
+        except Exception as e:
+            logger.warning(f"Błąd w obsłudze unieważnienia cache: {e}")
+
+
+def _query_changes(column: str, watermark: Any) -> tuple[Any, list[Any]]:
+    """
+    (nowy znacznik, zmienione wiersze); pierwsze wywołanie tylko ustala znacznik
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if watermark is None:
+                cursor.execute(f"SELECT MAX({column}) FROM stock")
+                return cursor.fetchone()[0], []
+            cursor.execute(
+                f"SELECT product_id, {column} FROM stock WHERE {column} > ?", (watermark,)
+            )
+            rows = cursor.fetchall()
+            return (max(row[1] for row in rows) if rows else watermark), rows
+        finally:
+            cursor.close()
+
+
+def poll_changes(force: bool = False) -> int:
+    """
+    Sprawdza kolumnę zmian w tabeli stock (co najwyżej raz na poll_interval)
+    i unieważnia zmienione produkty. Zwraca liczbę zmienionych wierszy.
+    Zapytanie wykonuje jeden wątek, bez blokady - pozostałe w tym czasie
+    czytają cache zamiast czekać na bazę.
+    """
+    global _last_poll, _polling, _watermark, _change_polls, _changed_rows  # noqa: PLW0603
+    if not _change_column:
+        return 0
+    with _poll_lock:
+        now = time.monotonic()
+        if _polling or (not force and now - _last_poll < _poll_interval):
+            return 0
+        _last_poll = now
+        _polling = True
+        column, watermark = _change_column, _watermark
+    try:
+        new_watermark, rows = _query_changes(column, watermark)
+    except Exception as e:
+        logger.warning(f"Nie udało się sprawdzić zmian w tabeli stock: {e}")
+        return 0
+    finally:
+        with _poll_lock:
+            _polling = False
+    with _poll_lock:
+        if _change_column != column or _watermark != watermark:
+            # configure_cache w trakcie zapytania - wynik dotyczy starej konfiguracji
+            return 0
+        _watermark = new_watermark
+        _change_polls += 1
+        _changed_rows += len(rows)
+    if watermark is None:
+        # pierwszy odczyt: nie wiadomo, co zmieniło się wcześniej
+        purge()
+    elif rows:
+        logger.info(f"Zmiany w tabeli stock: {len(rows)} produktów, unieważniam cache")
+        purge(row[0] for row in rows)
+    return len(rows)
+
+
+def max_data_age() -> float:
+    """
+    Jak długo stan/cena produktu może być nieaktualny bez powiadomienia
+    słuchaczy: bez kolumny zmian wiersz wygasa po TTL cache po cichu, więc
+    zależne cache nie powinny go przetrzymać dłużej.
+    """
+    return math.inf if _change_column else _cache.ttl_seconds
+
+
+def stock_cache_stats() -> dict[str, float]:
+    return _cache.stats() | {"change_polls": _change_polls, "changed_rows": _changed_rows}
+
+
+get_metrics().register_stats(
+    "hurtbot_stock_cache",
+    "Cache stanów i cen: trafienia, chybienia, wpisy wygasłe i unieważnione, "
+    "rozmiar i średni wiek trafień w sekundach (nieaktualność).",
+    stock_cache_stats,
+    counters=(
+        "hits",
+        "misses",
+        "expired",
+        "evictions",
+        "invalidations",
+        "change_polls",
+        "changed_rows",
+    ),
+)
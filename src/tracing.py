@@ -0,0 +1,369 @@
+"""
+Śledzenie etapów zapytania i metryki.
+
+Każde wywołanie zewnętrzne (LLM, wyszukiwarka, SQL, wyszukiwanie w internecie)
+jest mierzone jako span. Spany trafiają do eksporterów - domyślnie do rejestru
+metryk eksportowanego w formacie tekstowym Prometheusa, w testach można go
+zastąpić InMemoryCollector. Identyfikator żądania (correlation ID) jest
+trzymany w contextvar, więc trafia do spanów i logów także z korutyn i wątków
+uruchomionych przez asyncio.to_thread.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "[%(asctime)s] [%(levelname)s] [%(request_id)s] %(message)s"
+
+# granice kubełków histogramu czasu etapów, w sekundach
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class Span:
+    name: str
+    request_id: str | None
+    duration: float = 0.0
+    error: str | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RequestTrace:
+    request_id: str
+    spans: list[Span] = field(default_factory=list)
+
+    def breakdown(self) -> dict[str, tuple[int, float]]:
+        """
+        etap -> (liczba wywołań, łączny czas w ms)
+        """
+        totals: dict[str, tuple[int, float]] = {}
+        for span in self.spans:
+            count, total = totals.get(span.name, (0, 0.0))
+            totals[span.name] = (count + 1, total + span.duration * 1000)
+        return totals
+
+    def server_timing(self) -> str:
+        """
+        nagłówek Server-Timing: llm;dur=812.4;desc="2x", search.products;dur=...
+        """
+        return ", ".join(
+            f'{name};dur={total:.1f};desc="{count}x"'
+            for name, (count, total) in self.breakdown().items()
+        )
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemoryCollector:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def names(self) -> list[str]:
+        return [span.name for span in self.spans]
+
+
+def _sample(metric: str, labels: dict[str, Any], value: float) -> str:
+    escaped = (
+        str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for v in labels.values()
+    )
+    rendered = ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped, strict=True))
+    return f"{metric}{{{rendered}}} {value}"
+
+
+class MetricsRegistry:
+    """
+    Liczniki wywołań, histogram czasów i liczniki tokenów LLM dla każdego etapu
+    oraz metryki zarejestrowane przez inne moduły (register_counter/register_stats).
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DURATION_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._calls: dict[tuple[str, str], int] = defaultdict(int)
+        self._bucket_counts: dict[str, list[int]] = {}
+        self._duration_sum: dict[str, float] = defaultdict(float)
+        self._tokens: dict[tuple[str, str], int] = defaultdict(int)
+        self._counters: dict[str, tuple[str, str, str, Callable[[], dict[str, float]]]] = {}
+
+    def register_counter(
+        self,
+        metric: str,
+        help_text: str,
+        label: str,
+        read: Callable[[], dict[str, float]],
+        kind: str = "counter",
+    ) -> None:
+        """
+        Metryka odczytywana przy każdym renderowaniu: read() zwraca
+        {wartość etykiety: liczba}; kind - "counter" albo "gauge".
+        """
+        with self._lock:
+            self._counters[metric] = (kind, help_text, label, read)
+
+    def register_stats(
+        self,
+        metric: str,
+        help_text: str,
+        read: Callable[[], dict[str, float]],
+        counters: tuple[str, ...],
+    ) -> None:
+        """
+        Słownik stats() cache: klucze z `counters` jako {metric}_total{event=...},
+        pozostałe (rozmiar, trafialność, wiek) jako gauge {metric}{stat=...}.
+        """
+        self.register_counter(
+            f"{metric}_total",
+            help_text,
+            "event",
+            lambda: {k: v for k, v in read().items() if k in counters},
+        )
+        self.register_counter(
+            metric,
+            help_text,
+            "stat",
+            lambda: {k: v for k, v in read().items() if k not in counters},
+            kind="gauge",
+        )
+
+    def export(self, span: Span) -> None:
+        status = "error" if span.error else "ok"
+        with self._lock:
+            self._calls[span.name, status] += 1
+            counts = self._bucket_counts.setdefault(span.name, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    counts[i] += 1
+            self._duration_sum[span.name] += span.duration
+            for kind in ("prompt", "completion"):
+                self._tokens[span.name, kind] += span.attributes.get(f"{kind}_tokens") or 0
+
+    def render_prometheus(self) -> str:
+        """
+        metryki w formacie tekstowym Prometheusa (text/plain; version=0.0.4)
+        """
+        calls = "hurtbot_stage_calls_total"
+        duration = "hurtbot_stage_duration_seconds"
+        tokens = "hurtbot_llm_tokens_total"
+        lines = [
+            f"# HELP {calls} Wywołania etapów zapytania.",
+            f"# TYPE {calls} counter",
+        ]
+        with self._lock:
+            for (stage, status), count in sorted(self._calls.items()):
+                lines.append(_sample(calls, {"stage": stage, "status": status}, count))
+            lines += [
+                f"# HELP {duration} Czas etapów zapytania.",
+                f"# TYPE {duration} histogram",
+            ]
+            for stage, counts in sorted(self._bucket_counts.items()):
+                for bound, count in zip(self.buckets, counts, strict=True):
+                    lines.append(
+                        _sample(f"{duration}_bucket", {"stage": stage, "le": bound}, count)
+                    )
+                total = sum(n for (name, _), n in self._calls.items() if name == stage)
+                lines += [
+                    _sample(f"{duration}_bucket", {"stage": stage, "le": "+Inf"}, total),
+                    _sample(
+                        f"{duration}_sum",
+                        {"stage": stage},
+                        round(self._duration_sum[stage], 6),
+                    ),
+                    _sample(f"{duration}_count", {"stage": stage}, total),
+                ]
+            lines += [
+                f"# HELP {tokens} Tokeny promptu i odpowiedzi LLM.",
+                f"# TYPE {tokens} counter",
+            ]
+            for (stage, kind), count in sorted(self._tokens.items()):
+                if count:
+                    lines.append(_sample(tokens, {"stage": stage, "type": kind}, count))
+            counters = dict(self._counters)
+        # read() bierze własne blokady - poza blokadą rejestru
+        for metric, (kind, help_text, label, read) in sorted(counters.items()):
+            try:
+                values = read()
+            except Exception as e:
+                logger.warning(f"Błąd odczytu metryki {metric}: {e}")
+                continue
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [_sample(metric, {label: key}, value) for key, value in values.items()]
+        return "\n".join(lines) + "\n"
+
+
+_metrics = MetricsRegistry()
+_exporters: list[SpanExporter] = [_metrics]
+
+_current_trace: ContextVar[RequestTrace | None] = ContextVar("current_trace", default=None)
+
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
+
+
+def configure_exporters(*exporters: SpanExporter) -> None:
+    """
+    Zastępuje eksportery spanów (bez argumentów - domyślny rejestr metryk).
+    """
+    global _exporters  # noqa: PLW0603
+    _exporters = list(exporters) or [_metrics]
+
+
+def current_request_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def record_span(span: Span) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append(span)
+    for exporter in _exporters:
+        try:
+            exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Błąd eksportu spanu {span.name}: {e}")
+
+
+@contextmanager
+def start_request(request_id: str | None = None) -> Iterator[RequestTrace]:
+    """
+    Kontekst jednego żądania: correlation ID (podany przez klienta albo nowy)
+    i lista spanów do rozbicia czasu odpowiedzi.
+    """
+    trace = RequestTrace(request_id or uuid.uuid4().hex)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # generator strumienia zamknięty z innego kontekstu (rozłączony klient)
+            _current_trace.set(None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+    """
+    Mierzy blok kodu; zwracany słownik atrybutów można uzupełniać w trakcie.
+    Wyjątek jest zapisywany w spanie i zgłaszany dalej.
+    """
+    record = Span(name, current_request_id(), attributes=attributes)
+    start = time.perf_counter()
+    try:
+        yield record.attributes
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.duration = time.perf_counter() - start
+        record_span(record)
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                prompt += metadata.get("input_tokens", 0)
+                completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Spany wywołań LLM (z liczbą tokenów) zbierane z callbacków LangChain -
+    obejmują wszystkie łańcuchy używające modelu z tym handlerem.
+    """
+
+    # wywołania w tym samym kontekście co kod zapytania (correlation ID)
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._started: dict[UUID, tuple[Span, float]] = {}
+
+    def _start(self, run_id: UUID, name: str, **attributes: Any) -> None:
+        self._started[run_id] = (
+            Span(name, current_request_id(), attributes=attributes),
+            time.perf_counter(),
+        )
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> Span | None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        record, start = started
+        record.duration = time.perf_counter() - start
+        if error is not None:
+            record.error = type(error).__name__
+        return record
+
+    def on_chat_model_start(
+        self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_start(
+        self, serialized: dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        record = self._end(run_id)
+        if record is not None:
+            prompt, completion = _token_usage(response)
+            record.attributes.update(prompt_tokens=prompt, completion_tokens=completion)
+            record_span(record)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if (record := self._end(run_id, error)) is not None:
+            record_span(record)
+
+
+_callback_handler = TracingCallbackHandler()
+
+
+def get_callback_handler() -> TracingCallbackHandler:
+    return _callback_handler
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    dodaje request_id do każdego wpisu logu ('-' poza żądaniem)
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    logging.basicConfig(level=level, format=LOG_FORMAT, force=True)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestIdFilter())
@@ -0,0 +1,46 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag, stock
+
+
+@pytest.fixture(autouse=True)
+def no_semantic_cache(monkeypatch):
+    """
+    Bez współdzielonego cache odpowiedzi: prawdziwy singleton tworzy klienta
+    embeddingów Azure, wątek odpytujący wyszukiwarkę i globalnego słuchacza
+    zmian w stock. Testy cache podstawiają własny SemanticCache.
+    """
+    monkeypatch.setattr(ask_rag, "get_semantic_cache", lambda: None)
+
+
+@pytest.fixture
+def sqlite_stock(tmp_path):
+    db_path = tmp_path / "stock.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE stock (product_id TEXT PRIMARY KEY, quantity INT, price REAL, "
+        "updated_at INT DEFAULT 0)"
+    )
+    conn.executemany(
+        "INSERT INTO stock (product_id, quantity, price) VALUES (?, ?, ?)",
+        [("PROD_001", 12, 207.0), ("PROD_002", 0, 263.0), ("PROD_003", 5, 262.0)],
+    )
+    conn.commit()
+    conn.close()
+
+    connections = []
+
+    def connect():
+        connections.append(sqlite3.connect(db_path, check_same_thread=False))
+        return connections[-1]
+
+    stock.configure(connect, max_size=2)
+    yield db_path, connections
+    stock.configure(stock.connect_sql)
+    stock.configure_cache(max_size=2000, ttl_seconds=60)
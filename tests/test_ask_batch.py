@@ -0,0 +1,108 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag, calc_materials
+from src.ask_batch import BatchError, aask_batch, parse_questions
+
+
+def test_parse_questions_validation():
+    with pytest.raises(BatchError):
+        parse_questions({"questions": []})
+    with pytest.raises(BatchError):
+        parse_questions({"questions": ["Ile kosztuje cement?", "  "]})
+    with pytest.raises(BatchError):
+        parse_questions(["Ile kosztuje cement?"])
+    assert parse_questions({"questions": [" Jaki jest czas dostawy? "]}) == [
+        "Jaki jest czas dostawy?"
+    ]
+
+
+def test_batch_deduplicates_limits_concurrency_and_isolates_failures():
+    calls = []
+    running = 0
+    peak = 0
+
+    async def answer(question):
+        nonlocal running, peak
+        calls.append(question)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if "zwrot" in question:
+            raise RuntimeError("LLM niedostępny")
+        return f"odpowiedź: {question}"
+
+    questions = [
+        "Ile kosztuje cement?",
+        "Jak zrobić zwrot?",
+        "ile kosztuje  CEMENT?",
+        "Jaki jest czas dostawy?",
+        "Czy jest farba biała?",
+    ]
+    batch = asyncio.run(aask_batch(questions, max_concurrency=2, answer=answer))
+
+    assert len(calls) == 4
+    assert peak == 2
+    assert [r["question"] for r in batch["results"]] == questions
+    assert [r["status"] for r in batch["results"]] == ["ok", "error", "ok", "ok", "ok"]
+    assert batch["results"][2]["answer"] == "odpowiedź: Ile kosztuje cement?"
+    assert [r["duplicate"] for r in batch["results"]] == [False, False, True, False, False]
+    assert batch["results"][1]["error"] == "LLM niedostępny"
+    assert all(r["elapsed_ms"] >= 0 for r in batch["results"])
+    assert (batch["unique"], batch["failed"]) == (4, 1)
+
+
+def test_batch_item_timeout(monkeypatch):
+    monkeypatch.setenv("ASK_BATCH_ITEM_TIMEOUT", "0.05")
+
+    async def answer(question):
+        if question == "wolne":
+            await asyncio.sleep(1)
+        return "ok"
+
+    batch = asyncio.run(aask_batch(["wolne", "szybkie"], answer=answer))
+
+    assert [r["status"] for r in batch["results"]] == ["timeout", "ok"]
+
+
+def test_pipeline_failures_are_reported_as_errors(sqlite_stock, monkeypatch):
+    class StaticRetriever:
+        async def ainvoke(self, query):
+            return [Document(page_content="Farba akrylowa", metadata={"id": "PROD_001"})]
+
+    class FakeWebSearch:
+        async def ainvoke(self, query):
+            return "farba, grunt"
+
+    def failing_llm(prompt_value):
+        raise RuntimeError("LLM niedostępny")
+
+    async def query_type(question):
+        return (
+            calc_materials.MATERIALS_CALCULATION
+            if "altan" in question
+            else calc_materials.GENERAL
+        )
+
+    monkeypatch.setattr(ask_rag, "adetermine_query_type", query_type)
+    monkeypatch.setattr(ask_rag, "get_retriever", lambda index, top_k: StaticRetriever())
+    monkeypatch.setattr(calc_materials, "get_extraction_cache", lambda: None)
+    monkeypatch.setattr(calc_materials, "web_search_tool", FakeWebSearch)
+    for module in (ask_rag, calc_materials):
+        monkeypatch.setattr(module, "get_async_llm", lambda: RunnableLambda(failing_llm))
+
+    result = asyncio.run(
+        aask_batch(["Czy macie farby?", "Materiały na altanę ogrodową"], max_concurrency=2)
+    )
+
+    assert [r["status"] for r in result["results"]] == ["error", "error"]
+    assert result["failed"] == 2
+    assert all("LLM niedostępny" in r["error"] for r in result["results"])
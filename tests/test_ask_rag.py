@@ -1,11 +1,23 @@
+import asyncio
 import os
+import sys
+from pathlib import Path
 
 import pytest
 from deepeval import evaluate
 from deepeval.metrics import AnswerRelevancyMetric
 from deepeval.test_case import LLMTestCase
+from langchain_core.documents import Document
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import AzureChatOpenAI
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag as ask_rag_module
+from src.clients import PRODUCTS_INDEX, REGULAMIN_INDEX
+from src.semantic_cache import SemanticCache
+
 
 class AzureOpenAIModel:
     def __init__(self, model):
@@ -47,3 +59,142 @@ def test_ask_rag_relevancy_eval() -> None:
     assert results[0].score >= min_acceptable_score, (
         f"Odpowiedź była zbyt słabo związana z kontekstem (score={results[0].score})"
     )
+
+
+class BarrierRetriever:
+    def __init__(self, barrier: asyncio.Barrier, docs: list[Document]) -> None:
+        self.barrier = barrier
+        self.docs = docs
+
+    async def ainvoke(self, query: str) -> list[Document]:
+        await asyncio.wait_for(self.barrier.wait(), timeout=5)
+        return self.docs
+
+
+def test_handle_general_query_retrieves_concurrently(sqlite_stock, monkeypatch) -> None:
+    barrier = asyncio.Barrier(2)
+    retrievers = {
+        PRODUCTS_INDEX: BarrierRetriever(
+            barrier,
+            [
+                Document(
+                    page_content="Farba akrylowa biała matowa 10L",
+                    metadata={"id": "PROD_001", "name": "Farba akrylowa biała matowa 10L"},
+                )
+            ],
+        ),
+        REGULAMIN_INDEX: BarrierRetriever(
+            barrier, [Document(page_content="Zwrot w ciągu 14 dni", metadata={})]
+        ),
+    }
+    prompts = []
+
+    def fake_llm(prompt_value):
+        prompts.append(prompt_value.to_string())
+        return "Tak, posiadamy"
+
+    monkeypatch.setattr(
+        ask_rag_module, "get_retriever", lambda index, top_k: retrievers[index]
+    )
+    monkeypatch.setattr(ask_rag_module, "get_async_llm", lambda: RunnableLambda(fake_llm))
+
+    assert ask_rag_module.handle_general_query("Czy macie farby akrylowe?") == "Tak, posiadamy"
+    assert "Zwrot w ciągu 14 dni" in prompts[0]
+    assert "Ilość: 12, Cena: 207.0 zł" in prompts[0]
+
+
+def test_astream_general_query_yields_tokens(sqlite_stock, monkeypatch) -> None:
+    docs = [
+        Document(page_content="Farba akrylowa", metadata={"id": "PROD_001", "name": "Farba"})
+    ]
+
+    class StaticRetriever:
+        async def ainvoke(self, query: str) -> list[Document]:
+            return docs
+
+    monkeypatch.setattr(
+        ask_rag_module, "get_retriever", lambda index, top_k: StaticRetriever()
+    )
+    monkeypatch.setattr(
+        ask_rag_module,
+        "get_async_llm",
+        lambda: FakeListChatModel(responses=["Tak, posiadamy"]),
+    )
+
+    async def collect() -> list[str]:
+        return [token async for token in ask_rag_module.astream_general_query("farba?")]
+
+    tokens = asyncio.run(collect())
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Tak, posiadamy"
+
+
+def test_repeated_general_question_served_from_semantic_cache(
+    sqlite_stock, monkeypatch
+) -> None:
+    docs = [
+        Document(page_content="Farba akrylowa", metadata={"id": "PROD_001", "name": "Farba"})
+    ]
+    llm_calls = []
+
+    class StaticRetriever:
+        async def ainvoke(self, query: str) -> list[Document]:
+            return docs
+
+    class FakeEmbeddings:
+        async def aembed_query(self, text: str) -> list[float]:
+            return [1.0, 0.0] if "farb" in text.lower() else [0.0, 1.0]
+
+    def fake_llm(prompt_value):
+        llm_calls.append(prompt_value)
+        return "Tak, posiadamy"
+
+    cache = SemanticCache(index_version=lambda: "v1")
+    monkeypatch.setattr(
+        ask_rag_module, "get_retriever", lambda index, top_k: StaticRetriever()
+    )
+    monkeypatch.setattr(ask_rag_module, "get_async_llm", lambda: RunnableLambda(fake_llm))
+    monkeypatch.setattr(ask_rag_module, "get_async_embeddings", FakeEmbeddings)
+    monkeypatch.setattr(ask_rag_module, "get_semantic_cache", lambda: cache)
+
+    assert ask_rag_module.handle_general_query("Czy macie farby?") == "Tak, posiadamy"
+    assert ask_rag_module.handle_general_query("Macie farby akrylowe?") == "Tak, posiadamy"
+    assert len(llm_calls) == 1
+
+    cache.invalidate_products(["PROD_001"])
+    ask_rag_module.handle_general_query("Czy macie farby?")
+    assert len(llm_calls) == 2
+
+
+def test_cached_answer_invalidated_even_when_product_left_out_of_context(
+    sqlite_stock, monkeypatch
+) -> None:
+    docs = [
+        Document(page_content="Farba akrylowa", metadata={"id": "PROD_001", "name": "Farba"})
+    ]
+
+    class StaticRetriever:
+        async def ainvoke(self, query: str) -> list[Document]:
+            return [
+                Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs
+            ]
+
+    class FakeEmbeddings:
+        async def aembed_query(self, text: str) -> list[float]:
+            return [1.0, 0.0]
+
+    cache = SemanticCache(index_version=lambda: "v1")
+    # budżet mieści tylko notatkę SQL - dokument produktu nie trafia do promptu
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "1")
+    monkeypatch.setattr(
+        ask_rag_module, "get_retriever", lambda index, top_k: StaticRetriever()
+    )
+    monkeypatch.setattr(
+        ask_rag_module, "get_async_llm", lambda: RunnableLambda(lambda p: "Tak")
+    )
+    monkeypatch.setattr(ask_rag_module, "get_async_embeddings", FakeEmbeddings)
+    monkeypatch.setattr(ask_rag_module, "get_semantic_cache", lambda: cache)
+
+    ask_rag_module.handle_general_query("Czy macie farby?")
+
+    assert cache.invalidate_products(["PROD_001"]) == 1
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.batch_embedding import BatchSettings, EmbeddingProgress, embed_with_retry
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self) -> None:
+        super().__init__("Too Many Requests")
+        self.response = SimpleNamespace(headers={"retry-after": "2"})
+
+
+def fake_vector(text: str) -> list[float]:
+    return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+
+def embed_batch(embed, texts, settings=None, **kwargs):
+    progress = EmbeddingProgress(len(texts))
+    vectors = embed_with_retry(embed, texts, settings or BatchSettings(), progress, **kwargs)
+    return vectors, progress
+
+
+def test_rate_limit_is_retried_with_backoff():
+    failures = [RateLimitError(), RateLimitError()]
+    delays = []
+
+    def embed(batch):
+        if failures:
+            raise failures.pop()
+        return [fake_vector(t) for t in batch]
+
+    vectors, progress = embed_batch(
+        embed, ["a", "b"], BatchSettings(base_delay=1.0), sleep=delays.append
+    )
+
+    assert vectors == [fake_vector("a"), fake_vector("b")]
+    assert len(delays) == 2
+    assert all(d >= 2 for d in delays)
+    assert (progress.done, progress.retries) == (2, 2)
+
+
+def test_other_errors_are_not_retried():
+    def embed(batch):
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        embed_batch(embed, ["a"], sleep=lambda s: None)
+
+
+def test_retries_are_limited():
+    def embed(batch):
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        embed_batch(embed, ["a"], BatchSettings(max_retries=2), sleep=lambda s: None)
+
+
+class InternalServerError(Exception):
+    status_code = 503
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def test_server_and_connection_errors_are_retried():
+    failures = [InternalServerError(), APIConnectionError(), TimeoutError()]
+    delays = []
+
+    def embed(batch):
+        if failures:
+            raise failures.pop()
+        return [fake_vector(t) for t in batch]
+
+    vectors, _ = embed_batch(embed, ["a"], BatchSettings(base_delay=0.5), sleep=delays.append)
+
+    assert vectors == [fake_vector("a")]
+    assert len(delays) == 3
+    assert delays[0] < delays[2]
@@ -0,0 +1,49 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.fakes import FakeLatency, fake_services
+from benchmarks.run_benchmarks import compare, run_suite
+
+STAGES = [
+    "classification",
+    "retrieval",
+    "sql_enrichment",
+    "web_search",
+    "extraction",
+    "formatting",
+    "context_assembly",
+    "generation",
+    "end_to_end_general",
+    "end_to_end_materials",
+]
+
+
+def test_suite_runs_every_stage_on_fakes(tmp_path):
+    with fake_services(tmp_path, FakeLatency(llm=0, web_search=0)) as llm:
+        results = asyncio.run(run_suite(iterations=3, alloc_iterations=1))
+
+    assert list(results) == STAGES
+    assert llm.calls > 0
+    for result in results.values():
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+        assert result["alloc_peak_kb"] >= 0
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {
+        "retrieval": {"p95_ms": 4.0, "alloc_peak_kb": 100.0},
+        "generation": {"p95_ms": 10.0, "alloc_peak_kb": 30.0},
+    }
+    results = {
+        "retrieval": {"p95_ms": 4.9, "alloc_peak_kb": 200.0},
+        "generation": {"p95_ms": 14.0, "alloc_peak_kb": 40.0},
+        "formatting": {"p95_ms": 1.0, "alloc_peak_kb": 1.0},
+    }
+
+    assert compare(results, baseline, tolerance=0.25) == [
+        "retrieval: alokacje 100.0 -> 200.0 KB",
+        "generation: p95 10.0 -> 14.0 ms",
+    ]
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry_counts_as_stale_miss():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl_seconds=5, clock=clock)
+    cache.set("a", None)
+    assert cache.get_many(["a"]) == {"a": None}
+    clock.now = 6
+    assert cache.get("a", "missing") == "missing"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["expired"] == 1
+    assert stats["misses"] == 1
+
+
+def test_invalidate_selected_and_all():
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    cache.set_many({"a": 1, "b": 2, "c": 3})
+    assert cache.invalidate(["a", "x"]) == 1
+    assert cache.invalidate() == 2
+    assert cache.stats()["size"] == 0
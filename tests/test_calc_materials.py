@@ -0,0 +1,93 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import calc_materials
+
+
+class FakeRetriever:
+    def __init__(self, parties: int) -> None:
+        self.barrier = asyncio.Barrier(parties)
+
+    async def ainvoke(self, material: str) -> list[Document]:
+        # przejdzie tylko, gdy wszystkie wyszukiwania trwają jednocześnie
+        await asyncio.wait_for(self.barrier.wait(), timeout=5)
+        if material == "zepsuty":
+            raise RuntimeError("search unavailable")
+        product_id = {"farba": "PROD_001", "grunt": "PROD_002"}[material]
+        return [Document(page_content=f"{material} produkt", metadata={"id": product_id})]
+
+
+def test_find_products_runs_searches_concurrently(sqlite_stock, monkeypatch):
+    retriever = FakeRetriever(parties=3)
+    monkeypatch.setattr(calc_materials, "get_retriever", lambda *args: retriever)
+
+    products = calc_materials.find_products_in_database(["farba", "grunt", "zepsuty"])
+
+    by_term = {p["search_term"]: p for p in products}
+    assert set(by_term) == {"farba", "grunt"}
+    assert by_term["farba"]["current_quantity"] == 12
+    assert by_term["farba"]["current_price"] == 207.0
+    assert by_term["grunt"]["current_quantity"] == 0
+
+
+def test_find_products_respects_concurrency_limit(sqlite_stock, monkeypatch):
+    active = 0
+    peak = 0
+
+    class CountingRetriever:
+        async def ainvoke(self, material: str) -> list[Document]:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return []
+
+    monkeypatch.setattr(calc_materials, "get_retriever", lambda *args: CountingRetriever())
+
+    materials = [f"materiał {i}" for i in range(10)]
+    assert calc_materials.find_products_in_database(materials, max_concurrency=3) == []
+    assert peak == 3
+
+
+def test_format_material_section_ranks_products_found_for_material():
+    def product(name, term, quantity, price, rank):
+        metadata = {"id": name, "name": name}
+        return {
+            "content": name,
+            "metadata": metadata,
+            "search_term": term,
+            "rank": rank,
+            "tokens": frozenset(calc_materials.stem_tokens(name)),
+            "current_quantity": quantity,
+            "current_price": price,
+        }
+
+    products = [
+        product("Zaprawa klejąca C2TE", "Klej do płytek", 4, 60.0, 0),
+        product("Klej do płytek C1 drogi", "Klej do płytek", 9, 45.0, 1),
+        product("Klej do płytek C1", "Klej do płytek", 9, 30.0, 2),
+        product("Klej do płytek wyprzedany", "Klej do płytek", 0, 10.0, 3),
+        product("Fuga szara", "Fuga", 3, 20.0, 0),
+    ]
+    materials = [{"name": "Klej do płytek", "quantity": 180, "unit": "kg"}]
+
+    section = calc_materials.format_material_section(materials, products, "PODSTAWOWE:")
+
+    lines = [line.strip() for line in section.splitlines() if line.startswith("    - ")]
+    assert lines == [
+        "- Klej do płytek C1: 30.0 zł (✅ Dostępny, 9 szt.)",
+        "- Klej do płytek C1 drogi: 45.0 zł (✅ Dostępny, 9 szt.)",
+    ]
+    assert "Fuga" not in section
+
+    # produkt znaleziony dla materiału, ale bez jego nazwy w treści, nie znika
+    no_exact_name = calc_materials.format_material_section(
+        materials, products[:1], "PODSTAWOWE:"
+    )
+    assert "Zaprawa klejąca C2TE" in no_exact_name
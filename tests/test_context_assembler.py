@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.clients import PRODUCTS_INDEX
+from src.context_assembler import assemble_context, deduplicate, estimate_tokens
+
+RETURNS = (
+    "Zwrot towaru jest możliwy w ciągu 14 dni od dnia dostawy. Towar musi być "
+    "nieuszkodzony i w oryginalnym opakowaniu."
+)
+# ten sam fragment z zakładką (kolejny chunk z RecursiveCharacterTextSplitter)
+RETURNS_OVERLAP = RETURNS + " Koszt odesłania towaru ponosi kupujący."
+DELIVERY = "Dostawa trwa 2-3 dni robocze, zamówienia powyżej 1000 PLN dostarczamy gratis."
+PAINT = "Farba akrylowa biała matowa 10L, wydajność 10 m2 z litra."
+SQL_NOTE = "Produkt 'Farba akrylowa biała matowa 10L': Ilość: 12, Cena: 207.0 zł"
+
+
+def doc(text: str, **metadata: str) -> Document:
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_overlapping_chunks_are_deduplicated():
+    docs = [doc(RETURNS_OVERLAP, id="R2"), doc(RETURNS, id="R1"), doc(DELIVERY, id="R3")]
+
+    kept, _ = deduplicate(docs, threshold=0.8)
+
+    assert [d.metadata["id"] for d in kept] == ["R2", "R3"]
+
+
+def test_relevant_passages_are_packed_first_within_budget():
+    docs = [
+        doc(PAINT, id="P1"),
+        doc(DELIVERY, id="R3"),
+        doc(RETURNS, id="R1"),
+        doc(SQL_NOTE, source="sql", type="product_data"),
+    ]
+    sql_tokens = estimate_tokens(SQL_NOTE) + 1
+    returns_tokens = estimate_tokens(RETURNS) + 1
+
+    context = assemble_context(
+        "Ile dni mam na zwrot towaru?", docs, token_budget=sql_tokens + returns_tokens
+    )
+
+    assert context.docs[0].metadata["source"] == "sql"
+    assert [d.metadata.get("id") for d in context.docs[1:]] == ["R1"]
+    assert context.over_budget == 2
+    assert context.tokens_after == sql_tokens + returns_tokens
+    assert context.tokens_saved == context.tokens_before - context.tokens_after > 0
+
+
+def test_zero_budget_keeps_all_unique_docs():
+    docs = [doc(PAINT, id="P1"), doc(PAINT, id="P1-copy"), doc(DELIVERY, id="R3")]
+
+    context = assemble_context("farba akrylowa", docs, token_budget=0)
+
+    assert [d.metadata["id"] for d in context.docs] == ["P1", "R3"]
+    assert context.duplicates == 1
+
+
+def test_similar_products_with_different_ids_are_kept():
+    docs = [
+        doc("Farba akrylowa krem 5L Farba akrylowa w kolorze kremowym", id="PROD_004"),
+        doc("Farba akrylowa szara 10L Farba akrylowa w kolorze szarym", id="PROD_011"),
+        doc("Farba akrylowa krem 5L Farba akrylowa w kolorze kremowym", id="PROD_004"),
+    ]
+    for d in docs:
+        d.metadata["index"] = PRODUCTS_INDEX
+
+    kept, _ = deduplicate(docs, threshold=0.5)
+
+    assert [d.metadata["id"] for d in kept] == ["PROD_004", "PROD_011"]
@@ -0,0 +1,142 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import embedding_cache
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 0.5, -1.25] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_vectors_are_reused_between_processes(tmp_path):
+    first = EmbeddingCache(tmp_path)
+    first.put_many("emb", ["farba", "grunt"], [[1.0, 2.0], [3.0, 4.0]])
+
+    second = EmbeddingCache(tmp_path)
+    vectors = second.get_many("emb", ["grunt", "cement", "farba"])
+
+    assert vectors[0].tolist() == [3.0, 4.0]
+    assert vectors[1] is None
+    assert vectors[2].tolist() == [1.0, 2.0]
+    assert isinstance(vectors[0].base, np.memmap)
+    assert second.get_many("inny-model", ["farba"]) == [None]
+
+
+def test_put_skips_existing_and_checks_dimension(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    cache.put_many("emb", ["farba"], [[1.0, 2.0]])
+    cache.put_many("emb", ["farba", "farba", "grunt"], [[9.0, 9.0], [9.0, 9.0], [3.0, 4.0]])
+
+    assert cache.get_many("emb", ["farba"])[0].tolist() == [1.0, 2.0]
+    assert cache.inspect()[0]["entries"] == 2
+    assert cache.inspect()[0]["dead_rows"] == 0
+    with pytest.raises(ValueError):
+        cache.put_many("emb", ["cement"], [[1.0, 2.0, 3.0]])
+
+
+def test_prune_and_compact(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    cache.put_many("emb", ["a", "b", "c"], [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]])
+    cache.put_many("stary", ["a"], [[1.0]])
+
+    assert cache.prune(model="stary") == 1
+    cache.prune(older_than_days=-1, model="emb")
+    cache.put_many("emb", ["c"], [[3.0, 3.0]])
+    assert cache.inspect()[0]["dead_rows"] == 3
+
+    assert cache.compact(dtype="float16") > 0
+    report = cache.inspect()
+    assert [r["model"] for r in report] == ["emb"]
+    assert report[0]["dead_rows"] == 0
+    assert report[0]["dtype"] == "float16"
+    assert EmbeddingCache(tmp_path).get_many("emb", ["c"])[0].tolist() == [3.0, 3.0]
+
+
+def test_cached_embeddings_call_model_only_for_missing_texts(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(tmp_path), "emb")
+
+    first = embeddings.embed_documents(["farba", "grunt", "farba"])
+    second = embeddings.embed_documents(["grunt", "cement"])
+    query = asyncio.run(embeddings.aembed_query("farba"))
+
+    assert model.calls == [["farba", "grunt"], ["cement"]]
+    assert first == [[5.0, 0.5, -1.25], [5.0, 0.5, -1.25], [5.0, 0.5, -1.25]]
+    assert second[1] == [6.0, 0.5, -1.25]
+    assert query == [5.0, 0.5, -1.25]
+    assert embeddings.cache.stats()["hits"] == 2
+
+
+def test_cache_errors_fall_back_to_model(tmp_path):
+    model = CountingEmbeddings()
+    cache = EmbeddingCache(tmp_path)
+    embeddings = CachedEmbeddings(model, cache, "emb")
+    embeddings.embed_documents(["farba"])
+    (tmp_path / next(p.name for p in tmp_path.glob("*.float32"))).unlink()
+
+    assert embeddings.embed_documents(["farba"]) == [[5.0, 0.5, -1.25]]
+    assert len(model.calls) == 2
+
+
+def test_query_embeddings_are_written_in_background_batches(tmp_path):
+    model = CountingEmbeddings()
+    cache = EmbeddingCache(tmp_path)
+    embeddings = CachedEmbeddings(model, cache, "emb", flush_seconds=60, flush_batch=2)
+
+    assert embeddings.embed_query("cement") == [6.0, 0.5, -1.25]
+    # jeszcze nie na dysku, ale kolejne pytanie nie woła modelu
+    assert cache.get_many("emb", ["cement"]) == [None]
+    assert asyncio.run(embeddings.aembed_query("cement")) == [6.0, 0.5, -1.25]
+    assert model.calls == [["cement"]]
+
+    embeddings.embed_query("grunt")
+    for _ in range(100):
+        if cache.get_many("emb", ["cement", "grunt"])[1] is not None:
+            break
+        time.sleep(0.05)
+    assert [v.tolist() for v in cache.get_many("emb", ["cement", "grunt"])] == [
+        [6.0, 0.5, -1.25],
+        [5.0, 0.5, -1.25],
+    ]
+
+
+def test_max_entries_evicts_least_recently_used_and_compacts(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_entries=2)
+    for i, text in enumerate(["a", "b", "c"]):
+        cache.put_many("emb", [text], [[float(i), 0.0]])
+
+    assert cache.get_many("emb", ["a"]) == [None]
+    assert cache.inspect()[0]["entries"] == 2
+    assert cache.inspect()[0]["dead_rows"] == 1
+
+    cache.put_many("emb", ["d", "e"], [[3.0, 0.0], [4.0, 0.0]])
+
+    report = cache.inspect()[0]
+    assert report["entries"] == 2
+    assert report["dead_rows"] == 0
+    assert [v.tolist() for v in cache.get_many("emb", ["d", "e"])] == [[3.0, 0.0], [4.0, 0.0]]
+
+
+def test_works_without_fcntl(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "fcntl", None)
+    cache = EmbeddingCache(tmp_path)
+    cache.put_many("emb", ["farba"], [[1.0, 2.0]])
+
+    assert cache.get_many("emb", ["farba"])[0].tolist() == [1.0, 2.0]
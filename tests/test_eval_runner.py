@@ -0,0 +1,107 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from eval.runner import (
+    EvalRunner,
+    RateLimiter,
+    load_checkpoint,
+    parse_score,
+    percentile,
+    summarize,
+)
+
+ITEMS = [
+    {"id": 1, "question": "Czy macie farbę akrylową?", "expected_answer": "Tak"},
+    {"id": 2, "question": "Jaki jest czas dostawy?", "expected_answer": "3 dni"},
+    {"id": 3, "question": "Czy można zwrócić towar?", "expected_answer": "Tak, 14 dni"},
+]
+
+
+def make_runner(tmp_path, calls, delays=None):
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep((delays or {}).get(question, 0))
+        if "zwrócić" in question:
+            raise RuntimeError("timeout LLM")
+        return f"odpowiedź na: {question}"
+
+    async def judge(prompt):
+        return "Ocena: 0,8" if "3 dni" in prompt else "1.0"
+
+    return EvalRunner(
+        answer=answer, judge=judge, concurrency=3, checkpoint=tmp_path / "checkpoint.jsonl"
+    )
+
+
+def test_parse_score_and_percentile():
+    assert parse_score("0.75") == 0.75
+    assert parse_score("Ocena: 1,5") == 1.0
+    assert parse_score("brak") is None
+    assert percentile([30.0, 10.0, 20.0, 40.0], 50) == 20.0
+    assert percentile([30.0, 10.0, 20.0, 40.0], 95) == 40.0
+    assert percentile([], 50) is None
+
+
+def test_runner_keeps_order_records_latency_and_checkpoints(tmp_path):
+    calls = []
+    runner = make_runner(tmp_path, calls, delays={ITEMS[0]["question"]: 0.02})
+
+    records = asyncio.run(runner.run(ITEMS))
+
+    assert [r["key"] for r in records] == ["1", "2", "3"]
+    assert [r["status"] for r in records] == ["ok", "ok", "error"]
+    assert [r["score"] for r in records] == [1.0, 0.8, None]
+    assert records[0]["latency_ms"] >= 20
+    # błąd jest zapisany, ale nie liczy się jako wykonany
+    assert len(runner.checkpoint.read_text("utf-8").splitlines()) == 3
+    assert sorted(load_checkpoint(runner.checkpoint)) == ["1", "2"]
+    summary = summarize(records)
+    assert (summary["items"], summary["errors"], summary["mean_score"]) == (3, 1, 0.9)
+
+
+def test_runner_resumes_from_checkpoint(tmp_path):
+    first_calls = []
+    asyncio.run(make_runner(tmp_path, first_calls).run(ITEMS[:2]))
+    # przerwany zapis zostawia uciętą linię
+    with (tmp_path / "checkpoint.jsonl").open("a", encoding="utf-8") as f:
+        f.write('{"key": "3", "quest')
+
+    calls = []
+    records = asyncio.run(make_runner(tmp_path, calls).run(ITEMS))
+
+    assert calls == [ITEMS[2]["question"]]
+    assert [r["question"] for r in records] == [item["question"] for item in ITEMS]
+    lines = (tmp_path / "checkpoint.jsonl").read_text("utf-8").splitlines()
+    assert json.loads(lines[-1])["key"] == "3"
+
+
+def test_failed_questions_are_retried_on_resume(tmp_path):
+    asyncio.run(make_runner(tmp_path, []).run(ITEMS))
+
+    calls = []
+    records = asyncio.run(make_runner(tmp_path, calls).run(ITEMS))
+
+    assert calls == [ITEMS[2]["question"]]
+    assert [r["status"] for r in records] == ["ok", "ok", "error"]
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    clock = [0.0]
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    async def acquire_three():
+        limiter = RateLimiter(rate=10, clock=lambda: clock[0])
+        for _ in range(3):
+            await limiter.acquire()
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    asyncio.run(acquire_three())
+
+    assert sleeps == [0.1, 0.2]
@@ -0,0 +1,98 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import calc_materials
+from src.extraction_cache import ExtractionCache, job_key
+
+ANALYSIS = {
+    "basic_materials": [
+        {"name": "Płytki", "quantity": "11", "unit": "m²"},
+        {"name": "Klej", "quantity": "150-180", "unit": "kg"},
+    ],
+    "additional_materials": [{"name": "Fuga", "quantity": 2.5, "unit": "kg"}],
+}
+
+
+def test_job_key_ignores_area_and_phrasing():
+    assert job_key("Chcę wyremontować łazienkę 10m²") == job_key("remont łazienki 12 m2")
+    assert job_key("remont łazienki") != job_key("remont kuchni")
+
+
+def test_lookup_rescales_to_requested_area(tmp_path):
+    cache = ExtractionCache(path=tmp_path / "cache.sqlite")
+    cache.store("remont łazienki 10 m2", ANALYSIS)
+
+    rescaled = cache.lookup("Chcę wyremontować łazienkę 20m²")
+
+    assert rescaled["basic_materials"][0]["quantity"] == "22"
+    assert rescaled["basic_materials"][1]["quantity"] == "300-360"
+    assert rescaled["additional_materials"][0]["quantity"] == 5.0
+    assert cache.lookup("remont łazienki") is None
+    assert cache.lookup("remont kuchni 10 m2") is None
+
+
+def test_cache_shared_between_instances_and_expires(tmp_path):
+    now = [0.0]
+    path = tmp_path / "cache.sqlite"
+    ExtractionCache(path=path, clock=lambda: now[0]).store("remont łazienki 10 m2", ANALYSIS)
+
+    other_worker = ExtractionCache(path=path, ttl_seconds=60, clock=lambda: now[0])
+    assert other_worker.lookup("remont łazienki 10 m2") == ANALYSIS
+    now[0] = 61.0
+    assert other_worker.lookup("remont łazienki 10 m2") is None
+
+
+def test_second_area_skips_web_search_and_llm(tmp_path, monkeypatch):
+    calls = []
+
+    async def extract(query):
+        calls.append(query)
+        return ANALYSIS
+
+    cache = ExtractionCache(path=tmp_path / "cache.sqlite")
+    monkeypatch.setattr(calc_materials, "get_extraction_cache", lambda: cache)
+    monkeypatch.setattr(calc_materials, "aextract_materials", extract)
+
+    first = calc_materials.run_sync(calc_materials.aanalyze_materials("łazienka 10m²"))
+    second = calc_materials.run_sync(calc_materials.aanalyze_materials("łazienka 12m²"))
+
+    assert calls == ["łazienka 10m²"]
+    assert first == ANALYSIS
+    assert second["basic_materials"][0]["quantity"] == "14"
+
+
+def test_extra_keys_are_dropped_and_pack_sizes_kept(tmp_path):
+    cache = ExtractionCache(path=tmp_path / "cache.sqlite")
+    analysis = {
+        "basic_materials": [{"name": "Klej", "quantity": "2 worki po 25kg", "unit": "szt"}],
+        "additional_materials": [],
+        "notes": "sprawdź podłoże",
+    }
+    cache.store("remont łazienki 10 m2", analysis)
+
+    rescaled = cache.lookup("remont łazienki 20 m2")
+
+    assert rescaled == {
+        "basic_materials": [{"name": "Klej", "quantity": "4 worki po 25kg", "unit": "szt"}],
+        "additional_materials": [],
+    }
+
+
+def test_invalid_entries_are_cache_misses(tmp_path):
+    cache = ExtractionCache(path=tmp_path / "cache.sqlite")
+    cache.store("remont łazienki 10 m2", {"basic_materials": "płytki"})
+    assert cache.lookup("remont łazienki 10 m2") is None
+
+    conn = sqlite3.connect(tmp_path / "cache.sqlite")
+    with conn:
+        conn.execute(
+            "INSERT INTO extractions VALUES (?, 1, 10, ?, 0)",
+            (job_key("remont kuchni 10 m2"), '{"basic_materials": [1, 2]}'),
+        )
+    conn.close()
+    assert (
+        ExtractionCache(path=tmp_path / "cache.sqlite").lookup("remont kuchni 20 m2") is None
+    )
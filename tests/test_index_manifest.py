@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.index_manifest import (
+    chunk_id,
+    document_hash,
+    load_manifest,
+    plan_changes,
+    save_manifest,
+)
+
+
+def test_chunk_id_is_deterministic():
+    first = chunk_id("pdf", "REGULAMIN.pdf", "§1. Postanowienia ogólne")
+
+    assert first == chunk_id("pdf", "REGULAMIN.pdf", "§1. Postanowienia ogólne")
+    assert first != chunk_id("pdf", "REGULAMIN.pdf", "§2. Zamówienia")
+    assert first.startswith("pdf_")
+
+
+def test_document_hash_ignores_embedding():
+    doc = {"id": "PROD_001", "content": "Farba biała"}
+
+    assert document_hash(doc) == document_hash({**doc, "embedding": [0.1, 0.2]})
+    assert document_hash(doc) != document_hash({**doc, "content": "Farba czarna"})
+
+
+def test_plan_changes():
+    previous = {"PROD_001": "a", "PROD_002": "b", "PROD_003": "c"}
+    current = {"PROD_001": "a", "PROD_002": "changed", "PROD_004": "d"}
+
+    changed, deleted = plan_changes(previous, current)
+
+    assert changed == ["PROD_002", "PROD_004"]
+    assert deleted == ["PROD_003"]
+
+
+def test_manifest_roundtrip(tmp_path):
+    path = tmp_path / "manifest.json"
+    assert load_manifest(path) == {}
+
+    manifest = {"embedding_model": "emb", "products-index": {"PROD_001": "a"}}
+    save_manifest(manifest, path)
+
+    assert load_manifest(path) == manifest
@@ -0,0 +1,120 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.batch_embedding import BatchSettings
+from src.ingest_pipeline import IngestPipeline, PipelineSettings, iter_json_array
+
+PRODUCTS_PATH = Path(__file__).resolve().parents[1] / "data" / "products.json"
+
+
+def fake_embed(texts):
+    return [[float(len(t))] for t in texts]
+
+
+def make_docs(count):
+    return ({"id": f"PROD_{i:03d}", "content": "x" * (i % 7)} for i in range(count))
+
+
+def settings(**kwargs):
+    embedding = BatchSettings(batch_size=kwargs.pop("batch_size", 4), max_in_flight=2)
+    return PipelineSettings(embedding=embedding, upload_base_delay=0, **kwargs)
+
+
+def test_iter_json_array_matches_json_load():
+    expected = json.loads(PRODUCTS_PATH.read_text("utf-8"))
+
+    assert list(iter_json_array(PRODUCTS_PATH, read_size=7)) == expected
+
+
+def test_iter_json_array_handles_split_numbers(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('[ 12345, {"a": [1, 2]} , "x,]" ,6.75]', "utf-8")
+
+    assert list(iter_json_array(path, read_size=3)) == [12345, {"a": [1, 2]}, "x,]", 6.75]
+
+
+def test_iter_json_array_rejects_truncated_file(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('[{"a": 1}, {"b"', "utf-8")
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, read_size=4))
+
+
+def test_pipeline_uploads_everything_in_capped_chunks():
+    chunks = []
+    checkpoints = []
+    pipeline = IngestPipeline(
+        fake_embed,
+        chunks.append,
+        checkpoints.append,
+        settings(upload_max_docs=5, upload_max_bytes=120),
+    )
+
+    assert pipeline.run(make_docs(23)) == 23
+
+    uploaded = [doc for chunk in chunks for doc in chunk]
+    assert sorted(doc["id"] for doc in uploaded) == [f"PROD_{i:03d}" for i in range(23)]
+    assert all(doc["embedding"] == [float(len(doc["content"]))] for doc in uploaded)
+    assert all(len(chunk) <= 5 for chunk in chunks)
+    assert all(len(json.dumps(chunk[:-1])) <= 120 for chunk in chunks)
+    assert checkpoints == chunks
+
+
+def test_failed_upload_is_retried():
+    attempts = []
+
+    def upload(chunk):
+        attempts.append(len(chunk))
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+
+    pipeline = IngestPipeline(fake_embed, upload, settings=settings(), sleep=lambda s: None)
+
+    assert pipeline.run(make_docs(3)) == 3
+    assert attempts == [3, 3]
+
+
+def test_embedding_error_stops_pipeline():
+    def embed(texts):
+        raise ValueError("bad input")
+
+    uploaded = []
+    pipeline = IngestPipeline(embed, uploaded.append, settings=settings())
+
+    with pytest.raises(ValueError):
+        pipeline.run(make_docs(100))
+    assert uploaded == []
+
+
+def test_pipeline_memory_is_bounded():
+    release = threading.Event()
+    consumed = 0
+
+    def docs():
+        nonlocal consumed
+        for doc in make_docs(100):
+            consumed += 1
+            yield doc
+
+    def upload(chunk):
+        release.wait(timeout=5)
+
+    pipeline = IngestPipeline(
+        fake_embed, upload, settings=settings(batch_size=1, queue_size=1, upload_max_docs=1)
+    )
+    runner = threading.Thread(target=pipeline.run, args=(docs(),))
+    runner.start()
+    time.sleep(0.3)
+    # wysyłanie stoi, więc producent nie może uciec daleko do przodu
+    assert consumed < 10
+    release.set()
+    runner.join(timeout=10)
+    assert pipeline.uploaded == 100
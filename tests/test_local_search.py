@@ -0,0 +1,153 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag, clients
+from src.local_search import LocalProductIndex, LocalProductRetriever, get_local_index
+from src.nlp_utils import stem_tokens
+
+DOCS = [
+    {
+        "id": "P1",
+        "name": "Farba akrylowa biała",
+        "content": "Farba akrylowa biała 10L",
+        "category": "farby",
+    },
+    {
+        "id": "P2",
+        "name": "Grunt pod farby",
+        "content": "Grunt pod farby akrylowe",
+        "category": "chemia",
+    },
+    {
+        "id": "P3",
+        "name": "Klej do płytek C1",
+        "content": "Klej do płytek ceramicznych",
+        "category": "chemia",
+    },
+]
+
+
+def test_polish_inflection_matches():
+    assert stem_tokens("farbę") == stem_tokens("farby") == stem_tokens("Farba")
+
+    results = LocalProductIndex(DOCS).search("Czy macie farbę akrylową?", top_k=2)
+
+    assert [r["id"] for r in results] == ["P1", "P2"]
+    assert results[0]["@search.score"] > results[1]["@search.score"]
+
+
+def test_name_only_search_and_no_match():
+    index = LocalProductIndex(DOCS)
+
+    assert {r["id"] for r in index.search("farby", top_k=3, name_only=True)} == {"P1", "P2"}
+    assert index.search("wiertarka", top_k=3) == []
+
+
+def test_vectors_are_fused_with_bm25():
+    vectors = np.array([[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]], dtype=np.float32)
+    index = LocalProductIndex(DOCS, vectors)
+
+    # BM25 nie zna słowa 'zaprawa', produkt wskazuje podobieństwo wektorów
+    assert index.search("zaprawa", top_k=1, query_vector=[0.0, 1.0])[0]["id"] == "P2"
+    # trafienie w obu rankingach wygrywa
+    assert index.search("klej", top_k=1, query_vector=[0.6, 0.8])[0]["id"] == "P3"
+
+
+def test_alternatives_by_category():
+    alternatives = LocalProductIndex(DOCS).by_category("chemia", exclude_id="P2")
+
+    assert [a["id"] for a in alternatives] == ["P3"]
+
+
+def test_retriever_returns_documents_like_azure():
+    retriever = LocalProductRetriever(index=LocalProductIndex(DOCS), top_k=1)
+
+    docs = asyncio.run(retriever.ainvoke("klej do płytek"))
+
+    assert docs[0].page_content == "Klej do płytek ceramicznych"
+    assert docs[0].metadata["id"] == "P3"
+    assert "content" not in docs[0].metadata
+
+
+def test_local_backend_behind_existing_functions(monkeypatch):
+    monkeypatch.setenv("SEARCH_BACKEND", "local")
+    clients.get_retriever.cache_clear()
+    try:
+        retriever = clients.get_retriever(clients.PRODUCTS_INDEX, 3)
+        assert isinstance(retriever, LocalProductRetriever)
+        assert retriever.index is get_local_index()
+    finally:
+        clients.get_retriever.cache_clear()
+
+    match = ask_rag.find_best_product_match("cement portlandzki")
+    assert match["name"].startswith("Cement portlandzki")
+    assert ask_rag.find_alternatives_by_category("brak", exclude_id=match["id"], max_results=2)
+
+
+def test_warm_up_local_backend_skips_azure_products(monkeypatch):
+    counted = []
+    warmed = []
+
+    class FailingSearchClient:
+        def __init__(self, index_name):
+            self.index_name = index_name
+
+        def get_document_count(self):
+            counted.append(self.index_name)
+            raise ConnectionError("brak sieci")
+
+    def failing_llm():
+        raise ConnectionError("brak sieci")
+
+    monkeypatch.setenv("SEARCH_BACKEND", "local")
+    monkeypatch.setattr(clients, "get_llm", failing_llm)
+    monkeypatch.setattr(clients, "get_search_client", FailingSearchClient)
+    monkeypatch.setattr(clients, "get_local_index", lambda: warmed.append("local"))
+    monkeypatch.setattr(clients, "get_retriever", lambda index, top_k: warmed.append(index))
+
+    clients.warm_up()
+
+    assert counted == [clients.REGULAMIN_INDEX]
+    assert warmed == [
+        "local",
+        clients.PRODUCTS_INDEX,
+        clients.PRODUCTS_INDEX,
+        "regulamin-index",
+    ]
+
+
+def test_async_warm_up_runs_once_per_loop_on_that_loops_clients(monkeypatch):
+    created = []
+    counted = []
+
+    class FakeAsyncSearchClient:
+        def __init__(self, index_name):
+            self.index_name = index_name
+            created.append(index_name)
+
+        async def get_document_count(self):
+            counted.append((self.index_name, asyncio.get_running_loop()))
+            return 0
+
+    monkeypatch.setenv("SEARCH_BACKEND", "azure")
+    monkeypatch.setattr(clients, "_create_llm", object)
+    monkeypatch.setattr(clients, "_create_async_search_client", FakeAsyncSearchClient)
+
+    async def serve():
+        clients.schedule_async_warm_up()
+        clients.schedule_async_warm_up()
+        await asyncio.sleep(0.01)
+        # żądanie na tej pętli używa rozgrzanych klientów
+        clients.get_async_search_client(clients.PRODUCTS_INDEX)
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(serve())
+
+    assert sorted(created) == sorted([clients.PRODUCTS_INDEX, clients.REGULAMIN_INDEX])
+    assert {c[1] for c in counted} == {loop}
+    assert len(counted) == 2
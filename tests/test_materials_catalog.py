@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import calc_materials
+from src.materials_catalog import estimate_materials, load_catalog
+
+
+def by_name(materials):
+    return {m["name"]: m for m in materials}
+
+
+def test_estimate_scales_with_area():
+    estimate = estimate_materials("Remont łazienki 10 m2, jakie materiały?")
+
+    assert estimate["job"] == "remont łazienki"
+    assert estimate["area"] == 10
+    assert estimate["catalog_version"] == load_catalog()["version"]
+    basic = by_name(estimate["basic_materials"])
+    assert basic["Klej do płytek"]["quantity"] == 180
+    assert basic["Klej do płytek"]["unit"] == "kg"
+    assert basic["Płytka podłogowa"]["quantity"] == 11
+
+
+def test_estimate_without_area_gives_usage_per_m2():
+    estimate = estimate_materials("Co potrzebuję do remontu łazienki?")
+
+    assert estimate["area"] is None
+    glue = by_name(estimate["basic_materials"])["Klej do płytek"]
+    assert glue["quantity"] == 18
+    assert glue["unit"] == "kg/m²"
+
+
+def test_estimate_unknown_job():
+    assert estimate_materials("Ile kosztuje wiertarka udarowa?") is None
+
+
+def test_catalog_job_skips_web_search_and_llm(monkeypatch):
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("wyszukiwanie i LLM nie powinny być wołane")
+
+    async def no_products(materials_list, max_concurrency=None):
+        return []
+
+    monkeypatch.setattr(calc_materials, "aextract_materials", unexpected)
+    monkeypatch.setattr(calc_materials, "afind_products_in_database", no_products)
+
+    report = calc_materials.calculate_materials_cost("Remont łazienki 10 m2")
+
+    assert "katalog materiałów" in report
+    assert "Klej do płytek" in report
+
+
+def test_action_wins_over_room():
+    painting = "malowanie pomieszczenia"
+    assert estimate_materials("Chcę pomalować łazienkę 10m²")["job"] == painting
+    assert estimate_materials("Ile farby na kuchnię 12m2?")["job"] == painting
+    assert estimate_materials("Ocieplenie ścian łazienki")["job"] == "ocieplenie"
+
+
+def test_room_job_without_action_keyword():
+    assert estimate_materials("Remont kuchni 12m2")["job"] == "remont kuchni"
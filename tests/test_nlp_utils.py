@@ -3,7 +3,7 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from src.nlp_utils import classify_question
+from src.nlp_utils import classify_question, parse_area
 
 
 def test_classify_question_faq():
@@ -16,3 +16,13 @@ def test_classify_question_product():
 
 def test_classify_question_empty():
     assert classify_question("") == "nieznane"
+
+
+def test_parse_area():
+    assert parse_area("Chcę wyremontować łazienkę 10,5m²") == 10.5
+    assert parse_area("taras 20 metrów kwadratowych") == 20.0
+    assert parse_area("Pomalować pokój 10,5 m kw") == 10.5
+    assert parse_area("kuchnia 12 m. kw.") == 12.0
+    assert parse_area("garaż 18 mkw") == 18.0
+    assert parse_area("5 m kwiatów na rabacie") is None
+    assert parse_area("Czy macie cement?") is None
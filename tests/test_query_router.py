@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.query_router import (
+    GENERAL,
+    MATERIALS_CALCULATION,
+    QueryRouter,
+    get_router,
+    load_training_examples,
+)
+from src.tracing import get_metrics
+
+
+def make_router(threshold: float = 0.85) -> QueryRouter:
+    return QueryRouter(load_training_examples(), threshold=threshold)
+
+
+def test_classify_materials_with_area():
+    decision = make_router().classify("Chcę pomalować sypialnię 15 m2")
+    assert decision.label == MATERIALS_CALCULATION
+    assert decision.confidence > 0.9
+
+
+def test_classify_general_regulations():
+    decision = make_router().classify("Jak wygląda dostawa zamówień?")
+    assert decision.label == GENERAL
+    assert decision.confidence > 0.9
+
+
+def test_service_question_mentioning_materials_is_not_routed_to_calculation():
+    router = make_router()
+    calls = []
+
+    label = router.route(
+        "Jak długo trwa dostawa materiałów do budowy?", lambda q: calls.append(q) or GENERAL
+    )
+
+    assert label == GENERAL
+    decision = router.classify("Kiedy dostarczycie materiały na budowę domu?")
+    assert decision.label == GENERAL or decision.confidence < router.threshold
+
+
+def test_route_uses_local_tier_when_confident():
+    router = make_router()
+    calls = []
+    label = router.route("Materiały do budowy tarasu 15m²", lambda q: calls.append(q) or "x")
+    assert label == MATERIALS_CALCULATION
+    assert calls == []
+    assert router.stats()["local_hits"] == 1
+
+
+def test_route_falls_back_to_llm_below_threshold():
+    router = make_router(threshold=1.01)
+    label = router.route("Czy macie cement?", lambda q: MATERIALS_CALCULATION)
+    assert label == MATERIALS_CALCULATION
+    stats = router.stats()
+    assert stats["llm_fallbacks"] == 1
+    assert stats["hit_rate"] == 0.0
+
+
+def test_router_counters_in_prometheus_metrics():
+    get_router.cache_clear()
+    try:
+        assert "hurtbot_router_decisions_total{" not in get_metrics().render_prometheus()
+
+        get_router().route("Materiały do budowy tarasu 15m²", lambda q: GENERAL)
+        text = get_metrics().render_prometheus()
+
+        assert 'hurtbot_router_decisions_total{route="local"} 1' in text
+        assert 'hurtbot_router_decisions_total{route="llm"} 0' in text
+        assert 'hurtbot_router_seconds_total{route="local"}' in text
+    finally:
+        get_router.cache_clear()
@@ -0,0 +1,78 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import calc_materials
+from src.local_search import LocalProductIndex, LocalProductRetriever
+from src.quote import QuoteError, aquote, packs_needed, parse_items, parse_pack
+
+DOCS = [
+    {"id": "PROD_001", "name": "Farba akrylowa biała 10L", "content": "Farba akrylowa biała"},
+    {"id": "PROD_002", "name": "Farba akrylowa biała 5L", "content": "Farba akrylowa biała"},
+    {"id": "PROD_003", "name": "Cement portlandzki 25kg", "content": "Cement portlandzki"},
+]
+
+
+def test_parse_pack():
+    assert parse_pack("Klej do tapet 200g") == (0.2, "kg")
+    assert parse_pack("Farba akrylowa biała 2,5L") == (2.5, "l")
+    assert parse_pack("Płytka ścienna 25x40 biała") is None
+
+
+def test_packs_needed():
+    assert packs_needed(60, "kg", (25.0, "kg")) == 3
+    assert packs_needed(0.6, "l", (0.2, "l")) == 3
+    assert packs_needed(2, "szt", (25.0, "kg")) == 2
+    assert packs_needed(2, "l", (25.0, "kg")) == 2
+    assert packs_needed(4, None, None) == 4
+
+
+def test_parse_items_validation():
+    with pytest.raises(QuoteError):
+        parse_items({"items": []})
+    with pytest.raises(QuoteError):
+        parse_items({"items": [{"text": "cement", "quantity": -1}]})
+    with pytest.raises(QuoteError):
+        parse_items({"items": [{"text": "cement", "quantity": "dużo"}]})
+    assert parse_items({"items": [{"text": " cement "}]}) == [
+        {"text": "cement", "quantity": 1.0, "unit": None}
+    ]
+
+
+def test_quote_uses_one_stock_query_and_totals_lines(sqlite_stock, monkeypatch):
+    retriever = LocalProductRetriever(index=LocalProductIndex(DOCS), top_k=5)
+    monkeypatch.setattr(calc_materials, "get_retriever", lambda *args: retriever)
+    stock_queries = []
+    lookup = calc_materials.get_products_quantity_and_price
+
+    def counting_lookup(ids):
+        stock_queries.append(list(ids))
+        return lookup(stock_queries[-1])
+
+    monkeypatch.setattr(calc_materials, "get_products_quantity_and_price", counting_lookup)
+
+    quote = asyncio.run(
+        aquote(
+            {
+                "items": [
+                    {"text": "farba akrylowa biała", "quantity": 25, "unit": "l"},
+                    {"text": "wiertarka", "quantity": 1},
+                    {"text": "cement", "quantity": 60, "unit": "kg"},
+                ]
+            }
+        )
+    )
+
+    assert len(stock_queries) == 1
+    paint, drill, cement = quote["lines"]
+    # PROD_002 jest tańszy za litr, ale niedostępny
+    assert paint["product"]["id"] == "PROD_001"
+    assert (paint["packs"], paint["line_total"], paint["status"]) == (3, 621.0, "ok")
+    assert drill["status"] == "not_found"
+    assert (cement["packs"], cement["line_total"]) == (3, 786.0)
+    assert quote["total"] == 1407.0
+    assert quote["complete"] is False
@@ -0,0 +1,163 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import semantic_cache, stock
+from src.semantic_cache import IndexVersionPoller, SemanticCache, get_semantic_cache
+from src.tracing import get_metrics
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(**kwargs) -> SemanticCache:
+    kwargs.setdefault("index_version", lambda: "v1")
+    return SemanticCache(threshold=0.95, **kwargs)
+
+
+def test_similar_question_hits_cache():
+    cache = make_cache()
+    cache.store([1.0, 0.0, 0.1], "Tak, posiadamy", ["PROD_001"])
+    assert cache.lookup([1.0, 0.0, 0.12]) == "Tak, posiadamy"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_lru_and_ttl_eviction():
+    clock = FakeClock()
+    cache = make_cache(max_size=2, ttl_seconds=10, clock=clock)
+    cache.store([1.0, 0.0, 0.0], "a", [])
+    cache.store([0.0, 1.0, 0.0], "b", [])
+    cache.lookup([1.0, 0.0, 0.0])
+    cache.store([0.0, 0.0, 1.0], "c", [])
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    clock.now = 11
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_best_match_falls_through_to_next_candidate():
+    clock = FakeClock()
+    cache = make_cache(ttl_seconds=10, clock=clock)
+    cache.store([1.0, 0.05], "starsza", [])
+    clock.now = 8
+    cache.store([1.0, 0.0], "nowsza", [])
+
+    clock.now = 12
+    assert cache.lookup([1.0, 0.06]) == "nowsza"
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["size"] == 1
+
+
+def test_different_pack_size_is_not_a_hit():
+    cache = make_cache()
+    cache.store([1.0, 0.0], "Farba 10L: 207 zł", ["PROD_001"], "Ile kosztuje farba biała 10L?")
+
+    # embeddingi prawie identyczne, ale pytanie o inne opakowanie
+    assert cache.lookup([1.0, 0.01], "Ile kosztuje farba biała 5L?") is None
+    assert cache.lookup([1.0, 0.01], "ile kosztuje farba biała 10 l") == "Farba 10L: 207 zł"
+
+
+def test_product_change_invalidates_referencing_answers():
+    cache = make_cache()
+    cache.store([1.0, 0.0], "farba", ["PROD_001"])
+    cache.store([0.0, 1.0], "zwroty", [])
+    assert cache.invalidate_products(["PROD_001"]) == 1
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([0.0, 1.0]) == "zwroty"
+
+
+def test_answer_expires_with_its_products_stock_rows():
+    clock = FakeClock()
+    stock.configure_cache(max_size=10, ttl_seconds=60)
+    cache = make_cache(ttl_seconds=3600, clock=clock, product_max_age=stock.max_data_age)
+    cache.store([1.0, 0.0], "Farba kosztuje 207 zł", ["PROD_001"])
+    cache.store([0.0, 1.0], "Zwrot w ciągu 14 dni", [])
+
+    clock.now = 61
+    # wiersz stock wygasł bez powiadomienia - cena w odpowiedzi mogła się zmienić
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.lookup([0.0, 1.0]) == "Zwrot w ciągu 14 dni"
+
+    stock.configure_cache(max_size=10, ttl_seconds=60, change_column="updated_at")
+    try:
+        cache.store([1.0, 0.0], "Farba kosztuje 207 zł", ["PROD_001"])
+        clock.now = 200
+        assert cache.lookup([1.0, 0.0]) == "Farba kosztuje 207 zł"
+    finally:
+        stock.configure_cache(max_size=2000, ttl_seconds=60)
+
+
+def test_reindex_clears_cache():
+    version = ["v1"]
+    cache = make_cache(index_version=lambda: version[0])
+    cache.store([1.0, 0.0], "farba", [])
+    version[0] = "v2"
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_index_version_polled_on_interval_and_kept_on_error():
+    clock = FakeClock()
+    versions = ["v1"]
+    fetches = []
+
+    def fetch():
+        fetches.append(clock.now)
+        if not versions:
+            raise ConnectionError("brak sieci")
+        return versions[0]
+
+    poller = IndexVersionPoller(fetch, interval=60, clock=clock, start=lambda f: f())
+
+    assert poller() == "v1"
+    versions[0] = "v2"
+    clock.now = 30
+    assert poller() == "v1"
+    clock.now = 60
+    assert poller() == "v2"
+    versions.clear()
+    clock.now = 120
+    assert poller() == "v2"
+    assert fetches == [0, 60, 120]
+
+
+def test_fetch_index_version_uses_search_statistics(monkeypatch):
+    class FakeIndexClient:
+        def get_index_statistics(self, index_name):
+            return {"document_count": len(index_name), "storage_size": 1000}
+
+    monkeypatch.setenv("SEARCH_BACKEND", "azure")
+    monkeypatch.setattr(semantic_cache, "get_index_client", FakeIndexClient)
+    monkeypatch.setattr(semantic_cache, "read_index_version", lambda: "")
+
+    version = semantic_cache.fetch_index_version()
+
+    assert version == "|products-index:14:1000|regulamin-index:15:1000"
+
+
+def test_shared_cache_stats_in_prometheus_metrics(monkeypatch):
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+    monkeypatch.setattr(semantic_cache, "IndexVersionPoller", lambda interval: lambda: "v1")
+    get_semantic_cache.cache_clear()
+    try:
+        cache = get_semantic_cache()
+        cache.store([1.0, 0.0], "farba", [])
+        cache.lookup([1.0, 0.0])
+
+        text = get_metrics().render_prometheus()
+
+        assert 'hurtbot_semantic_cache_total{event="hits"} 1' in text
+        assert 'hurtbot_semantic_cache_total{event="stores"} 1' in text
+        assert 'hurtbot_semantic_cache{stat="size"} 1' in text
+    finally:
+        stock._invalidation_listeners.remove(cache.invalidate_products)
+        get_semantic_cache.cache_clear()
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.settings import Settings, load_environment
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("AZURE_SEARCH_ENDPOINT", "https://hurtbot-search.search.windows.net")
+    monkeypatch.setenv("SQL_POOL_SIZE", "9")
+    monkeypatch.delenv("AZURE_FOUNDRY_KEY", raising=False)
+
+    settings = Settings.from_env()
+
+    assert settings.search_service_name == "hurtbot-search"
+    assert settings.sql_pool_size == 9
+    assert settings.foundry_key == ""
+
+
+def test_load_environment_keeps_process_variables(tmp_path, monkeypatch):
+    cfg = tmp_path / "local.settings.json"
+    cfg.write_text(
+        json.dumps({"Values": {"HURTBOT_TEST_A": "plik", "HURTBOT_TEST_B": "plik"}}), "utf-8"
+    )
+    monkeypatch.setenv("HURTBOT_TEST_A", "proces")
+    monkeypatch.delenv("HURTBOT_TEST_B", raising=False)
+
+    load_environment(cfg)
+
+    assert os.environ["HURTBOT_TEST_A"] == "proces"
+    assert os.environ["HURTBOT_TEST_B"] == "plik"
+    monkeypatch.delenv("HURTBOT_TEST_B")
+
+
+def test_importing_pipeline_skips_azure_sdks():
+    code = (
+        "import sys; import src.ask_rag; "
+        "print(','.join(m for m in ('langchain_openai', 'azure.search.documents', "
+        "'langchain.chains', 'aiohttp') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
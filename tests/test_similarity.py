@@ -0,0 +1,87 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from eval import evaluate_answers
+from eval.similarity import SimilarityScorer, cosine_similarities
+from src.embedding_cache import EmbeddingCache
+
+VECTORS = {
+    "Tak, mamy farbę": [1.0, 0.0, 0.0],
+    "Tak, farba jest dostępna": [1.0, 1.0, 0.0],
+    "Dostawa trwa 3 dni": [0.0, 0.0, 2.0],
+    "Nie wiem": [0.0, 0.0, 0.0],
+}
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([VECTORS[t] for t in texts], dtype=np.float32)
+
+
+def test_cosine_similarities_rowwise():
+    left = np.array([[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]])
+    right = np.array([[2.0, 0.0], [-1.0, -1.0], [1.0, 0.0]])
+
+    assert np.allclose(cosine_similarities(left, right), [1.0, -1.0, 0.0])
+
+
+def test_scorer_encodes_once_and_reuses_disk_cache(tmp_path):
+    records = [
+        {"expected_answer": "Tak, mamy farbę", "model_answer": "Tak, farba jest dostępna"},
+        {"expected_answer": "Dostawa trwa 3 dni", "model_answer": "Dostawa trwa 3 dni"},
+        {"expected_answer": "Dostawa trwa 3 dni", "model_answer": "Nie wiem"},
+    ]
+    encoder = FakeEncoder()
+    scorer = SimilarityScorer(encoder, "fake", EmbeddingCache(tmp_path))
+
+    scored = scorer.score_records(records)
+
+    assert len(encoder.calls) == 1
+    assert len(encoder.calls[0]) == 4
+    assert [round(r["semantic_similarity"], 3) for r in scored] == [0.707, 1.0, 0.0]
+
+    next_run = FakeEncoder()
+    again = SimilarityScorer(next_run, "fake", EmbeddingCache(tmp_path)).score_records(records)
+
+    assert next_run.calls == []
+    assert [r["semantic_similarity"] for r in again] == [
+        r["semantic_similarity"] for r in scored
+    ]
+
+
+def test_evaluate_answers_scores_runner_output_without_errors(tmp_path, monkeypatch):
+    answers = tmp_path / "scored_answers.json"
+    out = tmp_path / "result.json"
+    records = [
+        {
+            "expected_answer": "Tak, mamy farbę",
+            "model_answer": "Tak, farba jest dostępna",
+            "status": "ok",
+        },
+        {
+            "expected_answer": "Dostawa trwa 3 dni",
+            "model_answer": "[ERROR]",
+            "status": "error",
+        },
+    ]
+    answers.write_text(json.dumps(records), "utf-8")
+    monkeypatch.setattr(evaluate_answers, "ANSWERS_PATH", answers)
+    monkeypatch.setattr(
+        evaluate_answers, "get_scorer", lambda model: SimilarityScorer(FakeEncoder())
+    )
+    monkeypatch.setattr(sys, "argv", ["evaluate_answers.py", "--out", str(out)])
+
+    evaluate_answers.main()
+
+    scored = json.loads(out.read_text("utf-8"))
+    assert len(scored) == 1
+    assert scored[0]["semantic_similarity"] > 0.7
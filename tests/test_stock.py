@@ -0,0 +1,108 @@
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import stock
+from src.tracing import get_metrics
+
+
+def test_bulk_lookup_single_round_trip(sqlite_stock):
+    result = stock.get_products_quantity_and_price(["PROD_001", "PROD_003", "PROD_999"])
+    assert result == {"PROD_001": (12, 207.0), "PROD_003": (5, 262.0)}
+
+
+def test_single_lookup(sqlite_stock):
+    assert stock.get_product_quantity_and_price("PROD_002") == (0, 263.0)
+    assert stock.get_product_quantity_and_price("PROD_999") is None
+
+
+def test_connections_are_reused(sqlite_stock):
+    for _ in range(5):
+        stock.get_product_quantity_and_price("PROD_001")
+    assert len(sqlite_stock[1]) == 1
+
+
+def test_cached_lookups_skip_database(sqlite_stock):
+    stock.get_products_quantity_and_price(["PROD_001", "PROD_999"])
+    stock.configure_cache(max_size=10, ttl_seconds=60)
+    stock.get_products_quantity_and_price(["PROD_001", "PROD_999"])
+    assert stock.get_products_quantity_and_price(["PROD_001", "PROD_999"]) == {
+        "PROD_001": (12, 207.0)
+    }
+    stats = stock.stock_cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_change_column_invalidates_updated_products(sqlite_stock):
+    db_path, _ = sqlite_stock
+    stock.configure_cache(max_size=10, ttl_seconds=600, change_column="updated_at")
+    invalidated = []
+    stock.add_invalidation_listener(invalidated.append)
+    try:
+        assert stock.get_product_quantity_and_price("PROD_001") == (12, 207.0)
+
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "UPDATE stock SET price = 199.0, updated_at = 1 WHERE product_id = 'PROD_001'"
+        )
+        conn.commit()
+        conn.close()
+
+        assert stock.poll_changes(force=True) == 1
+        assert invalidated[-1] == ["PROD_001"]
+        assert stock.get_product_quantity_and_price("PROD_001") == (12, 199.0)
+    finally:
+        stock._invalidation_listeners.remove(invalidated.append)
+
+
+def test_first_poll_notifies_listeners_and_does_not_block_readers(sqlite_stock, monkeypatch):
+    stock.configure_cache(max_size=10, ttl_seconds=600, change_column="updated_at")
+    invalidated = []
+    stock.add_invalidation_listener(invalidated.append)
+    started, release = threading.Event(), threading.Event()
+    query_changes = stock._query_changes
+
+    def slow_query(column, watermark):
+        started.set()
+        release.wait(5)
+        return query_changes(column, watermark)
+
+    monkeypatch.setattr(stock, "_query_changes", slow_query)
+    try:
+        poller = threading.Thread(target=stock.poll_changes, kwargs={"force": True})
+        poller.start()
+        assert started.wait(5)
+        # zapytanie w toku: kolejny wątek nie czeka na bazę ani na blokadę
+        assert stock.poll_changes(force=True) == 0
+        release.set()
+        poller.join(5)
+
+        assert invalidated[-1] is None
+    finally:
+        release.set()
+        stock._invalidation_listeners.remove(invalidated.append)
+
+
+def test_cache_stats_in_prometheus_metrics(sqlite_stock):
+    stock.configure_cache(max_size=10, ttl_seconds=60)
+    stock.get_product_quantity_and_price("PROD_001")
+    stock.get_product_quantity_and_price("PROD_001")
+
+    text = get_metrics().render_prometheus()
+
+    assert "# TYPE hurtbot_stock_cache_total counter" in text
+    assert 'hurtbot_stock_cache_total{event="hits"} 1' in text
+    assert 'hurtbot_stock_cache_total{event="misses"} 1' in text
+    assert "# TYPE hurtbot_stock_cache gauge" in text
+    assert 'hurtbot_stock_cache{stat="size"} 1' in text
+    assert 'hurtbot_stock_cache{stat="avg_hit_age_s"}' in text
+
+
+def test_sql_error_returns_empty(tmp_path):
+    stock.configure(lambda: sqlite3.connect(tmp_path / "empty.db"))
+    assert stock.get_products_quantity_and_price(["PROD_001"]) == {}
+    stock.configure(stock.connect_sql)
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src import ask_rag, stock
+from src.clients import PRODUCTS_INDEX
+from src.local_search import LocalProductIndex, LocalProductRetriever
+from src.tracing import (
+    InMemoryCollector,
+    MetricsRegistry,
+    configure_exporters,
+    get_callback_handler,
+    span,
+    start_request,
+)
+
+
+@pytest.fixture
+def collector():
+    collector = InMemoryCollector()
+    configure_exporters(collector)
+    yield collector
+    configure_exporters()
+
+
+def test_span_carries_request_id_and_records_errors(collector):
+    with start_request("req-1") as trace:
+        with span("web_search", query="taras"):
+            pass
+        with pytest.raises(RuntimeError), span("sql.stock"):
+            raise RuntimeError("baza niedostępna")
+    with span("poza.zadaniem"):
+        pass
+
+    assert collector.names() == ["web_search", "sql.stock", "poza.zadaniem"]
+    web, sql, outside = collector.spans
+    assert (web.request_id, web.attributes, web.error) == ("req-1", {"query": "taras"}, None)
+    assert sql.error == "RuntimeError"
+    assert outside.request_id is None
+    assert [s.name for s in trace.spans] == ["web_search", "sql.stock"]
+    assert trace.server_timing().startswith("web_search;dur=")
+
+
+def test_llm_spans_from_callbacks_and_search_spans(collector):
+    llm = FakeMessagesListChatModel(
+        responses=[
+            AIMessage(
+                content="general",
+                usage_metadata={"input_tokens": 120, "output_tokens": 3, "total_tokens": 123},
+            )
+        ],
+        callbacks=[get_callback_handler()],
+    )
+    retriever = LocalProductRetriever(
+        index=LocalProductIndex(
+            [{"id": "PROD_001", "name": "Cement 25kg", "content": "Cement"}]
+        ),
+    )
+
+    async def handle():
+        with start_request() as trace:
+            await asyncio.gather(
+                llm.ainvoke("Czy macie cement?"),
+                ask_rag.traced_search(retriever, PRODUCTS_INDEX, "cement"),
+            )
+            return trace
+
+    trace = asyncio.run(handle())
+
+    assert sorted(collector.names()) == ["llm", "search.products-index"]
+    llm_span = next(s for s in collector.spans if s.name == "llm")
+    assert llm_span.attributes == {"prompt_tokens": 120, "completion_tokens": 3}
+    search_span = next(s for s in collector.spans if s.name == "search.products-index")
+    assert search_span.attributes == {"results": 1}
+    assert {s.request_id for s in collector.spans} == {trace.request_id}
+
+
+def test_sql_lookup_is_traced(sqlite_stock, collector):
+    stock.purge()
+    stock.get_products_quantity_and_price(["PROD_001", "PROD_002"])
+    stock.get_products_quantity_and_price(["PROD_001"])
+
+    assert collector.names() == ["sql.stock"]
+    assert collector.spans[0].attributes == {"ids": 2}
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    with start_request("req-2"):
+        configure_exporters(registry)
+        try:
+            with span("llm", prompt_tokens=100, completion_tokens=20):
+                pass
+            with span("search.products-index"):
+                pass
+        finally:
+            configure_exporters()
+
+    text = registry.render_prometheus()
+
+    assert 'hurtbot_stage_calls_total{stage="llm",status="ok"} 1' in text
+    assert 'hurtbot_stage_duration_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'hurtbot_stage_duration_seconds_count{stage="search.products-index"} 1' in text
+    assert 'hurtbot_llm_tokens_total{stage="llm",type="prompt"} 100' in text
+    assert 'hurtbot_llm_tokens_total{stage="llm",type="completion"} 20' in text
+    assert 'search.products-index",type' not in text